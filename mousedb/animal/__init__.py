@@ -19,3 +19,5 @@ Strains
 A strain is a set of mice with a similar genetics.  Importantly strains are separated from Backgrounds.  For example, one might have mice with the genotype ob/ob but these mice may be in either a C57-Black6 or a mixed background.  This difference is set at the individual animal level.  
 The result of this is that a query for a particular strain may then need to be filtered to a specific background.
 """
+
+default_app_config = 'mousedb.animal.apps.AnimalConfig'
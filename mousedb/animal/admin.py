@@ -1,9 +1,24 @@
 """Admin site settings for the animal app."""
 
-from mousedb.animal.models import Strain, Animal, Breeding
+from mousedb.animal.models import Strain, Animal, Breeding, BreedingCage
+from mousedb.animal.cages import refresh_cages
+from mousedb.animal.bulk import after_bulk_change
+from mousedb.fragments import bump_fragment_versions
+from django import forms
 from django.contrib import admin
+from django.utils import timezone
 import datetime
 
+class AnimalAdminForm(forms.ModelForm):
+    """This form adds a litter size to the admin form for animal objects.
+
+    When a new animal is added with a litter size of more than one, the additional identical animals are created with :meth:`~mousedb.animal.models.AnimalQuerySet.create_litter`."""
+    litter_size = forms.IntegerField(min_value=1, initial=1, required=False, help_text="When adding, the number of identical animals to create")
+
+    class Meta:
+        model = Animal
+        fields = "__all__"
+
 class AnimalInline(admin.TabularInline):
     """Provides an inline tabular formset for animal objects.  
 	
@@ -24,18 +39,38 @@ class AnimalAdmin(admin.ModelAdmin):
         'fields' : ('Death', 'Cause_of_Death','Alive'),
         }),
     )
+    form = AnimalAdminForm
     raw_id_fields = ("Breeding",)
     list_display = ('MouseID', 'Rack', 'Rack_Position', 'Cage', 'Markings','Gender', 'Genotype', 'Strain', 'Background', 'Generation', 'Backcross', 'Born', 'Alive', 'Death')
     list_filter = ('Alive','Strain', 'Background','Gender','Genotype','Backcross')
     search_fields = ['MouseID', 'Cage']
     radio_fields = {"Gender": admin.HORIZONTAL, "Strain":admin.HORIZONTAL, "Background": admin.HORIZONTAL, "Cause_of_Death": admin.HORIZONTAL}
     actions = ['mark_sacrificed', 'mark_estimated_death']
+
+    def get_fieldsets(self, request, obj=None):
+        """The litter_size field is only shown when adding a new animal."""
+        fieldsets = super(AnimalAdmin, self).get_fieldsets(request, obj)
+        if obj is None:
+            fieldsets = fieldsets + (('Litter', {'fields': ('litter_size',)}),)
+        return fieldsets
+
+    def save_model(self, request, obj, form, change):
+        """When adding an animal, the rest of the litter is created in the same transaction as that animal."""
+        super(AnimalAdmin, self).save_model(request, obj, form, change)
+        litter_size = form.cleaned_data.get('litter_size') or 1
+        if not change and litter_size > 1:
+            fields = dict((field.attname, getattr(obj, field.attname)) for field in Animal._meta.concrete_fields if not field.primary_key)
+            Animal.objects.create_litter(litter_size - 1, **fields)
+            self.message_user(request, "%s additional animals were added." % (litter_size - 1))
+
     def mark_sacrificed(self,request,queryset):
         """An admin action for marking several animals as sacrificed.
 		
         This action sets the selected animals as Alive=False, Death=today and Cause_of_Death as sacrificed.  To use other paramters, mice muse be individually marked as sacrificed.
         This admin action also shows as the output the number of mice sacrificed."""
-        rows_updated = queryset.update(Alive=False, Death=datetime.date.today(), Cause_of_Death='Sacrificed')
+        animals = list(queryset)
+        rows_updated = queryset.update(Alive=False, Death=datetime.date.today(), Cause_of_Death='Sacrificed', modified=timezone.now())
+        after_bulk_change(animals, births=False)
         if rows_updated == 1:
             message_bit = "1 animal was"
         else:
@@ -48,7 +83,9 @@ class AnimalAdmin(admin.ModelAdmin):
 		
         This action sets the selected animals as Alive=False, Death=today and Cause_of_Death as Estimated.  To use other paramters, mice muse be individually marked as sacrificed.
         This admin action also shows as the output the number of mice sacrificed."""
-        rows_updated = queryset.update(Alive=False, Death=datetime.date.today(), Cause_of_Death='Estimated')
+        animals = list(queryset)
+        rows_updated = queryset.update(Alive=False, Death=datetime.date.today(), Cause_of_Death='Estimated', modified=timezone.now())
+        after_bulk_change(animals, births=False)
         if rows_updated == 1:
             message_bit = "1 animal was"
         else:
@@ -80,7 +117,11 @@ class BreedingAdmin(admin.ModelAdmin):
 		
         This action sets the selected cages as Active=False and Death=today.
         This admin action also shows as the output the number of mice sacrificed."""
-        rows_updated = queryset.update(Active=False, End=datetime.date.today() )
+        breedings = list(queryset.values_list('pk', flat=True))
+        cages = list(BreedingCage.objects.filter(Breeding__in=breedings).values_list('Cage', flat=True))
+        rows_updated = queryset.update(Active=False, End=datetime.date.today(), modified=timezone.now())
+        refresh_cages(cages)
+        bump_fragment_versions('breeding', breedings)
         if rows_updated == 1:
             message_bit = "1 cage was"
         else:
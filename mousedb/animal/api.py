@@ -77,6 +77,8 @@ By default 20 items are returned but you can increase this to all by setting lim
 +------------------+-----------------------------------------+
 | limit            | **0** for all, any other number         |
 +------------------+-----------------------------------------+
+| modified__gt     | objects changed after an ISO 8601 time  |
++------------------+-----------------------------------------+
 
 
 Response Values
@@ -94,16 +96,80 @@ The response (in either JSON or XML) provides the following fields for each obje
 | values             | the measurement, or measurement(s)                  | 423                                                         |
 +--------------------+-----------------------------------------------------+-------------------------------------------------------------+ 
 
+Creating a Litter
+`````````````````
+
+Several identical animals can be created at once with a POST request to **/api/v1/animal/litter/**.
+The request body contains a **count** and the fields of the animals, in the same format as the multiple animal form (for example **Strain** is the id of the strain)::
+
+    {"count": 8, "Strain": 1, "Background": "C57BL/6", "Genotype": "N.D.", "Born": "2012-01-01"}
+    
+The animals are created in one transaction, so either all or none of them are created.
+This requires the add animal permission and returns the number of animals created.
+
+Pedigree
+````````
+
+The pedigree of an animal is available from **/api/v1/animal/<id>/pedigree/** (see :mod:`~mousedb.animal.pedigree`).
+This returns the **depth** (the number of generations of known ancestors), the **inbreeding** coefficient and lists of the **ancestors** and **descendants** of the animal, each with the **id** of the animal and its **generation**.
+The parameter **generations** limits how many generations are followed in each direction::
+
+    http://yourserver.org/api/v1/animal/2/pedigree/?generations=3
+
+Census
+``````
+
+The number of living animals and of cages holding them on each day is available from **/api/v1/animal/census/** (see :mod:`~mousedb.animal.census`).
+The parameters **start** and **end** are dates (by default the last year), **strain** is a strain slug (by default all strains) and **step** is the number of days between counts (by default 1)::
+
+    http://yourserver.org/api/v1/animal/census/?start=2013-01-01&end=2013-12-31&step=7
+
+The **objects** are the **date**, **animals** and **cages** of each count, and the **meta** object also contains the total **animal_days** and **cage_days** from start to end, which can be used for per-diem costs.
+
+Mendelian Ratios
+````````````````
+
+The Mendelian ratio tests of each strain are available from **/api/v1/animal/mendelian/** (see :mod:`~mousedb.animal.mendelian`), optionally only for one **strain** (a strain slug)::
+
+    http://yourserver.org/api/v1/animal/mendelian/?strain=fixture-strain
+
+The **objects** are the **strain** (slug) and the **pups** test of each strain, with lists of the tests of its **breedings** (each with the **id** of the breeding cage) and of its **timed_matings** cohorts (each with the **crosstype** and tests of **all** and **alive** embryos).
+Each test has the **total** number tested, the **unexpected** and **unclassified** numbers, the **chi_square** statistic and **p_value** and the **classes**, with the **genotype**, **expected_fraction**, **expected** and **observed** count of each.
+
+Bulk Export
+```````````
+
+All animals can be exported as newline delimited JSON from **/api/v1/animal/export/**, which is much faster than **limit=0** for large colonies.
+Each line contains the id, MouseID, Strain (id), Genotype, Gender, Background, Born, Weaned, Death, Cause_of_Death, Alive, Cage, Rack, Rack_Position, Breeding (id), Father (id), Mother (id), Backcross, Generation and modified fields of an animal.
+Use **updated_since** or the **next** cursor of a previous export to only export the animals which have changed (see :mod:`~mousedb.api`)::
+
+    http://yourserver.org/api/v1/animal/export/?updated_since=2013-08-24T12:00:00
+
 '''
 
+import datetime
+from collections import defaultdict
+
+from django.conf.urls import url
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_date
+
 from tastypie.resources import ModelResource
 from tastypie.authentication import ApiKeyAuthentication
 from tastypie import fields
 from tastypie.constants import ALL, ALL_WITH_RELATIONS
-
-from mousedb.animal.models import Animal, Strain
-
-class AnimalResource(ModelResource):
+from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.http import HttpCreated, HttpForbidden, HttpNotFound, HttpBadRequest
+from tastypie.utils import trailing_slash
+
+from mousedb.api import BulkExportMixin, ConditionalResourceMixin
+from mousedb.animal.models import Animal, Strain, Breeding
+from mousedb.animal.pedigree import Pedigree
+from mousedb.animal.census import census_series, census_totals
+from mousedb.animal.mendelian import mendelian_ratios
+from mousedb.animal.forms import MultipleAnimalForm
+
+class AnimalResource(ConditionalResourceMixin, BulkExportMixin, ModelResource):
     '''This generates the API resource for :class:`~mousedb.animal.models.Animal` objects.
     
     It returns all animals in the database.
@@ -120,7 +186,7 @@ class AnimalResource(ModelResource):
         resource_name = 'animal'
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get']
-        fields = ['id','MouseID','Genotype','Gender','Background','Alive','Death','Cause_of_Death','Cage']
+        fields = ['id','MouseID','Genotype','Gender','Background','Alive','Death','Cause_of_Death','Cage','created','modified']
         filtering = {"Cage":'exact',
                      "Gender":('exact','startswith'),
                      "Genotype":ALL,
@@ -133,9 +199,116 @@ class AnimalResource(ModelResource):
                      "MouseID":ALL,
                      "strain":ALL_WITH_RELATIONS,
                      "cohort":ALL_WITH_RELATIONS,
-                     "treatment":ALL_WITH_RELATIONS}
+                     "treatment":ALL_WITH_RELATIONS,
+                     "created":ALL,
+                     "modified":ALL}
         include_resource_uri = False
         authentication = ApiKeyAuthentication()  
+
+    last_modified_models = (Animal, Strain)
+    export_fields = ['id', 'MouseID', 'Strain', 'Genotype', 'Gender', 'Background', 'Born', 'Weaned', 'Death', 'Cause_of_Death', 'Alive',
+                     'Cage', 'Rack', 'Rack_Position', 'Breeding', 'Father', 'Mother', 'Backcross', 'Generation', 'modified']
+
+    def prepend_urls(self):
+        '''This adds the litter endpoint, at **/api/v1/animal/litter/**, the pedigree endpoint, at **/api/v1/animal/<id>/pedigree/**, the census endpoint, at **/api/v1/animal/census/**, and the Mendelian ratio endpoint, at **/api/v1/animal/mendelian/**, to the export endpoint.'''
+        return [
+            url(r"^(?P<resource_name>%s)/litter%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('create_litter'), name="api_animal_litter"),
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/pedigree%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_pedigree'), name="api_animal_pedigree"),
+            url(r"^(?P<resource_name>%s)/census%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_census'), name="api_animal_census"),
+            url(r"^(?P<resource_name>%s)/mendelian%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_mendelian'), name="api_animal_mendelian"),
+        ] + super(AnimalResource, self).prepend_urls()
+
+    def get_pedigree(self, request, **kwargs):
+        '''This returns the pedigree of an animal, using :class:`~mousedb.animal.pedigree.Pedigree`.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        try:
+            animal = Animal.objects.get(pk=kwargs['pk'])
+        except Animal.DoesNotExist:
+            raise ImmediateHttpResponse(response=HttpNotFound())
+        generations = request.GET.get('generations')
+        if generations is not None and not generations.isdigit():
+            raise ImmediateHttpResponse(response=HttpBadRequest("generations must be a number"))
+        summary = Pedigree.load().summary(animal.pk, int(generations) if generations else None)
+        self.log_throttled_access(request)
+        return self.create_response(request, {
+            'id': animal.pk,
+            'depth': summary['depth'],
+            'inbreeding': summary['inbreeding'],
+            'ancestors': [{'id': pk, 'generation': generation} for pk, generation in sorted(summary['ancestors'].items(), key=lambda item: (item[1], item[0]))],
+            'descendants': [{'id': pk, 'generation': generation} for pk, generation in sorted(summary['descendants'].items(), key=lambda item: (item[1], item[0]))]})
+
+    def get_census(self, request, **kwargs):
+        '''This returns the census of the colony, or of a strain, using :func:`~mousedb.animal.census.census_series`.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        today = datetime.date.today()
+        try:
+            start = parse_date(request.GET['start']) if 'start' in request.GET else today - datetime.timedelta(days=365)
+            end = parse_date(request.GET['end']) if 'end' in request.GET else today
+            step = int(request.GET.get('step', 1))
+            if start is None or end is None or step < 1:
+                raise ValueError
+        except ValueError:
+            raise ImmediateHttpResponse(response=HttpBadRequest("start and end must be dates and step must be a positive number"))
+        strains = None
+        if 'strain' in request.GET:
+            strains = list(Strain.objects.filter(Strain_slug=request.GET['strain']).values_list('pk', flat=True))
+            if not strains:
+                raise ImmediateHttpResponse(response=HttpNotFound())
+        series = census_series(start, end, strains, step)
+        totals = census_totals(start, end, strains).values()
+        self.log_throttled_access(request)
+        return self.create_response(request, {
+            'meta': {'start': start, 'end': end, 'step': step,
+                     'animal_days': sum(animal_days for animal_days, cage_days in totals),
+                     'cage_days': sum(cage_days for animal_days, cage_days in totals)},
+            'objects': [{'date': date, 'animals': animals, 'cages': cages} for date, animals, cages in series]})
+
+    def get_mendelian(self, request, **kwargs):
+        '''This returns the Mendelian ratio tests of each strain, or of one strain, using :func:`~mousedb.animal.mendelian.mendelian_ratios`.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        strains = Strain.objects.all()
+        if 'strain' in request.GET:
+            strains = strains.filter(Strain_slug=request.GET['strain'])
+            if not strains:
+                raise ImmediateHttpResponse(response=HttpNotFound())
+        results = mendelian_ratios()
+        breedings = defaultdict(list)
+        for breeding, strain in Breeding.objects.order_by('pk').values_list('pk', 'Strain'):
+            if breeding in results['breeding']:
+                breedings[strain].append(dict(results['breeding'][breeding], id=breeding))
+        cohorts = defaultdict(list)
+        for (strain, crosstype), tests in sorted(results['cohort'].items(), key=lambda item: item[0][1]):
+            cohorts[strain].append(dict(tests, crosstype=crosstype))
+        self.log_throttled_access(request)
+        return self.create_response(request, {
+            'objects': [{'strain': strain.Strain_slug, 'pups': results['strain'].get(strain.pk), 'breedings': breedings[strain.pk], 'timed_matings': cohorts[strain.pk]}
+                        for strain in strains if strain.pk in results['strain'] or strain.pk in cohorts]})
+
+    def create_litter(self, request, **kwargs):
+        '''This creates several identical animals from a POST request using :meth:`~mousedb.animal.models.AnimalQuerySet.create_litter`.'''
+        self.method_check(request, allowed=['post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        if not request.user.has_perm('animal.add_animal'):
+            raise ImmediateHttpResponse(response=HttpForbidden())
+        data = self.deserialize(request, request.body, format=request.META.get('CONTENT_TYPE', 'application/json'))
+        form = MultipleAnimalForm(data)
+        if not form.is_valid():
+            raise ImmediateHttpResponse(response=self.error_response(request, form.errors))
+        fields = form.cleaned_data.copy()
+        count = fields.pop('count')
+        try:
+            animals = Animal.objects.create_litter(count, **fields)
+        except ValidationError as error:
+            raise ImmediateHttpResponse(response=self.error_response(request, error.message_dict))
+        self.log_throttled_access(request)
+        return self.create_response(request, {'count': len(animals)}, response_class=HttpCreated)
         
 class StrainResource(ModelResource):  
     '''This generates the API resource for :class:`~mousedb.animal.models.Strain` objects.
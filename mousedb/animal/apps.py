@@ -0,0 +1,13 @@
+"""Application configuration for the animal app."""
+
+from django.apps import AppConfig
+
+class AnimalConfig(AppConfig):
+    """The configuration for the animal app.
+
+    When the app is ready, the signal handlers which keep the todo summary, the cage occupancy index, the census, the cage history and the birth archive up to date are connected (see :mod:`~mousedb.animal.todo`, :mod:`~mousedb.animal.cages`, :mod:`~mousedb.animal.census`, :mod:`~mousedb.animal.housing` and :mod:`~mousedb.animal.archive`)."""
+    name = 'mousedb.animal'
+
+    def ready(self):
+        """This imports the todo, cages, census, housing and archive modules, which connect their signal handlers."""
+        from mousedb.animal import todo, cages, census, housing, archive
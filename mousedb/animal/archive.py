@@ -0,0 +1,75 @@
+"""This module generates summaries of the birth dates of :class:`~mousedb.animal.models.Animal` objects.
+
+The number of animals born is grouped by birth date and strain in a single aggregate query.
+This is then summarized by year, by month or by strain in python, so that the archive pages do not require one query per year.
+The aggregate is cached, and the cache is cleared by :meth:`~mousedb.animal.models.Animal.save` whenever an animal is saved with a new Born date or Strain, and by signal handlers whenever an animal is deleted or a strain is saved (as it may have been renamed).
+Bulk changes which do not send signals call :func:`~mousedb.animal.archive.invalidate_birth_archive` directly.
+"""
+
+import datetime
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mousedb.animal.models import Animal, Strain
+from mousedb.fragments import FRAGMENT_TIMEOUT
+
+BIRTH_ARCHIVE_CACHE_KEY = 'animal-birth-archive'
+
+def invalidate_birth_archive():
+    """This clears the cached birth counts."""
+    cache.delete(BIRTH_ARCHIVE_CACHE_KEY)
+
+def birth_counts():
+    """This returns the number of animals born for each birth date and strain.
+
+    The result is a list of (Born, Strain, Strain_slug, count) tuples, ordered by Born, and it is cached until an animal's Born date or Strain changes."""
+    counts = cache.get(BIRTH_ARCHIVE_CACHE_KEY)
+    if counts is None:
+        counts = [(row['Born'], row['Strain__Strain'], row['Strain__Strain_slug'], row['count'])
+            for row in Animal.objects.filter(Born__isnull=False).order_by().values('Born', 'Strain__Strain', 'Strain__Strain_slug').annotate(count=Count('id')).order_by('Born')]
+        cache.set(BIRTH_ARCHIVE_CACHE_KEY, counts, FRAGMENT_TIMEOUT)
+    return counts
+
+def births_by_year():
+    """This returns an ordered dictionary of the number of animals born in each year.
+
+    Every year from the oldest animal to the current year is included, even if no animals were born in that year."""
+    counts = birth_counts()
+    archive = OrderedDict()
+    if counts:
+        for year in range(counts[0][0].year, datetime.date.today().year + 1):
+            archive[year] = 0
+        for born, strain, strain_slug, count in counts:
+            archive[born.year] = archive.get(born.year, 0) + count
+    return archive
+
+def births_by_month(year):
+    """This returns an ordered dictionary of the number of animals born in each month of a year, keyed by the first day of the month."""
+    archive = OrderedDict((datetime.date(year, month, 1), 0) for month in range(1, 13))
+    for born, strain, strain_slug, count in birth_counts():
+        if born.year == year:
+            archive[born.replace(day=1)] += count
+    return archive
+
+def births_by_strain(year, month=None):
+    """This returns a list of (Strain, Strain_slug, count) tuples of the animals born in a year (or a month of that year), ordered by strain."""
+    archive = {}
+    for born, strain, strain_slug, count in birth_counts():
+        if born.year == year and (month is None or born.month == month):
+            archive[(strain, strain_slug)] = archive.get((strain, strain_slug), 0) + count
+    return [(strain, strain_slug, count) for (strain, strain_slug), count in sorted(archive.items())]
+
+@receiver(post_delete, sender=Animal)
+def animal_deleted(sender, instance, **kwargs):
+    """The birth archive is cleared when an animal with a Born date is deleted."""
+    if instance.Born:
+        invalidate_birth_archive()
+
+@receiver(post_save, sender=Strain)
+def strain_saved(sender, instance, **kwargs):
+    """The birth archive is cleared when a strain is saved, as its name or slug may have changed."""
+    invalidate_birth_archive()
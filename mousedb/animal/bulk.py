@@ -0,0 +1,32 @@
+"""This module updates what the signal handlers keep up to date after bulk changes to animals, which do not send signals.
+
+Batched inserts and queryset updates of :class:`~mousedb.animal.models.Animal` objects (in :class:`~mousedb.animal.forms.BulkUpdateInlineFormSet`, :meth:`~mousedb.animal.models.AnimalQuerySet.create_litter` and the animal admin actions) call :func:`~mousedb.animal.bulk.after_bulk_change` once their changes are written.
+Deleting animals, even from a queryset, sends signals so deletes do not need to call it.
+"""
+
+from mousedb.animal.todo import invalidate_todo_summary
+from mousedb.animal.archive import invalidate_birth_archive
+from mousedb.animal.cages import refresh_cages
+from mousedb.animal.census import refresh_census
+from mousedb.animal.housing import record_moves, start_cage_histories
+from mousedb.fragments import invalidate_animal_fragments
+
+def after_bulk_change(animals, new_pks=(), moved=(), old_cages=(), old_strains=(), births=True):
+    """This updates the todo summary, the birth archive, the cage occupancy index, the census, the cage history and the cached table rows after a bulk change to some animals.
+
+    The animals are the changed and new animals with their current values.
+    new_pks are the ids of the new animals (which are not set on the animals by every database), moved are the changed animals with a new location, and old_cages and old_strains are the cages and strains of the changed animals before the change.
+    The birth archive is only cleared if births is True, for changes to Born dates or strains."""
+    animals = list(animals)
+    new_pks = list(new_pks)
+    if not animals and not new_pks:
+        return
+    invalidate_todo_summary()
+    if births:
+        invalidate_birth_archive()
+    refresh_cages(list(old_cages) + [animal.Cage for animal in animals])
+    refresh_census(list(old_strains) + [animal.Strain_id for animal in animals])
+    record_moves(moved)
+    if new_pks:
+        start_cage_histories(new_pks)
+    invalidate_animal_fragments(set(animal.pk for animal in animals if animal.pk) | set(new_pks))
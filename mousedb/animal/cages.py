@@ -0,0 +1,81 @@
+"""This module keeps the cage occupancy index and the cage numbers of breeding cages up to date.
+
+The :class:`~mousedb.animal.models.CageOccupancy` rows of a cage are recalculated from its animals (an indexed lookup on the Cage of each :class:`~mousedb.animal.models.Animal`) whenever an animal in that cage, or a breeding cage with that cage number, is saved or deleted.
+If an animal or breeding cage has moved, the cage it moved from is recalculated as well.
+When a breeding cage is saved, its :class:`~mousedb.animal.models.BreedingCage` rows are also updated from its (comma separated) Cage field, these are used to find breeding cages by cage number.
+Bulk changes which do not send signals call :func:`~mousedb.animal.cages.refresh_cages` directly, and the whole index can be rebuilt with the **rebuild_cage_occupancy** management command.
+"""
+
+from django.db import transaction
+from django.db.models import Q, Count, Case, When
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mousedb.animal.models import Animal, Breeding, BreedingCage, CageOccupancy, parse_cages
+
+def cage_filter(cages):
+    """This returns a Q object which selects the rows with a Cage in cages (which may include None)."""
+    numbers = [cage for cage in cages if cage is not None]
+    condition = Q(Cage__in=numbers)
+    if None in cages:
+        condition |= Q(Cage__isnull=True)
+    return condition
+
+def active_breedings(cages=None):
+    """This returns a dictionary of the active breeding cage of each cage number, optionally only for some cages."""
+    breeding_cages = BreedingCage.objects.filter(Breeding__Active=True)
+    if cages is not None:
+        breeding_cages = breeding_cages.filter(Cage__in=[cage for cage in cages if cage is not None])
+    return dict(breeding_cages.order_by('Breeding__Start', 'Breeding').values_list('Cage', 'Breeding'))
+
+def occupancy_rows(animals, breedings):
+    """This returns new (unsaved) cage occupancy rows for a queryset of animals, grouped by cage, strain, background, rack and rack position."""
+    groups = animals.order_by().values('Cage', 'Strain', 'Background', 'Rack', 'Rack_Position').annotate(
+        total=Count('id'), alive=Count(Case(When(Alive=True, then='id'))))
+    return [CageOccupancy(Cage=group['Cage'], Strain_id=group['Strain'], Background=group['Background'], Rack=group['Rack'], Rack_Position=group['Rack_Position'],
+                          Breeding_id=breedings.get(group['Cage']), total=group['total'], alive=group['alive']) for group in groups]
+
+def refresh_cages(cages):
+    """This recalculates the occupancy of some cages (None is the group of animals with no cage)."""
+    cages = set(cages)
+    if not cages:
+        return
+    with transaction.atomic():
+        CageOccupancy.objects.filter(cage_filter(cages)).delete()
+        CageOccupancy.objects.bulk_create(occupancy_rows(Animal.objects.filter(cage_filter(cages)), active_breedings(cages)))
+
+def rebuild_cage_occupancy():
+    """This recalculates the occupancy of every cage."""
+    with transaction.atomic():
+        CageOccupancy.objects.all().delete()
+        CageOccupancy.objects.bulk_create(occupancy_rows(Animal.objects.all(), active_breedings()))
+
+@receiver(post_save, sender=Animal)
+def animal_saved(sender, instance, **kwargs):
+    """The cage of a saved animal, and the cage it was moved from, are recalculated."""
+    refresh_cages([instance.Cage, getattr(instance, '_loaded_cage', instance.Cage)])
+    instance._loaded_cage = instance.Cage
+
+@receiver(post_delete, sender=Animal)
+def animal_deleted(sender, instance, **kwargs):
+    """The cage of a deleted animal is recalculated."""
+    refresh_cages([instance.Cage])
+
+def rebuild_breeding_cages():
+    """This recreates the cage numbers of every breeding cage from their Cage fields."""
+    with transaction.atomic():
+        BreedingCage.objects.all().delete()
+        BreedingCage.objects.bulk_create([BreedingCage(Breeding_id=pk, Cage=number)
+                                          for pk, cage in Breeding.objects.values_list('pk', 'Cage') for number in set(parse_cages(cage))])
+
+@receiver(post_save, sender=Breeding)
+def breeding_saved(sender, instance, **kwargs):
+    """The cage numbers of a saved breeding cage are updated, then its cages and those it was moved from are recalculated."""
+    instance.update_cages()
+    refresh_cages(instance.cage_numbers() + parse_cages(getattr(instance, '_loaded_cage', None)))
+    instance._loaded_cage = instance.Cage
+
+@receiver(post_delete, sender=Breeding)
+def breeding_deleted(sender, instance, **kwargs):
+    """The cages of a deleted breeding cage are recalculated."""
+    refresh_cages(instance.cage_numbers())
@@ -0,0 +1,227 @@
+"""This module calculates the census of the colony over time.
+
+An :class:`~mousedb.animal.models.Animal` is counted as alive from its Born date up to (but not including) its Death date.
+A cage is counted for a strain from the earliest Born date of the animals of that strain in it until the last of them died, so the census of cages follows the current Cage of each animal.
+Animals with no Born date, and dead animals with no Death date, cannot be placed in time so are not counted.
+
+The census is found by sorting the births and deaths (and the first and last days of each cage) by date and sweeping through them, keeping a running total.
+The births, deaths and cages are each counted with one aggregate query, so the cost does not depend on the number of days covered.
+The result is stored as :class:`~mousedb.animal.models.CensusCount` change points for each strain.
+When an animal is saved or deleted, the change in its own births and deaths (and in the first and last days of its old and new cages) is applied to the stored change points of its strain from the earliest date affected, rather than recalculating the whole strain.
+Bulk changes which do not send signals call :func:`~mousedb.animal.census.refresh_census` directly, and the whole census can be rebuilt with the **rebuild_census** management command.
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Case, When, Min, Max, F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mousedb.animal.models import Animal, CensusCount
+
+def counted_animals(strains=None):
+    """This returns the animals which are counted in the census, optionally only for some strains."""
+    animals = Animal.objects.filter(Born__isnull=False).exclude(Alive=False, Death__isnull=True).exclude(Death__lt=F('Born'))
+    if strains is not None:
+        animals = animals.filter(Strain__in=strains)
+    return animals.order_by()
+
+def census_events(strains=None):
+    """This returns a dictionary of the census events of each strain, a list of (date, change in animals, change in cages) tuples."""
+    events = defaultdict(list)
+    animals = counted_animals(strains)
+    for strain, born, count in animals.values_list('Strain', 'Born').annotate(count=Count('id')):
+        events[strain].append((born, count, 0))
+    for strain, death, count in animals.filter(Death__isnull=False).values_list('Strain', 'Death').annotate(count=Count('id')):
+        events[strain].append((death, -count, 0))
+    cages = animals.filter(Cage__isnull=False).values_list('Strain', 'Cage').annotate(
+        start=Min('Born'), end=Max('Death'), living=Count(Case(When(Death__isnull=True, then='id'))))
+    for strain, cage, start, end, living in cages:
+        events[strain].append((start, 0, 1))
+        if not living:
+            events[strain].append((end, 0, -1))
+    return events
+
+def change_points(events):
+    """This sweeps through a list of (date, change in animals, change in cages) events and returns the (date, animals, cages) totals on each date they change (from zero before the first)."""
+    changes = defaultdict(lambda: [0, 0])
+    for date, animals, cages in events:
+        changes[date][0] += animals
+        changes[date][1] += cages
+    points = []
+    animals = cages = 0
+    for date in sorted(changes):
+        animals += changes[date][0]
+        cages += changes[date][1]
+        if (points[-1][1:] if points else (0, 0)) != (animals, cages):
+            points.append((date, animals, cages))
+    return points
+
+def refresh_census(strains):
+    """This recalculates the census of some strains."""
+    strains = set(strain for strain in strains if strain is not None)
+    if not strains:
+        return
+    events = census_events(strains)
+    with transaction.atomic():
+        CensusCount.objects.filter(Strain__in=strains).delete()
+        CensusCount.objects.bulk_create([CensusCount(Strain_id=strain, date=date, animals=animals, cages=cages)
+                                         for strain in strains for date, animals, cages in change_points(events.get(strain, []))])
+
+def animal_span(born, death, alive):
+    """This returns the (born, death) dates over which an animal is counted in the census, or None if it is not counted."""
+    if born is None or (death is None and not alive) or (death is not None and death < born):
+        return None
+    return (born, death)
+
+def cage_events(others, span):
+    """This returns the (date, change in animals, change in cages) events of a cage for a strain, from the (start, end, living, count) aggregates of the other animals of the strain in it and the span of an animal (or None)."""
+    start, end, living, count = others
+    if span is not None:
+        born, death = span
+        start = born if start is None else min(start, born)
+        if death is None:
+            living += 1
+        else:
+            end = death if end is None else max(end, death)
+        count += 1
+    if not count:
+        return []
+    events = [(start, 0, 1)]
+    if not living:
+        events.append((end, 0, -1))
+    return events
+
+def census_changes(pk, old, new):
+    """This returns a dictionary of the census events to be added to each strain when an animal changes from its old to its new (Strain, Cage, Born, Death, Alive) fields, either of which may be None for an animal being created or deleted.
+
+    The old census events of the animal (and of its cages) are reversed and the new ones are added, so unchanged events cancel out."""
+    states = []
+    for fields, sign in ((old, -1), (new, 1)):
+        if fields is not None and fields[0] is not None:
+            states.append((fields[0], fields[1], animal_span(*fields[2:]), sign))
+    changes = defaultdict(list)
+    for strain, cage, span, sign in states:
+        if span is not None:
+            changes[strain].append((span[0], sign, 0))
+            if span[1] is not None:
+                changes[strain].append((span[1], -sign, 0))
+    for strain, cage in set((strain, cage) for strain, cage, span, sign in states if cage is not None):
+        others = counted_animals([strain]).filter(Cage=cage).exclude(pk=pk).aggregate(
+            start=Min('Born'), end=Max('Death'), living=Count(Case(When(Death__isnull=True, then='id'))), count=Count('id'))
+        others = (others['start'], others['end'], others['living'], others['count'])
+        for sign in (-1, 1):
+            spans = [span for state_strain, state_cage, span, state_sign in states if (state_strain, state_cage, state_sign) == (strain, cage, sign)]
+            for date, animals, cages in cage_events(others, spans[0] if spans else None):
+                changes[strain].append((date, 0, sign * cages))
+    return changes
+
+def apply_census_changes(changes):
+    """This applies a dictionary of census events for each strain to the stored change points, replacing only those from the earliest date of the events of each strain."""
+    for strain, events in changes.items():
+        totals = defaultdict(lambda: [0, 0])
+        for date, animals, cages in events:
+            totals[date][0] += animals
+            totals[date][1] += cages
+        dates = [date for date, (animals, cages) in totals.items() if animals or cages]
+        if not dates:
+            continue
+        first = min(dates)
+        with transaction.atomic():
+            points = list(CensusCount.objects.select_for_update().filter(Strain=strain).order_by('date').values_list('date', 'animals', 'cages'))
+            points = change_points(point_events(points) + events)
+            CensusCount.objects.filter(Strain=strain, date__gte=first).delete()
+            CensusCount.objects.bulk_create([CensusCount(Strain_id=strain, date=date, animals=animals, cages=cages)
+                                             for date, animals, cages in points if date >= first])
+
+def rebuild_census():
+    """This recalculates the census of every strain."""
+    events = census_events()
+    with transaction.atomic():
+        CensusCount.objects.all().delete()
+        CensusCount.objects.bulk_create([CensusCount(Strain_id=strain, date=date, animals=animals, cages=cages)
+                                         for strain, strain_events in events.items() for date, animals, cages in change_points(strain_events)])
+
+def stored_change_points(strains=None, end=None):
+    """This returns a dictionary of the stored (date, animals, cages) change points of each strain, optionally only for some strains and up to an end date."""
+    counts = CensusCount.objects.all()
+    if strains is not None:
+        counts = counts.filter(Strain__in=strains)
+    if end is not None:
+        counts = counts.filter(date__lte=end)
+    points = defaultdict(list)
+    for strain, date, animals, cages in counts.order_by('Strain', 'date').values_list('Strain', 'date', 'animals', 'cages'):
+        points[strain].append((date, animals, cages))
+    return points
+
+def point_events(points):
+    """This turns a list of (date, animals, cages) change points back into (date, change in animals, change in cages) events."""
+    events = []
+    animals = cages = 0
+    for date, point_animals, point_cages in points:
+        events.append((date, point_animals - animals, point_cages - cages))
+        animals, cages = point_animals, point_cages
+    return events
+
+def combined_change_points(points):
+    """This combines the change points of several strains into the change points of their totals."""
+    events = []
+    for strain_points in points.values():
+        events.extend(point_events(strain_points))
+    return change_points(events)
+
+def census_series(start, end, strains=None, step=1):
+    """This returns the census of the colony (or of some strains) as a list of (date, animals, cages) tuples for every step days from start to end."""
+    points = combined_change_points(stored_change_points(strains, end))
+    series = []
+    index = 0
+    animals = cages = 0
+    date = start
+    while date <= end:
+        while index < len(points) and points[index][0] <= date:
+            animals, cages = points[index][1:]
+            index += 1
+        series.append((date, animals, cages))
+        date += datetime.timedelta(days=step)
+    return series
+
+def census_totals(start, end, strains=None):
+    """This returns a dictionary of the (animal days, cage days) of each strain from start to end (inclusive), for per-diem costs.
+
+    These are summed over the periods between change points rather than day by day."""
+    stop = end + datetime.timedelta(days=1)
+    totals = {}
+    for strain, strain_points in stored_change_points(strains, end).items():
+        animal_days = cage_days = 0
+        for index, (date, animals, cages) in enumerate(strain_points):
+            following = strain_points[index + 1][0] if index + 1 < len(strain_points) else stop
+            days = (min(following, stop) - max(date, start)).days
+            if days > 0:
+                animal_days += animals * days
+                cage_days += cages * days
+        totals[strain] = (animal_days, cage_days)
+    return totals
+
+def census_fields(animal):
+    """This returns the (Strain, Cage, Born, Death, Alive) fields of an animal which the census depends on."""
+    return (animal.Strain_id, animal.Cage, animal.Born, animal.Death, animal.Alive)
+
+@receiver(post_save, sender=Animal)
+def animal_saved(sender, instance, created, **kwargs):
+    """The change in the census from a saved animal is applied to its strain (and the strain it was changed from).
+
+    If the fields of an existing animal were not recorded when it was loaded, the census of its strain is recalculated instead."""
+    if created:
+        apply_census_changes(census_changes(instance.pk, None, census_fields(instance)))
+    elif hasattr(instance, '_loaded_census'):
+        apply_census_changes(census_changes(instance.pk, instance._loaded_census, census_fields(instance)))
+    else:
+        refresh_census([instance.Strain_id])
+    instance._loaded_census = census_fields(instance)
+
+@receiver(post_delete, sender=Animal)
+def animal_deleted(sender, instance, **kwargs):
+    """The census events of a deleted animal are removed from its strain."""
+    apply_census_changes(census_changes(instance.pk, census_fields(instance), None))
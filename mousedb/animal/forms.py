@@ -1,7 +1,11 @@
 """Forms for use in manipulating objects in the animal app."""
 
 from django.forms import ModelForm
+from django.forms.models import BaseInlineFormSet
 from django import forms
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
 
 from mousedb.animal.models import Animal, Breeding
 	
@@ -20,6 +24,71 @@ class AnimalForm(ModelForm):
 				}
 		js = ('javascript/jquery-ui/js/jquery-ui-1.8.2.custom.min.js', 'javascript/jquery-autocomplete/jquery.autocomplete.js')
 		
+class BulkUpdateInlineFormSet(BaseInlineFormSet):
+    """This inline formset saves changes to existing objects with a few bulk updates.
+
+    Each submitted row is compared to the current values of its object and only the changed fields are written.
+    All the changes to a field are written in one UPDATE (using a CASE expression where the rows differ) and deleted rows are removed with one DELETE, all in a single transaction.
+    The modified time of the changed objects is updated with one further UPDATE, and new rows are inserted with one batched insert.
+    As these do not send signals, for animals everything the signal handlers keep up to date is then updated with :func:`~mousedb.animal.bulk.after_bulk_change`.
+    For :class:`~mousedb.animal.models.Animal` objects, Alive is set to False where a Death date is entered, as in :meth:`~mousedb.animal.models.Animal.save`."""
+
+    def save(self, commit=True):
+        """This saves the formset, returning the changed and new objects."""
+        model = self.model
+        self.changed_objects = []
+        self.deleted_objects = []
+        self.new_objects = []
+        changes = {}
+        deleted = []
+        old_cages = []
+        old_strains = []
+        for form in self.initial_forms:
+            if self.can_delete and self._should_delete_form(form):
+                deleted.append(form.instance.pk)
+                self.deleted_objects.append(form.instance)
+            elif form.has_changed():
+                obj = form.instance
+                fields = [model._meta.get_field(name) for name in form.changed_data]
+                if model is Animal and 'Death' in form.changed_data and obj.Death:
+                    obj.Alive = False
+                    fields.append(model._meta.get_field('Alive'))
+                for field in fields:
+                    changes.setdefault(field, {})[obj.pk] = getattr(obj, field.attname)
+                self.changed_objects.append((obj, form.changed_data))
+                old_cages.append(form.initial.get('Cage'))
+                old_strains.append(form.initial.get('Strain'))
+        for form in self.extra_forms:
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form)):
+                if model is Animal and form.instance.Death:
+                    form.instance.Alive = False
+                self.new_objects.append(form.instance)
+        if commit:
+            with transaction.atomic():
+                for field, values in changes.items():
+                    distinct_values = set(values.values())
+                    if len(distinct_values) == 1:
+                        value = distinct_values.pop()
+                    else:
+                        value = Case(*[When(pk=pk, then=Value(item)) for pk, item in values.items()], output_field=field)
+                    model._default_manager.filter(pk__in=list(values)).update(**{field.attname: value})
+                if changes and 'modified' in [field.name for field in model._meta.fields]:
+                    model._default_manager.filter(pk__in=[obj.pk for obj, changed_data in self.changed_objects]).update(modified=timezone.now())
+                if deleted:
+                    model._default_manager.filter(pk__in=deleted).delete()
+                new_pks = []
+                if self.new_objects and model is Animal:
+                    new_pks = model._default_manager.bulk_insert(self.new_objects)
+                elif self.new_objects:
+                    model._default_manager.bulk_create(self.new_objects)
+            if model is Animal and (changes or self.new_objects):
+                from mousedb.animal.bulk import after_bulk_change
+                after_bulk_change([obj for obj, changed_data in self.changed_objects] + self.new_objects, new_pks=new_pks,
+                    moved=[obj for obj, changed_data in self.changed_objects if set(changed_data) & set(['Cage', 'Rack', 'Rack_Position'])],
+                    old_cages=old_cages, old_strains=old_strains,
+                    births=bool(self.new_objects) or any(field.name in ('Born', 'Strain') for field in changes))
+        return [obj for obj, changed_data in self.changed_objects] + self.new_objects
+
 class MultipleAnimalForm(ModelForm):
 	"""This modelform provides fields for entering multiple identical copies of a set of mice.
 	
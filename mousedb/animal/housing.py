@@ -0,0 +1,52 @@
+"""This module records the cage history of animals.
+
+Each :class:`~mousedb.animal.models.CageHistory` row is a location (Cage, Rack and Rack_Position) of an :class:`~mousedb.animal.models.Animal` from a start date until an end date.
+When an animal is added, its first location starts on its Born date (or the current date if this is not known).
+When an animal is saved with a new location, its current row is ended and a new row is started on the current date (if it had already moved that day, the row for that day is replaced).
+Bulk changes which do not send signals call :func:`~mousedb.animal.housing.record_moves` and :func:`~mousedb.animal.housing.start_cage_histories` directly.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from mousedb.animal.models import Animal, CageHistory
+
+def animal_location(animal):
+    """This returns the (Cage, Rack, Rack_Position) of an animal."""
+    return (animal.Cage, animal.Rack, animal.Rack_Position)
+
+def start_cage_histories(pks=None):
+    """This adds a first location, starting on the Born date (or the current date), for the animals with some ids (or for every animal, by default) which have no cage history."""
+    animals = Animal.objects.filter(cagehistory__isnull=True)
+    if pks is not None:
+        pks = list(pks)
+        if not pks:
+            return
+        animals = animals.filter(pk__in=pks)
+    today = datetime.date.today()
+    CageHistory.objects.bulk_create([CageHistory(animal_id=pk, Cage=cage, Rack=rack, Rack_Position=rack_position, start=born or today)
+                                     for pk, cage, rack, rack_position, born in animals.order_by().values_list('pk', 'Cage', 'Rack', 'Rack_Position', 'Born')])
+
+def record_moves(animals, today=None):
+    """This records that some animals have moved to their current locations on today (the current date by default)."""
+    animals = list(animals)
+    if not animals:
+        return
+    today = today or datetime.date.today()
+    pks = [animal.pk for animal in animals]
+    with transaction.atomic():
+        CageHistory.objects.filter(animal__in=pks, end__isnull=True, start__gte=today).delete()
+        CageHistory.objects.filter(animal__in=pks, end__isnull=True).update(end=today)
+        CageHistory.objects.bulk_create([CageHistory(animal_id=animal.pk, Cage=animal.Cage, Rack=animal.Rack, Rack_Position=animal.Rack_Position, start=today) for animal in animals])
+
+@receiver(post_save, sender=Animal)
+def animal_saved(sender, instance, created, **kwargs):
+    """A new animal starts its cage history, and an animal saved with a new location records the move."""
+    if created:
+        CageHistory.objects.create(animal=instance, Cage=instance.Cage, Rack=instance.Rack, Rack_Position=instance.Rack_Position, start=instance.Born or datetime.date.today())
+    elif getattr(instance, '_loaded_location', None) != animal_location(instance):
+        record_moves([instance])
+    instance._loaded_location = animal_location(instance)
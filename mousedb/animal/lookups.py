@@ -5,7 +5,6 @@ See http://code.google.com/p/django-ajax-selects/ for information about configur
 
 from mousedb.animal.models import Animal
 
-from django.db.models import Q
 from django.utils.html import escape
 
 from ajax_select import register, LookupChannel
@@ -21,8 +20,8 @@ class AnimalLookup(LookupChannel):
     def get_query(self,q,request):
         """ This sets up the query for the lookup.
 		
-		The lookup searches the MouseID or the id (database identifier) for the mouse."""
-        return Animal.objects.filter(Q(MouseID__icontains=q)|Q(id__icontains=q)|Q(Cage__icontains=q))
+		The lookup searches for a MouseID, Cage or id (database identifier) starting with q, see :meth:`~mousedb.animal.models.AnimalQuerySet.autocomplete`."""
+        return Animal.objects.autocomplete(q)
 
     def format_result(self,animal):
         """ This controls the display of the dropdown menu.
@@ -53,8 +52,8 @@ class AnimalLookupMale(object):
     def get_query(self,q,request):
         """ This sets up the query for the lookup.
 		
-		The lookup searches the MouseID or the id (database identifier) for the mouse.  It then filters this set for only males."""
-        return Animal.objects.filter(Q(MouseID__icontains=q)|Q(id__icontains=q)|Q(Cage__icontains=q)).filter(Gender='M')
+		The lookup searches for a MouseID, Cage or id (database identifier) starting with q, for only males."""
+        return Animal.objects.filter(Gender='M').autocomplete(q)
 
     def format_result(self,animal):
         """ This controls the display of the dropdown menu.
@@ -86,8 +85,8 @@ class AnimalLookupFemales(LookupChannel):
     def get_query(self,q,request):
         """ This sets up the query for the lookup.
 		
-		The lookup searches the MouseID or the id (database identifier) for the mouse.  It then filters this set for only females."""
-        return Animal.objects.filter(Q(MouseID__icontains=q)|Q(id__icontains=q)|Q(Cage__icontains=q)).filter(Gender='F')
+		The lookup searches for a MouseID, Cage or id (database identifier) starting with q, for only females."""
+        return Animal.objects.filter(Gender='F').autocomplete(q)
 
     def get_result(self,animal):
         """ This controls the display of the dropdown menu.
@@ -0,0 +1,23 @@
+"""This command rebuilds the cage numbers of breeding cages.
+
+Each number in the (comma separated) Cage field of a breeding cage is stored as a :class:`~mousedb.animal.models.BreedingCage`, which is used to search for breeding cages by cage number.
+It should be run once after upgrading to convert the existing breeding cages, and then rebuilds the cage occupancy index (which links cages to their breeding cages)::
+
+    python manage.py rebuild_breeding_cages
+"""
+
+from django.core.management.base import BaseCommand
+
+from mousedb.animal.cages import rebuild_breeding_cages, rebuild_cage_occupancy
+from mousedb.animal.models import BreedingCage
+
+class Command(BaseCommand):
+    """Rebuilds the cage numbers of breeding cages from their Cage fields."""
+    help = "Rebuilds the cage numbers of each breeding cage and the cage occupancy index."
+
+    def handle(self, *args, **options):
+        rebuild_breeding_cages()
+        rebuild_cage_occupancy()
+        self.stdout.write("%s cage numbers for %s breeding cages" % (
+            BreedingCage.objects.count(),
+            BreedingCage.objects.values('Breeding').distinct().count()))
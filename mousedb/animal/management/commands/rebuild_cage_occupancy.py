@@ -0,0 +1,21 @@
+"""This command rebuilds the cage occupancy index.
+
+It should be run once after upgrading to create the index for existing animals, and can be run at any time to correct it after bulk changes made outside of MouseDB::
+
+    python manage.py rebuild_cage_occupancy
+"""
+
+from django.core.management.base import BaseCommand
+
+from mousedb.animal.cages import rebuild_cage_occupancy
+from mousedb.animal.models import CageOccupancy
+
+class Command(BaseCommand):
+    """Rebuilds the cage occupancy index from the database."""
+    help = "Rebuilds the index of the animals in each cage."
+
+    def handle(self, *args, **options):
+        rebuild_cage_occupancy()
+        self.stdout.write("%s cages, %s with living animals" % (
+            CageOccupancy.objects.values('Cage').distinct().count(),
+            CageOccupancy.objects.filter(alive__gt=0).values('Cage').distinct().count()))
@@ -0,0 +1,21 @@
+"""This command rebuilds the census of the colony.
+
+It should be run once after upgrading to calculate the census for existing animals, and can be run at any time to correct it after bulk changes made outside of MouseDB::
+
+    python manage.py rebuild_census
+"""
+
+from django.core.management.base import BaseCommand
+
+from mousedb.animal.census import rebuild_census
+from mousedb.animal.models import CensusCount
+
+class Command(BaseCommand):
+    """Rebuilds the census of each strain from the birth and death dates of the animals."""
+    help = "Rebuilds the census of living animals and cages for each strain."
+
+    def handle(self, *args, **options):
+        rebuild_census()
+        self.stdout.write("%s census change points for %s strains" % (
+            CensusCount.objects.count(),
+            CensusCount.objects.values('Strain').distinct().count()))
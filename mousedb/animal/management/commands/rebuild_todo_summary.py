@@ -0,0 +1,19 @@
+"""This command rebuilds the summary of the todo lists.
+
+The summary is rebuilt automatically when it is read after it expires or after bulk changes, so this is only needed to build it in advance::
+
+    python manage.py rebuild_todo_summary
+"""
+
+from django.core.management.base import BaseCommand
+
+from mousedb.animal.todo import build_todo_summary, TODO_LISTS
+
+class Command(BaseCommand):
+    """Rebuilds the todo summary from the database."""
+    help = "Rebuilds the cached summary of the animals on each todo list."
+
+    def handle(self, *args, **options):
+        summary = build_todo_summary()
+        for todo_list in TODO_LISTS:
+            self.stdout.write("%s: %s animals" % (todo_list, len(summary['lists'][todo_list])))
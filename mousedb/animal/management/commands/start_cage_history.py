@@ -0,0 +1,21 @@
+"""This command starts the cage history of animals which do not have one.
+
+It should be run once after upgrading, which records the current location of each existing animal as starting from its Born date.
+Only animals with no cage history are changed, so it is safe to run again::
+
+    python manage.py start_cage_history
+"""
+
+from django.core.management.base import BaseCommand
+
+from mousedb.animal.housing import start_cage_histories
+from mousedb.animal.models import CageHistory
+
+class Command(BaseCommand):
+    """Starts the cage history of each animal with no cage history."""
+    help = "Records the current location of each animal with no cage history."
+
+    def handle(self, *args, **options):
+        before = CageHistory.objects.count()
+        start_cage_histories()
+        self.stdout.write("%s cage histories started" % (CageHistory.objects.count() - before))
@@ -0,0 +1,233 @@
+"""This module tests whether the genotypes of pups and embryos follow Mendelian ratios.
+
+Each genotype code in GENOTYPE_CHOICES is parsed once into an allele vector, a tuple of the (sorted) pair of alleles at each locus, so that for example -/+ and +/- are the same genotype.
+Codes which are not determined (N.D., or ? at any locus) cannot be placed.
+The expected genotypes of a cross are found by combining every allele of the father with every allele of the mother at each locus (X-linked loci work in the same way, with Y as the second allele of the father).
+
+The expected genotypes of the pups of a :class:`~mousedb.animal.models.Breeding` cage are found from the genotypes of its breeders (averaged over each male and female pair).
+If the breeders are not all genotyped, the single locus genotypes implied by its Crosstype are used instead.
+The Breeding genotype field is not used, as it is the genotype given to new pups rather than an independent observation.
+Pups with a determined genotype which has the same loci as the cross are counted, pups with a genotype which cannot come from the cross are counted as **unexpected**, and other pups (with different loci) as **unclassified**.
+
+The WT, HET and KO embryos of each :class:`~mousedb.timed_mating.models.PlugEvents` are compared with the first locus of the cross of the plugged female and male (or of the breeding cage, if they are not genotyped).
+Plug events are pooled into cohorts by strain and cross type, and are tested for all embryos and for surviving embryos, so that embryonic lethality can be seen.
+
+The observed and expected counts are pooled for each breeding cage, each strain (from the pups of its breeding cages) and each cohort, and tested with a chi-square test.
+The whole colony is tallied at once with one query for each of breeding cages, breeders, pups and plug events, and the results are cached until animals, breeding cages, breeders or plug events change.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count
+from scipy import stats
+
+from mousedb.animal.models import Animal, Breeding, GENOTYPE_CHOICES
+from mousedb.timed_mating.models import PlugEvents
+from mousedb.conditional import latest_change, latest_modified, latest_deletion
+from mousedb.fragments import fragment_versions, FRAGMENT_TIMEOUT
+
+ALLELE_ORDER = {'-': 0, 'fl': 1, 'Tg': 2, '+': 3, 'Y': 4}
+CROSSTYPE_PARENTS = {'WT vs HET': ('+/+', '-/+'),
+                     'HET vs HET': ('-/+', '-/+'),
+                     'KO vs HET': ('-/-', '-/+'),
+                     'KO vs WT': ('-/-', '+/+'),
+                     'WT vs WT': ('+/+', '+/+'),
+                     'KO vs KO': ('-/-', '-/-'),
+                     'FL vs FL': ('fl/fl', 'fl/fl')}
+EMBRYO_GENOTYPES = (('WT', '+/+'), ('HET', '-/+'), ('KO', '-/-'))
+
+def parse_genotype(code):
+    """This returns the allele vector of a genotype code, or None if it is not determined."""
+    vector = []
+    for locus in code.split(';'):
+        alleles = locus.strip().split('/')
+        if len(alleles) != 2 or not all(allele in ALLELE_ORDER for allele in alleles):
+            return None
+        vector.append(tuple(sorted(alleles, key=ALLELE_ORDER.get)))
+    return tuple(vector)
+
+def genotype_codes():
+    """This returns the genotype codes of GENOTYPE_CHOICES, in order."""
+    codes = []
+    for group, choices in GENOTYPE_CHOICES:
+        for code, name in choices:
+            if code not in codes:
+                codes.append(code)
+    return codes
+
+GENOTYPE_VECTORS = dict((code, parse_genotype(code)) for code in genotype_codes())
+GENOTYPE_LABELS = {}
+for code in genotype_codes():
+    if GENOTYPE_VECTORS[code] is not None:
+        GENOTYPE_LABELS.setdefault(GENOTYPE_VECTORS[code], code)
+
+def genotype_vector(code):
+    """This returns the allele vector of a genotype code, using the parsed GENOTYPE_CHOICES where possible."""
+    if code is None:
+        return None
+    if code in GENOTYPE_VECTORS:
+        return GENOTYPE_VECTORS[code]
+    return parse_genotype(code)
+
+def genotype_label(vector):
+    """This returns the genotype code of an allele vector (as in GENOTYPE_CHOICES where possible)."""
+    return GENOTYPE_LABELS.get(vector) or u'; '.join(u'/'.join(locus) for locus in vector)
+
+def cross(father, mother):
+    """This returns a dictionary of the expected fraction of each genotype of the offspring of two allele vectors, or None if they cannot be crossed."""
+    if father is None or mother is None or len(father) != len(mother):
+        return None
+    fractions = {(): 1.0}
+    for father_locus, mother_locus in zip(father, mother):
+        offspring = defaultdict(float)
+        for vector, fraction in fractions.items():
+            for father_allele in father_locus:
+                for mother_allele in mother_locus:
+                    locus = tuple(sorted((father_allele, mother_allele), key=ALLELE_ORDER.get))
+                    offspring[vector + (locus,)] += fraction / 4
+        fractions = dict(offspring)
+    return fractions
+
+def mixed_cross(fathers, mothers):
+    """This returns the expected fractions of the offspring of several fathers and mothers, averaged over each pair, or None if any pair cannot be crossed."""
+    crosses = [cross(father, mother) for father in fathers for mother in mothers]
+    if not crosses or None in crosses:
+        return None
+    fractions = defaultdict(float)
+    for pair in crosses:
+        for vector, fraction in pair.items():
+            fractions[vector] += fraction / len(crosses)
+    return dict(fractions)
+
+def first_locus(fractions):
+    """This returns the expected fractions of the first locus of a cross."""
+    if fractions is None:
+        return None
+    marginal = defaultdict(float)
+    for vector, fraction in fractions.items():
+        marginal[vector[:1]] += fraction
+    return dict(marginal)
+
+def crosstype_fractions(crosstype):
+    """This returns the expected fractions of a Crosstype, or None if it is not known."""
+    if crosstype not in CROSSTYPE_PARENTS:
+        return None
+    return cross(*[genotype_vector(code) for code in CROSSTYPE_PARENTS[crosstype]])
+
+def new_tally():
+    """This returns an empty tally of observed and expected genotype counts."""
+    return {'observed': defaultdict(int), 'expected': defaultdict(float), 'unexpected': 0, 'unclassified': 0}
+
+def add_counts(tally, fractions, counts):
+    """This adds a dictionary of the observed counts of each allele vector to a tally, with their expected counts from the fractions of a cross."""
+    loci = len(next(iter(fractions)))
+    total = 0
+    for vector, count in counts.items():
+        if vector is None or len(vector) != loci:
+            tally['unclassified'] += count
+        elif vector in fractions:
+            tally['observed'][vector] += count
+            total += count
+        else:
+            tally['unexpected'] += count
+    for vector, fraction in fractions.items():
+        tally['expected'][vector] += fraction * total
+        tally['observed'][vector] += 0
+
+def merge_tally(tally, other):
+    """This adds the counts of one tally to another."""
+    for vector, count in other['observed'].items():
+        tally['observed'][vector] += count
+    for vector, count in other['expected'].items():
+        tally['expected'][vector] += count
+    tally['unexpected'] += other['unexpected']
+    tally['unclassified'] += other['unclassified']
+
+def chi_square(tally):
+    """This returns the result of a chi-square test of a tally.
+
+    This is a dictionary of the total number tested, the unexpected and unclassified numbers, the chi_square statistic and p_value (None if there are fewer than two expected genotypes or nothing was tested) and a list of the genotype, expected_fraction, expected and observed of each class, ordered by genotype."""
+    vectors = sorted(tally['expected'], key=genotype_label)
+    total = sum(tally['observed'][vector] for vector in vectors)
+    classes = [{'genotype': genotype_label(vector),
+                'expected_fraction': tally['expected'][vector] / total if total else None,
+                'expected': tally['expected'][vector],
+                'observed': tally['observed'][vector]} for vector in vectors]
+    tested = [row for row in classes if row['expected'] > 0]
+    statistic = p_value = None
+    if total and len(tested) > 1:
+        statistic, p_value = stats.chisquare([row['observed'] for row in tested], [row['expected'] for row in tested])
+        statistic, p_value = float(statistic), float(p_value)
+    return {'total': total, 'unexpected': tally['unexpected'], 'unclassified': tally['unclassified'],
+            'chi_square': statistic, 'p_value': p_value, 'classes': classes}
+
+def breeding_fractions():
+    """This returns a dictionary of the strain, cross type and expected fractions (or None) of each breeding cage."""
+    fathers = defaultdict(list)
+    mothers = defaultdict(list)
+    for breeding, code in Breeding.Male.through.objects.values_list('breeding', 'animal__Genotype'):
+        fathers[breeding].append(genotype_vector(code))
+    for breeding, code in Breeding.Females.through.objects.values_list('breeding', 'animal__Genotype'):
+        mothers[breeding].append(genotype_vector(code))
+    breedings = {}
+    for breeding, strain, crosstype in Breeding.objects.order_by().values_list('pk', 'Strain', 'Crosstype'):
+        fractions = mixed_cross(fathers[breeding], mothers[breeding]) or crosstype_fractions(crosstype)
+        breedings[breeding] = (strain, crosstype, fractions)
+    return breedings
+
+def calculate_mendelian():
+    """This returns the chi-square tests (see :func:`~mousedb.animal.mendelian.chi_square`) of each breeding cage (keyed by id) as **breeding**, of each strain (keyed by id) as **strain**, and of the alive and all embryos of each (strain id, cross type) timed mating cohort as **cohort**."""
+    breedings = breeding_fractions()
+    pups = defaultdict(lambda: defaultdict(int))
+    for breeding, code, count in Animal.objects.filter(Breeding__isnull=False).exclude(Genotype='N.D.').order_by().values_list('Breeding', 'Genotype').annotate(count=Count('id')):
+        pups[breeding][genotype_vector(code)] += count
+    breeding_tallies = {}
+    strain_tallies = defaultdict(new_tally)
+    for breeding, counts in pups.items():
+        strain, crosstype, fractions = breedings[breeding]
+        if fractions is None:
+            continue
+        breeding_tallies[breeding] = new_tally()
+        add_counts(breeding_tallies[breeding], fractions, counts)
+        merge_tally(strain_tallies[strain], breeding_tallies[breeding])
+    cohort_tallies = defaultdict(lambda: {'alive': new_tally(), 'all': new_tally()})
+    plugs = PlugEvents.objects.order_by().values_list('Breeding', 'PlugFemale__Strain', 'PlugMale__Genotype', 'PlugFemale__Genotype',
+                                                      'WT_Alive', 'HET_Alive', 'KO_Alive', 'WT_Dead', 'HET_Dead', 'KO_Dead')
+    for breeding, female_strain, father, mother, wt_alive, het_alive, ko_alive, wt_dead, het_dead, ko_dead in plugs:
+        alive = (wt_alive, het_alive, ko_alive)
+        dead = (wt_dead, het_dead, ko_dead)
+        if all(count is None for count in alive + dead):
+            continue
+        strain, crosstype, fractions = breedings.get(breeding, (female_strain, u'', None))
+        fractions = first_locus(cross(genotype_vector(father), genotype_vector(mother)) or fractions)
+        if fractions is None:
+            continue
+        vectors = [genotype_vector(code) for name, code in EMBRYO_GENOTYPES]
+        cohort = cohort_tallies[(strain, crosstype)]
+        add_counts(cohort['alive'], fractions, dict(zip(vectors, [count or 0 for count in alive])))
+        add_counts(cohort['all'], fractions, dict(zip(vectors, [(alive_count or 0) + (dead_count or 0) for alive_count, dead_count in zip(alive, dead)])))
+    return {'breeding': dict((breeding, chi_square(tally)) for breeding, tally in breeding_tallies.items()),
+            'strain': dict((strain, chi_square(tally)) for strain, tally in strain_tallies.items()),
+            'cohort': dict((key, {'alive': chi_square(tallies['alive']), 'all': chi_square(tallies['all'])}) for key, tallies in cohort_tallies.items())}
+
+def mendelian_cache_key():
+    """This returns the cache key of the Mendelian ratio tests, from the time of the most recent change to animals, breeding cages and plug events and the version of the breeders."""
+    changed = latest_change(latest_modified(Animal.objects.all()), latest_modified(Breeding.objects.all()), latest_modified(PlugEvents.objects.all()),
+                            latest_deletion(Animal, Breeding, PlugEvents))
+    return 'mendelian-%s-%s' % (changed.strftime('%Y%m%d%H%M%S%f'), fragment_versions(('breeders', None)))
+
+def mendelian_ratios():
+    """This returns the Mendelian ratio tests of the colony (see :func:`~mousedb.animal.mendelian.calculate_mendelian`), which are cached until they change."""
+    key = mendelian_cache_key()
+    results = cache.get(key)
+    if results is None:
+        results = calculate_mendelian()
+        cache.set(key, results, FRAGMENT_TIMEOUT)
+    return results
+
+def strain_mendelian(strain):
+    """This returns the Mendelian ratio test of the pups of a strain (or None), and a list of its timed mating cohorts (each with its crosstype and the alive and all tests), ordered by cross type."""
+    results = mendelian_ratios()
+    cohorts = [dict(tests, crosstype=crosstype or u'Unknown') for (strain_id, crosstype), tests in results['cohort'].items() if strain_id == strain.pk]
+    return results['strain'].get(strain.pk), sorted(cohorts, key=lambda cohort: cohort['crosstype'])
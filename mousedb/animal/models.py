@@ -2,7 +2,10 @@
 
 This module stores all data regarding a particular laboratory animal.  Information about experimental data and timed matings are stored in the data and timed_matings packages.  This module describes the database structure for each data model."""
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q, Count, Case, When, Value, Prefetch, IntegerField, Max
+from django.utils import timezone
 import datetime
 
 GENOTYPE_CHOICES = (
@@ -161,6 +164,152 @@ CAUSE_OF_DEATH = (
 ('Estimated', 'Estimated Death')
 )
 
+class StrainQuerySet(models.QuerySet):
+    """This queryset adds helpers for summarizing :class:`~mousedb.animal.models.Strain` objects."""
+
+    def with_summary(self):
+        """This annotates each strain with its colony totals in a single aggregated query.
+
+        The annotations are total (all animals), alive (live animals), cages (distinct cages holding live animals) and breeding_cages (active breeding cages)."""
+        return self.annotate(
+            total=Count('animal', distinct=True),
+            alive=Count(Case(When(animal__Alive=True, then='animal')), distinct=True),
+            cages=Count(Case(When(animal__Alive=True, then='animal__Cage')), distinct=True),
+            breeding_cages=Count(Case(When(breeding__Active=True, then='breeding')), distinct=True))
+
+def integer_prefix_filter(field_name, prefix, max_digits=10):
+    """This returns a Q object which matches integers in field_name whose digits start with prefix (a string of digits).
+
+    Rather than casting the column to text, this is expressed as one range per possible number of digits (for example 12, 120-129, 1200-1299 and so on), so an index on the column can be used."""
+    if not prefix.isdigit() or len(prefix) > max_digits:
+        return Q(pk__in=[])
+    number = int(prefix)
+    if prefix == '0':
+        return Q(**{field_name: 0})
+    elif prefix.startswith('0'):
+        return Q(pk__in=[])
+    query = Q(**{field_name: number})
+    for digits in range(1, max_digits - len(prefix) + 1):
+        scale = 10 ** digits
+        query |= Q(**{'%s__range' % field_name: (number * scale, (number + 1) * scale - 1)})
+    return query
+
+class AnimalQuerySet(models.QuerySet):
+    """This queryset adds helpers for loading :class:`~mousedb.animal.models.Animal` objects along with their related data."""
+
+    def with_breeder_residency(self):
+        """This prefetches the strain and the breeding cages for each animal.
+
+        The :meth:`~mousedb.animal.models.Animal.breeding_male_location_type` and :meth:`~mousedb.animal.models.Animal.breeding_female_location_type` attributes then use the prefetched breeding cages rather than querying for each animal."""
+        return self.select_related('Strain').prefetch_related('breeding_males', 'breeding_females')
+
+    def autocomplete(self, q, limit=20):
+        """This returns up to limit animals whose eartag (MouseID), cage or id begins with q.
+
+        The matches use index range lookups (see :func:`~mousedb.animal.models.integer_prefix_filter`) rather than a text search of the integer columns.
+        Living animals are listed first, then exact matches (eartag, then cage, then id) before prefix matches, then by eartag."""
+        q = q.strip()
+        matches = self.filter(integer_prefix_filter('MouseID', q) | integer_prefix_filter('Cage', q) | integer_prefix_filter('id', q))
+        if q.isdigit():
+            number = int(q)
+            rank = Case(When(MouseID=number, then=Value(0)), When(Cage=number, then=Value(1)), When(id=number, then=Value(2)), default=Value(3), output_field=IntegerField())
+        else:
+            rank = Value(3, output_field=IntegerField())
+        return matches.select_related('Strain').annotate(match_rank=rank).order_by('-Alive', 'match_rank', 'MouseID', 'id')[:limit]
+
+    def bulk_insert(self, animals):
+        """This inserts a list of new animals with one batched insert and returns their ids.
+
+        On databases which do not set the ids of the animals from a batched insert, these are the ids above the largest id before the insert (read in the same transaction)."""
+        with transaction.atomic():
+            last = self.order_by().aggregate(last=Max('pk'))['last'] or 0
+            animals = self.bulk_create(animals)
+            if all(animal.pk for animal in animals):
+                return [animal.pk for animal in animals]
+            return list(self.model._default_manager.filter(pk__gt=last).values_list('pk', flat=True))
+
+    def create_litter(self, count, **fields):
+        """This creates count identical animals from the field values in a single transaction.
+
+        The field values are validated once, with the same Death/Alive rule as :meth:`~mousedb.animal.models.Animal.save`, and all the animals are inserted with one batched insert.
+        A ValidationError is raised (and nothing is created) if the count or any field is invalid.
+        The list of new animals is returned, note that their ids are only set on databases which return them from a batched insert."""
+        if count < 1:
+            raise ValidationError({'count': "At least one animal must be added"})
+        animal = self.model(**fields)
+        if animal.Death:
+            animal.Alive = False
+        animal.full_clean(validate_unique=False)
+        animals = [self.model(**dict((field.attname, getattr(animal, field.attname)) for field in self.model._meta.concrete_fields if not field.primary_key)) for i in range(count)]
+        pks = self.bulk_insert(animals)
+        from mousedb.animal.bulk import after_bulk_change
+        after_bulk_change(animals, new_pks=pks, births=bool(animal.Born))
+        return animals
+
+    def create_breeding_litter(self, breeding, count, **fields):
+        """This creates count pups from a breeding cage with :meth:`~mousedb.animal.models.AnimalQuerySet.create_litter`.
+
+        The strain, background, genotype, cage, rack, backcross and generation are taken from the breeding cage (the pups are placed in the first cage of a breeding cage with several cages).
+        Any other fields (such as Born, Weaned and Gender) are passed as keyword arguments."""
+        cages = breeding.cage_numbers()
+        fields.update(Strain = breeding.Strain,
+            Background = breeding.background,
+            Breeding = breeding,
+            Cage = cages[0] if cages else None,
+            Rack = breeding.Rack,
+            Rack_Position = breeding.Rack_Position,
+            Genotype = breeding.genotype,
+            Backcross = breeding.backcross,
+            Generation = breeding.generation)
+        return self.create_litter(count, **fields)
+
+def parse_cages(cage):
+    """This returns the cage numbers in the Cage field of a breeding cage (which is a comma separated list)."""
+    if not cage:
+        return []
+    return [int(number) for number in cage.split(',') if number.strip().isdigit()]
+
+def cage_search_filter(query):
+    """This returns a Q object which matches cage numbers from a search query, or None if the query is not valid.
+
+    The query is a comma separated list of cage numbers (for example 12 or 12,15) and ranges of cage numbers (for example 100-120)."""
+    condition = Q()
+    terms = [term.strip() for term in query.split(',') if term.strip()]
+    if not terms:
+        return None
+    for term in terms:
+        bounds = [bound.strip() for bound in term.split('-')]
+        if not all(bound.isdigit() for bound in bounds) or len(bounds) > 2:
+            return None
+        if len(bounds) == 1:
+            condition |= Q(Cage=int(bounds[0]))
+        else:
+            condition |= Q(Cage__range=sorted([int(bound) for bound in bounds]))
+    return condition
+
+class BreedingQuerySet(models.QuerySet):
+    """This queryset adds helpers for loading :class:`~mousedb.animal.models.Breeding` objects for display in breeding tables."""
+
+    def in_cages(self, query):
+        """This returns the breeding cages in any of the cages matching a search query (see :func:`~mousedb.animal.models.cage_search_filter`).
+
+        The cages are found with an index lookup on :class:`~mousedb.animal.models.BreedingCage`, so searching for cage 12 does not also find cages 112 or 1203."""
+        condition = cage_search_filter(query)
+        if condition is None:
+            return self.none()
+        return self.filter(pk__in=BreedingCage.objects.filter(condition).values('Breeding'))
+
+    def with_table_data(self):
+        """This loads everything shown in breeding_table.html in a fixed number of queries.
+
+        The strain is joined, the males and females (along with their own breeding cages, used for the residency status) are prefetched and the total and unweaned pups are annotated as pup_count and unweaned_count."""
+        breeders = Animal.objects.with_breeder_residency()
+        return self.select_related('Strain').prefetch_related(
+            Prefetch('Male', queryset=breeders),
+            Prefetch('Females', queryset=breeders)).annotate(
+            pup_count=Count('animal', distinct=True),
+            unweaned_count=Count(Case(When(animal__Weaned__isnull=True, animal__Alive=True, then='animal')), distinct=True))
+
 class Strain(models.Model):
     """A data model describing a mouse strain.  
 
@@ -170,11 +319,19 @@ class Strain(models.Model):
     Strain_slug = models.SlugField(max_length = 20, help_text="Strain name with no spaces, for use in URI's")
     Source = models.TextField(max_length = 500, blank = True)
     Comments = models.TextField (max_length = 500, blank = True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    objects = StrainQuerySet.as_manager()
 
     def __unicode__(self):
         """For a Strain object, the unicode representation is the Strain field."""
         return u'%s' % self.Strain
 
+    def save(self, *args, **kwargs):
+        """The modified time is updated when a strain is saved."""
+        self.modified = timezone.now()
+        super(Strain, self).save(*args, **kwargs)
+
     @models.permalink
     def get_absolute_url(self):
         """For a Strain object, the permalinked absolute url is */strain/strain-slug*."""
@@ -185,8 +342,8 @@ class Animal(models.Model):
 
     This data model describes a wide variety of parameters of an experimental animal.  This model is linked to the Strain.  If the parentage of a mouse is known, this can be identified (the breeding set may not be clear on this matter). Mice are automatically marked as not alive when a Death date is provided and the object is saved.  Strain, Background and Genotype are required fields.  By default, querysets are ordered first by strain then by MouseID.
     """
-    MouseID = models.IntegerField(max_length = 10, blank = True, null=True)
-    Cage = models.IntegerField(max_length = 15, blank = True, null=True)
+    MouseID = models.IntegerField(max_length = 10, blank = True, null=True, db_index=True)
+    Cage = models.IntegerField(max_length = 15, blank = True, null=True, db_index=True)
     Rack = models.CharField(max_length = 15, blank = True)
     Rack_Position = models.CharField(max_length = 15, blank = True)
     Strain = models.ForeignKey(Strain)
@@ -205,6 +362,10 @@ class Animal(models.Model):
     Markings = models.CharField(max_length = 100, blank=True)					
     Notes = models.TextField(max_length = 500, blank=True)
     Alive = models.BooleanField(default=True)
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    objects = AnimalQuerySet.as_manager()
 
     def __unicode__(self):
         """This defines the unicode string of a mouse.
@@ -231,15 +392,14 @@ class Animal(models.Model):
         This attribute is used to color breeding table entries such that male mice which are currently in a different cage can quickly be identified.
         The location is relative to the first breeding cage an animal is assigned to."""
         try:
-            self.breeding_males.all()[0].Cage
-            if int(self.breeding_males.all()[0].Cage) == int(self.Cage):
+            if self.Cage in self.breeding_males.all()[0].cage_numbers():
                 type = "resident-breeder"
+            elif self.Cage is None or not self.breeding_males.all()[0].cage_numbers():
+                type = "unknown-breeder"
             else:
                 type = "non-resident-breeder"                
         except IndexError:
             type = "unknown-breeder"
-        except ValueError:
-            type = "unknown-breeder"
         return type	 
         
     def breeding_female_location_type(self):
@@ -248,14 +408,13 @@ class Animal(models.Model):
         This attribute is used to color breeding table entries such that male mice which are currently in a different cage can quickly be identified.
         The location is relative to the first breeding cage an animal is assigned to."""
         try:
-            self.breeding_females.all()[0].Cage
-            if int(self.breeding_females.all()[0].Cage) == int(self.Cage):
+            if self.Cage in self.breeding_females.all()[0].cage_numbers():
                 type = "resident-breeder"
+            elif self.Cage is None or not self.breeding_females.all()[0].cage_numbers():
+                type = "unknown-breeder"
             else:
                 type = "non-resident-breeder"                
         except IndexError:
-            type = "unknown-breeder"
-        except ValueError:
             type = "unknown-breeder"            
         return type	         
       
@@ -264,11 +423,33 @@ class Animal(models.Model):
     def get_absolute_url(self):
         return ('animal-detail', [str(self.id)])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """The Born date and Strain, location (Cage, Rack and Rack_Position) and census fields (Strain, Cage, Born, Death and Alive) are recorded when an animal is loaded so that changes to them can be detected on save.
+
+        The census fields are only recorded if none of them were deferred."""
+        instance = super(Animal, cls).from_db(db, field_names, values)
+        instance._loaded_archive = (instance.__dict__.get('Born'), instance.__dict__.get('Strain_id'))
+        instance._loaded_cage = instance.__dict__.get('Cage')
+        if all(name in instance.__dict__ for name in ('Strain_id', 'Cage', 'Born', 'Death', 'Alive')):
+            instance._loaded_census = (instance.Strain_id, instance.Cage, instance.Born, instance.Death, instance.Alive)
+        instance._loaded_location = (instance.__dict__.get('Cage'), instance.__dict__.get('Rack'), instance.__dict__.get('Rack_Position'))
+        return instance
+
     def save(self):
-        """The save method for Animal class is over-ridden to set Alive=False when a Death date is entered.  This is not the case for a cause of death."""
+        """The save method for Animal class is over-ridden to set Alive=False when a Death date is entered.  This is not the case for a cause of death.
+
+        The modified time is updated, and if the Born date or Strain of an animal with a Born date has changed, the cached birth archive is cleared."""
         if self.Death:
             self.Alive = False
+        self.modified = timezone.now()
         super(Animal, self).save()
+        archive = (self.Born, self.Strain_id)
+        loaded = getattr(self, '_loaded_archive', (None, None))
+        if archive != loaded and (self.Born or loaded[0]):
+            from mousedb.animal.archive import invalidate_birth_archive
+            invalidate_birth_archive()
+        self._loaded_archive = archive
 
     class Meta:
         ordering = ['Born',]
@@ -295,6 +476,17 @@ class Breeding(models.Model):
     background = models.CharField(max_length = 25, choices = BACKGROUND_CHOICES, default="Mixed", help_text="The background of the pups")
     backcross = models.IntegerField(max_length = 5, null=True, blank=True, help_text="Leave blank for mixed background.  This is the backcross of the pups.")
     generation = models.IntegerField(max_length=5, null=True, blank=True, help_text="The generation of the pups")
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    objects = BreedingQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """The Cage is recorded when a breeding cage is loaded so that the cage it was moved from can be updated on save."""
+        instance = super(Breeding, cls).from_db(db, field_names, values)
+        instance._loaded_cage = instance.__dict__.get('Cage')
+        return instance
 
     def duration(self):
         """Calculates the breeding cage's duration.
@@ -318,11 +510,25 @@ class Breeding(models.Model):
         """This attribute generates a queryset of unweaned animals for this breeding cage.  It is filtered for only Alive animals."""	
         return Animal.objects.filter(Breeding=self, Weaned__isnull=True, Alive=True)
 
+    def cage_numbers(self):
+        """This returns the cage numbers of this breeding cage as a list of integers."""
+        return parse_cages(self.Cage)
+
+    def update_cages(self):
+        """This updates the :class:`~mousedb.animal.models.BreedingCage` rows of this breeding cage to match its Cage field."""
+        numbers = set(self.cage_numbers())
+        existing = set(self.cages.values_list('Cage', flat=True))
+        if existing - numbers:
+            self.cages.filter(Cage__in=existing - numbers).delete()
+        if numbers - existing:
+            BreedingCage.objects.bulk_create([BreedingCage(Breeding=self, Cage=number) for number in sorted(numbers - existing)])
+
     def male_breeding_location_type(self):
         """This attribute defines whether a breeding male's current location is the same as the breeding cage.
 
         This attribute is used to color breeding table entries such that male mice which are currently in a different cage can quickly be identified."""
-        if int(self.Male.all()[0].Cage) == int(self.Cage):
+        males = self.Male.all()
+        if males and males[0].Cage in self.cage_numbers():
             type = "resident breeder"
         else:
             type = "non-resident breeder"
@@ -332,9 +538,11 @@ class Breeding(models.Model):
         """The save function for a breeding cage has to automatic over-rides, Active and the Cage for the Breeder.
         
         In the case of Active, if an End field is specified, then the Active field is set to False.
-        In the case of Cage, if a Cage is provided, and animals are specified under Male or Females for a Breeding object, then the Cage field for those animals is set to that of the breeding cage.  The same is true for both Rack and Rack Position."""
+        In the case of Cage, if a Cage is provided, and animals are specified under Male or Females for a Breeding object, then the Cage field for those animals is set to that of the breeding cage.  The same is true for both Rack and Rack Position.
+        The modified time is also updated."""
         if self.End:
             self.Active = False
+        self.modified = timezone.now()
         #if self.Cage:
         #    if self.Females:               
         #        for female_breeder in self.Females:
@@ -372,3 +580,89 @@ class Breeding(models.Model):
         #super(Breeding, self).save()
     class Meta:
         ordering = ['Strain', 'Start']
+
+class BreedingCage(models.Model):
+    """This data model is an index of the cages of each :class:`~mousedb.animal.models.Breeding` cage.
+
+    The Cage field of a breeding cage is a comma separated list of cage numbers, which cannot be searched exactly.
+    Each of these numbers is stored as a row of this model (which is kept up to date as breeding cages are saved, see :mod:`~mousedb.animal.cages`), so breeding cages can be found by cage number with an index lookup."""
+    Breeding = models.ForeignKey(Breeding, related_name='cages')
+    Cage = models.IntegerField(db_index=True)
+
+    def __unicode__(self):
+        """The unicode representation of a breeding cage number is the cage number."""
+        return u'%s' % self.Cage
+
+    class Meta:
+        ordering = ['Cage']
+        unique_together = ('Breeding', 'Cage')
+
+class CageOccupancy(models.Model):
+    """This data model is an index of the occupants of each cage.
+
+    There is one row for each group of :class:`~mousedb.animal.models.Animal` objects in a cage with the same strain, background, rack and rack position, with the number of animals (total) and living animals (alive) in that group and the active :class:`~mousedb.animal.models.Breeding` cage with that cage number (if any).
+    These rows are kept up to date as animals and breeding cages are saved (see :mod:`~mousedb.animal.cages`), so cage lists do not need to scan the animals.
+    Animals with no cage are grouped with a Cage of None."""
+    Cage = models.IntegerField(null=True, blank=True, db_index=True)
+    Strain = models.ForeignKey(Strain)
+    Background = models.CharField(max_length = 25, choices = BACKGROUND_CHOICES)
+    Rack = models.CharField(max_length = 15, blank = True)
+    Rack_Position = models.CharField(max_length = 15, blank = True)
+    Breeding = models.ForeignKey(Breeding, null=True, blank=True, on_delete=models.SET_NULL)
+    total = models.IntegerField(default=0)
+    alive = models.IntegerField(default=0, db_index=True)
+
+    def __unicode__(self):
+        """The unicode representation of a cage occupancy is the cage number and strain."""
+        return u'Cage %s (%s)' % (self.Cage, self.Strain)
+
+    @property
+    def Alive(self):
+        """A cage is alive if it contains any living animals."""
+        return self.alive > 0
+
+    def animals(self):
+        """This returns the animals in this group."""
+        return Animal.objects.filter(Cage=self.Cage, Strain=self.Strain_id, Background=self.Background, Rack=self.Rack, Rack_Position=self.Rack_Position)
+
+    class Meta:
+        ordering = ['Cage']
+        verbose_name_plural = "cage occupancies"
+
+class CensusCount(models.Model):
+    """This data model stores the census of the colony as a time series for each :class:`~mousedb.animal.models.Strain`.
+
+    Each row is a change point, giving the number of living animals and of cages holding them from its date until the date of the next row for that strain.
+    These rows are calculated from the Born and Death dates of the animals and are kept up to date as animals are saved (see :mod:`~mousedb.animal.census`)."""
+    Strain = models.ForeignKey(Strain)
+    date = models.DateField(db_index=True)
+    animals = models.IntegerField(default=0)
+    cages = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        """The unicode representation of a census count is the strain, date and counts."""
+        return u'%s on %s: %i animals in %i cages' % (self.Strain, self.date, self.animals, self.cages)
+
+    class Meta:
+        ordering = ['Strain', 'date']
+        unique_together = ('Strain', 'date')
+
+class CageHistory(models.Model):
+    """This data model records where an :class:`~mousedb.animal.models.Animal` was housed.
+
+    Each row is a Cage, Rack and Rack_Position of an animal from its start date up to (but not including) its end date, which is None for the current location.
+    A row is added whenever the location of an animal changes (see :mod:`~mousedb.animal.housing`), so cage-days can be calculated for past billing periods."""
+    animal = models.ForeignKey(Animal)
+    Cage = models.IntegerField(null=True, blank=True, db_index=True)
+    Rack = models.CharField(max_length = 15, blank = True)
+    Rack_Position = models.CharField(max_length = 15, blank = True)
+    start = models.DateField(db_index=True)
+    end = models.DateField(null=True, blank=True, db_index=True)
+
+    def __unicode__(self):
+        """The unicode representation of a cage history entry is the animal, cage and dates."""
+        return u'%s in cage %s from %s' % (self.animal, self.Cage, self.start)
+
+    class Meta:
+        ordering = ['animal', 'start', 'id']
+        verbose_name_plural = "cage histories"
@@ -0,0 +1,183 @@
+"""This module walks the pedigree of the colony.
+
+The parents of an :class:`~mousedb.animal.models.Animal` are its Father and Mother or, where these are not set, the only Male and the only female in the Females of its :class:`~mousedb.animal.models.Breeding` cage (if a breeding cage has several breeders of a sex, the parent of that sex is unknown).
+A :class:`~mousedb.animal.pedigree.Pedigree` loads these parents for every animal at once (one query for the animals and one for each of the breeder tables) into dictionaries of ids, so that ancestors, descendants, generation depths and inbreeding coefficients are found without any further queries, however many generations are walked.
+
+The parents of the whole colony are cached, under a key which changes whenever animals, breeding cages or breeders change, so the animal detail page and the pedigree API do not read every animal each time.
+
+Bad data (for example an animal entered as its own grandparent) would make a loop in the pedigree, the parent links which close such a loop are ignored.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from mousedb.animal.models import Animal, Breeding
+from mousedb.conditional import latest_change, latest_modified, latest_deletion
+from mousedb.fragments import fragment_versions, FRAGMENT_TIMEOUT
+
+#the number of generations of ancestors listed on the animal detail page
+PEDIGREE_GENERATIONS = 3
+
+def breeding_parents():
+    """This returns a dictionary of the (male id, female id) of each breeding cage, either of which is None unless the breeding cage has exactly one breeder of that sex."""
+    males = defaultdict(list)
+    females = defaultdict(list)
+    for breeding, animal in Breeding.Male.through.objects.values_list('breeding', 'animal'):
+        males[breeding].append(animal)
+    for breeding, animal in Breeding.Females.through.objects.values_list('breeding', 'animal'):
+        females[breeding].append(animal)
+    parents = {}
+    for breeding in set(males) | set(females):
+        male = males[breeding][0] if len(males[breeding]) == 1 else None
+        female = females[breeding][0] if len(females[breeding]) == 1 else None
+        parents[breeding] = (male, female)
+    return parents
+
+def animal_parents(animals):
+    """This returns a dictionary of the (father id, mother id) of each animal in a queryset, from their Father and Mother or their breeding cage."""
+    from_breeding = breeding_parents()
+    parents = {}
+    for pk, father, mother, breeding in animals.order_by().values_list('pk', 'Father', 'Mother', 'Breeding'):
+        breeding_male, breeding_female = from_breeding.get(breeding, (None, None))
+        parents[pk] = (father or breeding_male, mother or breeding_female)
+    return parents
+
+def pedigree_cache_key():
+    """This returns the cache key of the parents of the colony, from the time of the most recent change to animals and breeding cages and the version of the breeders."""
+    changed = latest_change(latest_modified(Animal.objects.all()), latest_deletion(Animal, Breeding))
+    return 'pedigree-parents-%s-%s' % (changed.strftime('%Y%m%d%H%M%S%f'), fragment_versions(('breeders', None)))
+
+def colony_parents():
+    """This returns the parents of every animal (see :func:`~mousedb.animal.pedigree.animal_parents`), which are cached until animals or breeders change."""
+    key = pedigree_cache_key()
+    parents = cache.get(key)
+    if parents is None:
+        parents = animal_parents(Animal.objects.all())
+        cache.set(key, parents, FRAGMENT_TIMEOUT)
+    return parents
+
+class Pedigree(object):
+    """This is the parent graph of a set of animals.
+
+    It is built from a dictionary of the (father id, mother id) of each animal id (either of which may be None), normally with :meth:`~mousedb.animal.pedigree.Pedigree.load`."""
+
+    def __init__(self, parents):
+        self.parents = {}
+        self.children = defaultdict(list)
+        self.depths = {}
+        for animal, (father, mother) in parents.items():
+            self.parents[animal] = tuple(parent for parent in (father, mother) if parent is not None and parent != animal)
+        self._remove_loops()
+        for animal, animal_parents in self.parents.items():
+            for parent in animal_parents:
+                self.children[parent].append(animal)
+        self._kinships = {}
+
+    @classmethod
+    def load(cls, animals=None):
+        """This loads the pedigree of all animals (from the cache where possible), or of a queryset of animals (the ancestors of these are then only followed through animals in the queryset)."""
+        if animals is None:
+            return cls(colony_parents())
+        return cls(animal_parents(animals))
+
+    def _remove_loops(self):
+        """This calculates the depth of each animal, removing any parent links which would make a loop.
+
+        The depth of an animal with no known parents is 0, otherwise it is one more than the depth of its deepest parent."""
+        visiting = set()
+        for root in list(self.parents):
+            if root in self.depths:
+                continue
+            stack = [(root, iter(self.parents.get(root, ())))]
+            visiting.add(root)
+            while stack:
+                animal, remaining = stack[-1]
+                for parent in remaining:
+                    if parent in visiting:
+                        self.parents[animal] = tuple(other for other in self.parents[animal] if other != parent)
+                    elif parent not in self.depths:
+                        visiting.add(parent)
+                        stack.append((parent, iter(self.parents.get(parent, ()))))
+                        break
+                else:
+                    stack.pop()
+                    visiting.discard(animal)
+                    self.depths[animal] = max([self.depths[parent] + 1 for parent in self.parents.get(animal, ())] or [0])
+
+    def __contains__(self, animal):
+        return animal in self.parents
+
+    def __len__(self):
+        return len(self.parents)
+
+    def depth(self, animal):
+        """This returns the number of generations of known ancestors of an animal."""
+        return self.depths.get(animal, 0)
+
+    def _walk(self, animal, links, max_generations=None):
+        """This returns a dictionary of the animals reached from an animal through links (parents or children), with the fewest generations to each."""
+        found = {}
+        generation = [animal]
+        distance = 0
+        while generation and (max_generations is None or distance < max_generations):
+            distance += 1
+            next_generation = []
+            for current in generation:
+                for relative in links.get(current, ()):
+                    if relative not in found and relative != animal:
+                        found[relative] = distance
+                        next_generation.append(relative)
+            generation = next_generation
+        return found
+
+    def ancestors(self, animal, max_generations=None):
+        """This returns a dictionary of the ids of the ancestors of an animal and the generation of each (1 for parents, 2 for grandparents and so on)."""
+        return self._walk(animal, self.parents, max_generations)
+
+    def descendants(self, animal, max_generations=None):
+        """This returns a dictionary of the ids of the descendants of an animal and the generation of each (1 for offspring, 2 for grand-offspring and so on)."""
+        return self._walk(animal, self.children, max_generations)
+
+    def kinship(self, first, second):
+        """This returns the coefficient of kinship of two animals (the probability that alleles drawn at random from each are identical by descent).
+
+        This uses the recursive (tabular) method: the deeper of the two animals is replaced by the average over its parents, where an unknown parent is treated as unrelated."""
+        if first is None or second is None:
+            return 0.0
+        key = (first, second) if first <= second else (second, first)
+        if key in self._kinships:
+            return self._kinships[key]
+        stack = [key]
+        while stack:
+            first, second = stack[-1]
+            if first == second:
+                parents = self.parents.get(first, ())
+                needed = [tuple(sorted(parents))] if len(parents) == 2 else []
+            else:
+                younger, other = (first, second) if self.depth(first) >= self.depth(second) else (second, first)
+                needed = [(min(parent, other), max(parent, other)) for parent in self.parents.get(younger, ())]
+            missing = [pair for pair in needed if pair not in self._kinships]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            if first == second:
+                self._kinships[(first, second)] = (1 + (self._kinships[needed[0]] if needed else 0.0)) / 2.0
+            else:
+                self._kinships[(first, second)] = sum(self._kinships[pair] for pair in needed) / 2.0
+        return self._kinships[key]
+
+    def inbreeding(self, animal):
+        """This returns the inbreeding coefficient of an animal, which is the kinship of its parents (0 if either parent is unknown)."""
+        parents = self.parents.get(animal, ())
+        if len(parents) != 2:
+            return 0.0
+        return self.kinship(parents[0], parents[1])
+
+    def summary(self, animal, max_generations=None):
+        """This returns a dictionary of the ancestors, descendants, depth and inbreeding coefficient of an animal."""
+        return {'ancestors': self.ancestors(animal, max_generations),
+                'descendants': self.descendants(animal, max_generations),
+                'depth': self.depth(animal),
+                'inbreeding': self.inbreeding(animal)}
@@ -0,0 +1,78 @@
+"""This module calculates the productivity of breeding cages.
+
+The pups of every :class:`~mousedb.animal.models.Breeding` cage are counted by breeding cage and birth date in a single aggregate query, where the pups of a breeding cage born on the same date are a litter.
+From these litters the following are calculated for each breeding cage, and for all the breeding cages of each strain and cross type:
+
+* **breedings** and **litters**, the number of breeding cages and of litters (and **litters_per_breeding**).
+* **pups**, the number of pups.
+* **litter_size**, the mean number of pups per litter.
+* **interval**, the mean number of days between consecutive litters of a breeding cage.
+* **wean_survival**, the fraction of the pups whose outcome is known which were weaned (pups which died before weaning count against this, living pups which have not yet been weaned are not included).
+
+The statistics are cached, and the cache key changes whenever animals or breeding cages change.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, Case, When
+
+from mousedb.animal.models import Animal, Breeding
+from mousedb.conditional import latest_change, latest_modified, latest_deletion
+from mousedb.fragments import FRAGMENT_TIMEOUT
+
+def litter_counts():
+    """This returns a list of the (breeding id, strain id, cross type, birth date, pups, weaned, died before weaning) of each litter, ordered by breeding cage and birth date."""
+    return list(Animal.objects.filter(Breeding__isnull=False, Born__isnull=False).order_by().values_list(
+        'Breeding', 'Breeding__Strain', 'Breeding__Crosstype', 'Born').annotate(
+        pups=Count('id'),
+        weaned=Count(Case(When(Weaned__isnull=False, then='id'))),
+        lost=Count(Case(When(Weaned__isnull=True, Alive=False, then='id')))).order_by('Breeding', 'Born'))
+
+def summarize(litters):
+    """This returns the statistics (see above) of a list of litters from :func:`~mousedb.animal.productivity.litter_counts`."""
+    pups = sum(litter[4] for litter in litters)
+    weaned = sum(litter[5] for litter in litters)
+    lost = sum(litter[6] for litter in litters)
+    intervals = [(later[3] - earlier[3]).days for earlier, later in zip(litters, litters[1:]) if earlier[0] == later[0]]
+    breedings = len(set(litter[0] for litter in litters))
+    return {'breedings': breedings,
+            'litters': len(litters),
+            'litters_per_breeding': float(len(litters)) / breedings if breedings else None,
+            'pups': pups,
+            'litter_size': float(pups) / len(litters) if litters else None,
+            'interval': float(sum(intervals)) / len(intervals) if intervals else None,
+            'wean_survival': float(weaned) / (weaned + lost) if weaned + lost else None}
+
+def calculate_productivity():
+    """This returns a dictionary with the statistics of each breeding cage (keyed by its id) as **breeding**, and of each (strain id, cross type) as **strain**."""
+    by_breeding = defaultdict(list)
+    by_strain = defaultdict(list)
+    for litter in litter_counts():
+        by_breeding[litter[0]].append(litter)
+        by_strain[(litter[1], litter[2])].append(litter)
+    return {'breeding': dict((breeding, summarize(litters)) for breeding, litters in by_breeding.items()),
+            'strain': dict((key, summarize(litters)) for key, litters in by_strain.items())}
+
+def productivity():
+    """This returns the statistics from :func:`~mousedb.animal.productivity.calculate_productivity`, which are cached until animals or breeding cages change."""
+    changed = latest_change(latest_modified(Animal.objects.all()), latest_modified(Breeding.objects.all()), latest_deletion(Animal, Breeding))
+    key = 'breeding-productivity-%s' % changed.strftime('%Y%m%d%H%M%S%f')
+    statistics = cache.get(key)
+    if statistics is None:
+        statistics = calculate_productivity()
+        cache.set(key, statistics, FRAGMENT_TIMEOUT)
+    return statistics
+
+def breeding_productivity(breeding):
+    """This returns the statistics of a breeding cage, or None if it has no pups with a birth date."""
+    return productivity()['breeding'].get(breeding.pk)
+
+def strain_productivity(strain):
+    """This returns a list of the statistics of the breeding cages of a strain for each cross type (as crosstype), ordered by cross type."""
+    rows = []
+    for (strain_id, crosstype), statistics in productivity()['strain'].items():
+        if strain_id == strain.pk:
+            row = dict(statistics, crosstype=crosstype or u'Unknown')
+            rows.append(row)
+    return sorted(rows, key=lambda row: row['crosstype'])
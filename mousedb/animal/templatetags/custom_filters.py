@@ -9,4 +9,10 @@ def all_caps(value):
     """This template filter converts a string into all caps."""
     return value.upper()
 
+@register.assignment_tag
+def fragment_version(*args):
+    """This template tag returns the version of a cached table row, from pairs of model names and ids (None for the whole model).
 
+    For example {% fragment_version "animal" animal.id "strain" None as row_version %} (see :mod:`~mousedb.fragments`)."""
+    from mousedb.fragments import fragment_versions
+    return fragment_versions(*zip(args[::2], args[1::2]))
@@ -6,10 +6,20 @@ These tests will verify generation and function of a new breeding, strain and an
 import datetime
 
 from django.test import TestCase
+from django.core.exceptions import ValidationError
 from django.test.client import Client
 from django.contrib.auth.models import User
 
-from mousedb.animal.models import Animal, Strain, Breeding
+from mousedb.animal.models import Animal, Strain, Breeding, CageOccupancy, CensusCount, CageHistory
+from mousedb.animal.forms import BulkUpdateInlineFormSet
+from mousedb.animal.archive import invalidate_birth_archive, births_by_year, births_by_month, births_by_strain
+from mousedb.animal.todo import invalidate_todo_summary, todo_summary, todo_filter, TODO_LISTS
+from mousedb.fragments import fragment_versions
+from mousedb.animal.pedigree import Pedigree
+from mousedb.animal.census import census_series, census_totals, refresh_census
+from mousedb.animal.productivity import breeding_productivity, strain_productivity
+from mousedb.animal.mendelian import parse_genotype, strain_mendelian, mendelian_ratios
+from mousedb.timed_mating.models import PlugEvents
 
 MODELS = [Breeding, Animal, Strain]
 
@@ -61,7 +71,15 @@ class StrainModelTests(TestCase):
         """This is a test for creating a new strain object, then testing absolute url."""
         test_strain = Strain(Strain = "Test Strain", Strain_slug = "test-strain")
         test_strain.save()
-        self.assertEquals(test_strain.get_absolute_url(), "/strain/test-strain")        
+        self.assertEquals(test_strain.get_absolute_url(), "/strain/test-strain")
+
+    def test_strain_summary(self):
+        """This is a test for the annotated strain summary, checking the total, alive, cage and breeding cage counts."""
+        test_strain = Strain.objects.with_summary().get(pk=1)
+        self.assertEquals(test_strain.total, 4)
+        self.assertEquals(test_strain.alive, 4)
+        self.assertEquals(test_strain.cages, 1)
+        self.assertEquals(test_strain.breeding_cages, 2)
 
 class StrainViewTests(TestCase):
     """Test the views contained in the animal app relating to Strain objects."""
@@ -141,6 +159,8 @@ class StrainViewTests(TestCase):
         self.assertTemplateUsed(test_response, 'animal_list.html') 
         self.assertTemplateUsed(test_response, 'menu_script.html')                
         self.assertEqual(test_response.context['list_type'], "Intercross")
+        filtered_response = self.client.get('/strain/fixture-strain/Intercross', {'genotype': '?'})
+        self.assertEqual(len(filtered_response.context['animal_list']), 0)
     
         #first test if the crosstype is wrong
         null_response = self.client.get('/strain/fixture-strain/Not-Intercross')
@@ -250,6 +270,130 @@ class AnimalModelTests(TestCase):
         animal.MouseID = 1234
         animal.save()
         self.assertEquals(animal.__unicode__(), "Fixture Strain-EarTag #1234")
+
+    def test_autocomplete(self):
+        """This is a test for the animal autocomplete, which matches the start of the MouseID, Cage or id and lists living animals and exact matches first."""
+        strain = Strain.objects.get(pk=1)
+        Animal(Strain=strain, Background="Mixed", MouseID=1234, Death=datetime.date(2012,1,1)).save()
+        Animal(Strain=strain, Background="Mixed", MouseID=120).save()
+        Animal(Strain=strain, Background="Mixed", MouseID=12).save()
+        results = list(Animal.objects.autocomplete('12'))
+        self.assertEquals(len(results), 7)
+        self.assertEquals(results[0].MouseID, 12)
+        self.assertEquals(results[-1].MouseID, 1234)
+        self.assertEquals(len(Animal.objects.autocomplete('12', limit=2)), 2)
+        self.assertEquals(len(Animal.objects.autocomplete('9')), 0)
+        self.assertEquals(len(Animal.objects.autocomplete('abc')), 0)
+
+    def test_create_litter(self):
+        """This is a test for creating several identical animals at once, including the Death/Alive rule, that only the new animals start a cage history and that an invalid litter creates no animals."""
+        CageHistory.objects.all().delete()
+        Animal.objects.create_litter(3, Strain = Strain.objects.get(pk=1), Genotype="-/-", Background="Mixed", Death=datetime.date(2012,1,1))
+        self.assertEquals(Animal.objects.filter(Death=datetime.date(2012,1,1), Alive=False).count(), 3)
+        self.assertEquals(sorted(CageHistory.objects.values_list('animal', flat=True)), sorted(Animal.objects.filter(Death=datetime.date(2012,1,1)).values_list('pk', flat=True)))
+        self.assertRaises(ValidationError, Animal.objects.create_litter, 3, Strain = Strain.objects.get(pk=1), Genotype="-/-", Background="Not a Background")
+        self.assertRaises(ValidationError, Animal.objects.create_litter, 0, Strain = Strain.objects.get(pk=1), Genotype="-/-", Background="Mixed")
+        self.assertEquals(Animal.objects.count(), 7)
+
+    def test_create_breeding_litter(self):
+        """This is a test for creating several pups from a breeding cage at once, including a breeding cage with several cages."""
+        breeding = Breeding.objects.get(pk=1)
+        Animal.objects.create_breeding_litter(breeding, 5, Born=datetime.date(2012,1,1), Gender='M')
+        pups = Animal.objects.filter(Breeding=breeding, Born=datetime.date(2012,1,1))
+        self.assertEquals(pups.count(), 5)
+        self.assertEquals(pups.filter(Cage=int(breeding.Cage), Strain=breeding.Strain, Gender='M', Alive=True).count(), 5)
+        breeding.Cage = '12,13'
+        breeding.save()
+        Animal.objects.create_breeding_litter(breeding, 2, Born=datetime.date(2012,2,1))
+        self.assertEquals(list(Animal.objects.filter(Breeding=breeding, Born=datetime.date(2012,2,1)).values_list('Cage', flat=True)), [12, 12])
+
+    def test_bulk_update_formset(self):
+        """This is a test that saving a formset of pups writes only the changed fields of the changed pups."""
+        from django.db import connection
+        from django.forms.models import inlineformset_factory
+        from django.test.utils import CaptureQueriesContext
+        breeding = Breeding.objects.get(pk=1)
+        pup = Animal(Strain=breeding.Strain, Background="Mixed", Breeding=breeding, Born=datetime.date(2012,1,1))
+        pup.save()
+        unchanged_modified = Animal.objects.get(pk=4).modified
+        PupsFormSet = inlineformset_factory(Breeding, Animal, formset=BulkUpdateInlineFormSet, extra=0, fields=('MouseID', 'Cage'))
+        data = {'animal_set-TOTAL_FORMS': '2', 'animal_set-INITIAL_FORMS': '2', 'animal_set-MAX_NUM_FORMS': '1000',
+                'animal_set-0-id': '4', 'animal_set-0-MouseID': '', 'animal_set-0-Cage': '123456',
+                'animal_set-1-id': str(pup.pk), 'animal_set-1-MouseID': '1234', 'animal_set-1-Cage': ''}
+        formset = PupsFormSet(data, instance=breeding, queryset=breeding.animal_set.order_by('pk'))
+        self.assertTrue(formset.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            formset.save()
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "animal_animal"')]
+        self.assertEquals(len(updates), 2)
+        self.assertTrue('"MouseID"' in updates[0] and '"Cage"' not in updates[0])
+        self.assertEquals(Animal.objects.get(pk=pup.pk).MouseID, 1234)
+        self.assertEquals(Animal.objects.get(pk=4).modified, unchanged_modified)
+
+    def test_pedigree(self):
+        """This tests the ancestors, descendants, depth and inbreeding coefficient of a full sibling mating, including parents found from a breeding cage, and that the parents of the colony are cached."""
+        strain = Strain.objects.get(pk=1)
+        def new_animal(**fields):
+            animal = Animal(Strain=strain, Background="Mixed", **fields)
+            animal.save()
+            return animal
+        father = new_animal(Gender="M")
+        mother = new_animal(Gender="F")
+        breeding = Breeding(Strain=strain)
+        breeding.save()
+        breeding.Male.add(father)
+        breeding.Females.add(mother)
+        brother = new_animal(Gender="M", Breeding=breeding)
+        sister = new_animal(Gender="F", Father=father, Mother=mother)
+        pup = new_animal(Father=brother, Mother=sister)
+        with self.assertNumQueries(3):
+            pedigree = Pedigree.load(Animal.objects.all())
+        self.assertEquals(Pedigree.load().parents, pedigree.parents)
+        with self.assertNumQueries(2):
+            self.assertEquals(Pedigree.load().parents, pedigree.parents)
+        self.assertEquals(pedigree.ancestors(pup.pk), {brother.pk: 1, sister.pk: 1, father.pk: 2, mother.pk: 2})
+        self.assertEquals(pedigree.descendants(father.pk), {brother.pk: 1, sister.pk: 1, pup.pk: 2})
+        self.assertEquals(pedigree.descendants(father.pk, max_generations=1), {brother.pk: 1, sister.pk: 1})
+        self.assertEquals(pedigree.depth(pup.pk), 2)
+        self.assertEquals(pedigree.inbreeding(pup.pk), 0.25)
+        self.assertEquals(pedigree.inbreeding(brother.pk), 0)
+
+    def test_census(self):
+        """This tests the daily census of living animals and cages of a strain, and the animal days and cage days over a period."""
+        strain = Strain(Strain="Census Strain", Strain_slug="census-strain")
+        strain.save()
+        for born, death, cage in [(datetime.date(2013,1,1), None, 1), (datetime.date(2013,1,5), datetime.date(2013,1,10), 1), (datetime.date(2013,1,5), datetime.date(2013,1,8), 2)]:
+            animal = Animal(Strain=strain, Background="Mixed", Born=born, Death=death, Cage=cage)
+            animal.save()
+        series = dict((date, (animals, cages)) for date, animals, cages in census_series(datetime.date(2012,12,31), datetime.date(2013,1,10), [strain.pk]))
+        self.assertEquals(series[datetime.date(2012,12,31)], (0, 0))
+        self.assertEquals(series[datetime.date(2013,1,4)], (1, 1))
+        self.assertEquals(series[datetime.date(2013,1,7)], (3, 2))
+        self.assertEquals(series[datetime.date(2013,1,8)], (2, 1))
+        self.assertEquals(series[datetime.date(2013,1,10)], (1, 1))
+        self.assertEquals(census_totals(datetime.date(2013,1,1), datetime.date(2013,1,10), [strain.pk]), {strain.pk: (18, 13)})
+        #changes to saved animals are applied to the stored census, which should match a recalculation
+        animal = Animal.objects.get(Strain=strain, Cage=2)
+        animal.Cage = 1
+        animal.Death = datetime.date(2013,1,12)
+        animal.save()
+        Animal.objects.filter(Strain=strain, Born=datetime.date(2013,1,1)).delete()
+        stored = list(CensusCount.objects.filter(Strain=strain).order_by('date').values_list('date', 'animals', 'cages'))
+        self.assertEquals(stored, [(datetime.date(2013,1,5), 2, 1), (datetime.date(2013,1,10), 1, 1), (datetime.date(2013,1,12), 0, 0)])
+        refresh_census([strain.pk])
+        self.assertEquals(list(CensusCount.objects.filter(Strain=strain).order_by('date').values_list('date', 'animals', 'cages')), stored)
+
+    def test_fragment_versions(self):
+        """This is a test that saving an animal changes the versions of its cached table row and of its breeding cage row, but not of other animals."""
+        versions = [fragment_versions(('animal', pk)) for pk in (1, 2)]
+        breeding_version = fragment_versions(('breeding', 1))
+        self.assertEquals(fragment_versions(('animal', 1)), versions[0])
+        animal = Animal.objects.get(pk=1)
+        animal.Breeding_id = 1
+        animal.save()
+        self.assertNotEquals(fragment_versions(('animal', 1)), versions[0])
+        self.assertEquals(fragment_versions(('animal', 2)), versions[1])
+        self.assertNotEquals(fragment_versions(('breeding', 1)), breeding_version)
         
 class AnimalViewTests(TestCase):
     """Tests the views associated with animal objects."""
@@ -279,7 +423,7 @@ class AnimalViewTests(TestCase):
         response = self.client.get('/animal/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 4)        
+        self.assertEqual(len(response.context['animal_list']), 4)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -299,7 +443,7 @@ class AnimalViewTests(TestCase):
         response = self.client.get('/animal/all/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 4)        
+        self.assertEqual(len(response.context['animal_list']), 4)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -437,6 +581,102 @@ class BreedingModelTests(TestCase):
         """This is a test for the unweaned animal list.  It creates several animals for a breeding object and tests that they are tagged as unweaned.  They are then weaned and retested to be tagged as not unweaned.  This test is incomplete."""
         pass
 
+    def test_with_table_data(self):
+        """This tests that the breeding table data is preloaded, so that rendering the pup counts and breeder locations requires no further queries."""
+        test_breeding = Breeding.objects.get(pk=1)
+        test_breeding.Male.add(Animal.objects.get(pk=1))
+        test_breeding.Females.add(Animal.objects.get(pk=2))
+        breeding_list = list(Breeding.objects.with_table_data())
+        with self.assertNumQueries(0):
+            test_breeding = [breeding for breeding in breeding_list if breeding.pk == 1][0]
+            self.assertEquals(test_breeding.pup_count, 1)
+            self.assertEquals(test_breeding.unweaned_count, 1)
+            self.assertEquals(test_breeding.Strain.Strain, u'Fixture Strain')
+            self.assertEquals([male.breeding_male_location_type() for male in test_breeding.Male.all()], ["non-resident-breeder"])
+            self.assertEquals([female.breeding_female_location_type() for female in test_breeding.Females.all()], ["non-resident-breeder"])
+
+    def test_in_cages(self):
+        """This tests that breeding cages are found by exact cage numbers and ranges, including breeding cages with several cages."""
+        self.assertEquals(list(Breeding.objects.in_cages('12345')), [Breeding.objects.get(pk=1)])
+        self.assertEquals(list(Breeding.objects.in_cages('1234')), [])
+        self.assertEquals(list(Breeding.objects.in_cages('12000-13000')), [Breeding.objects.get(pk=1)])
+        self.assertEquals(list(Breeding.objects.in_cages('cage 12')), [])
+        test_breeding = Breeding.objects.get(pk=1)
+        test_breeding.Cage = '12,112'
+        test_breeding.save()
+        self.assertEquals(list(Breeding.objects.in_cages('12')), [test_breeding])
+        self.assertEquals(list(Breeding.objects.in_cages('1')), [])
+        self.assertEquals(list(Breeding.objects.in_cages('12345')), [])
+        male = Animal.objects.get(pk=1)
+        male.Cage = 112
+        male.save()
+        test_breeding.Male.add(male)
+        self.assertEquals(test_breeding.male_breeding_location_type(), "resident breeder")
+
+    def test_productivity(self):
+        """This tests the litter sizes, intervals between litters and survival to weaning of breeding cages and of their strain and cross type."""
+        strain = Strain(Strain="Productivity Strain", Strain_slug="productivity-strain")
+        strain.save()
+        breedings = [Breeding(Strain=strain, Crosstype='HET vs HET') for index in range(2)]
+        for breeding in breedings:
+            breeding.save()
+        pups = [(breedings[0], datetime.date(2013,1,1), datetime.date(2013,1,21), True),
+                (breedings[0], datetime.date(2013,1,1), datetime.date(2013,1,21), True),
+                (breedings[0], datetime.date(2013,1,1), None, False),
+                (breedings[0], datetime.date(2013,1,22), None, True),
+                (breedings[0], datetime.date(2013,1,22), None, True)]
+        pups += [(breedings[1], datetime.date(2013,2,1), datetime.date(2013,2,21), True)] * 4
+        for breeding, born, weaned, alive in pups:
+            animal = Animal(Strain=strain, Background="Mixed", Breeding=breeding, Born=born, Weaned=weaned, Alive=alive)
+            animal.save()
+        statistics = breeding_productivity(breedings[0])
+        self.assertEquals((statistics['litters'], statistics['pups'], statistics['litter_size'], statistics['interval']), (2, 5, 2.5, 21.0))
+        self.assertAlmostEqual(statistics['wean_survival'], 2.0 / 3)
+        rows = strain_productivity(strain)
+        self.assertEquals(len(rows), 1)
+        self.assertEquals((rows[0]['crosstype'], rows[0]['breedings'], rows[0]['litters'], rows[0]['pups'], rows[0]['litters_per_breeding'], rows[0]['litter_size'], rows[0]['interval']),
+                          ('HET vs HET', 2, 3, 9, 1.5, 3.0, 21.0))
+        self.assertAlmostEqual(rows[0]['wean_survival'], 6.0 / 7)
+        self.assertEquals(breeding_productivity(Breeding(Strain=strain)), None)
+
+    def test_mendelian(self):
+        """This tests the expected and observed genotypes of pups from a cross type and from genotyped (X-linked) breeders, and of the embryos of a timed mating cohort."""
+        strain = Strain(Strain="Mendelian Strain", Strain_slug="mendelian-strain")
+        strain.save()
+        self.assertEquals(parse_genotype('+/-; Tg/+'), parse_genotype('-/+;Tg/+'))
+        self.assertEquals(parse_genotype('fl/fl; ?'), None)
+        intercross = Breeding(Strain=strain, Crosstype='HET vs HET')
+        intercross.save()
+        for genotype in ['+/+'] * 2 + ['-/+'] * 4 + ['-/-'] * 2 + ['Tg/+', '-/-; Tg/+', 'N.D.']:
+            animal = Animal(Strain=strain, Background="Mixed", Breeding=intercross, Genotype=genotype)
+            animal.save()
+        xlinked = Breeding(Strain=strain, Crosstype='HET vs HET')
+        xlinked.save()
+        for gender, genotype in [('M', '-/Y'), ('F', '-/+')]:
+            breeder = Animal(Strain=strain, Background="Mixed", Gender=gender, Genotype=genotype)
+            breeder.save()
+            (xlinked.Male if gender == 'M' else xlinked.Females).add(breeder)
+        animal = Animal(Strain=strain, Background="Mixed", Breeding=xlinked, Genotype='-/Y')
+        animal.save()
+        plug = PlugEvents(Breeding=intercross, PlugDate=datetime.date(2013,1,1), Researcher=None, WT_Alive=1, HET_Alive=2, KO_Alive=0, KO_Dead=1)
+        plug.save()
+        results = mendelian_ratios()
+        test = results['breeding'][intercross.pk]
+        self.assertEquals((test['total'], test['unexpected'], test['unclassified']), (8, 1, 1))
+        self.assertEquals([(row['genotype'], row['expected_fraction'], row['observed']) for row in test['classes']], [('+/+', 0.25, 2), ('-/+', 0.5, 4), ('-/-', 0.25, 2)])
+        self.assertAlmostEqual(test['chi_square'], 0)
+        self.assertAlmostEqual(test['p_value'], 1)
+        test = results['breeding'][xlinked.pk]
+        self.assertEquals([(row['genotype'], row['expected'], row['observed']) for row in test['classes']], [('+/Y', 0.25, 0), ('-/+', 0.25, 0), ('-/-', 0.25, 0), ('-/Y', 0.25, 1)])
+        pups, cohorts = strain_mendelian(strain)
+        self.assertEquals((pups['total'], pups['unexpected']), (9, 1))
+        self.assertEquals([row['genotype'] for row in pups['classes']], ['+/+', '+/Y', '-/+', '-/-', '-/Y'])
+        self.assertEquals(len(cohorts), 1)
+        self.assertEquals(cohorts[0]['crosstype'], 'HET vs HET')
+        self.assertEquals([(row['expected'], row['observed']) for row in cohorts[0]['all']['classes']], [(1, 1), (2, 2), (1, 1)])
+        self.assertEquals(cohorts[0]['alive']['total'], 3)
+        self.assertAlmostEqual(cohorts[0]['all']['p_value'], 1)
+
 class BreedingViewTests(TestCase):
     """These are tests for views based on Breeding objects.  Included are tests for breeding list (active and all), details, create, update and delete pages as well as for the timed mating lists."""
     fixtures = ['test_breeding', 'test_animals', 'test_strain', 'test_group']
@@ -533,6 +773,33 @@ class BreedingViewTests(TestCase):
 
         null_response = self.client.get('/breeding/999')
         self.assertEqual(null_response.status_code, 404)          
+        #anonymous users are redirected to log in before the breeding cage is looked up
+        self.assertEqual(Client().get('/breeding/1').status_code, 302)
+        self.assertEqual(Client().get('/breeding/999').status_code, 302)
+
+    def test_breeding_wean(self):
+        """This test checks the view which weans the pups of a breeding cage.  It checks that only the pups of that cage are shown and that only changed fields are saved."""
+        response = self.client.get('/breeding/1/wean/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'breeding_wean.html')
+        self.assertEqual([form.instance.pk for form in response.context['formset'].forms], [4])
+        response = self.client.post('/breeding/1/wean/', {
+            'animal_set-TOTAL_FORMS': '1',
+            'animal_set-INITIAL_FORMS': '1',
+            'animal_set-MAX_NUM_FORMS': '1000',
+            'animal_set-0-id': '4',
+            'animal_set-0-Breeding': '1',
+            'animal_set-0-MouseID': '77',
+            'animal_set-0-Cage': '123456',
+            'animal_set-0-Markings': '',
+            'animal_set-0-Gender': 'N.D.',
+            'animal_set-0-Born': '',
+            'animal_set-0-Weaned': '2012-01-01'})
+        self.assertEqual(response.status_code, 302)
+        animal = Animal.objects.get(pk=4)
+        self.assertEqual(animal.MouseID, 77)
+        self.assertEqual(animal.Weaned, datetime.date(2012,1,1))
+        self.assertEqual(animal.Cage, 123456)
 
     def test_breeding_edit(self):
         """This test checks the view which displays a breeding edit page.  It checks for the correct templates and status code."""
@@ -612,12 +879,27 @@ class CageViewTests(TestCase):
 
         response = self.client.get('/cage/123456/')
         self.assertEqual(response.status_code, 200)
+        filtered_response = self.client.get('/cage/123456/', {'genotype': '-/-'})
+        self.assertEqual(sorted(animal.pk for animal in filtered_response.context['animal_list']), [1, 2, 4])
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
         self.assertTemplateUsed(response, 'sortable_table_script.html')
         self.assertTemplateUsed(response, 'animal_list.html')				
         self.assertTemplateUsed(response, 'animal_list_table.html')	
+
+    def test_cage_occupancy(self):
+        """This test checks that the cage occupancy index follows an animal which is moved to another cage, and that the cage list can be searched by cage number."""
+        before = sum(CageOccupancy.objects.filter(Cage=123456).values_list('alive', flat=True))
+        self.assertTrue(before > 0)
+        animal = Animal.objects.filter(Cage=123456, Alive=True)[0]
+        animal.Cage = 654321
+        animal.save()
+        self.assertEqual(sum(CageOccupancy.objects.filter(Cage=123456).values_list('alive', flat=True)), before - 1)
+        self.assertEqual(CageOccupancy.objects.get(Cage=654321).alive, 1)
+        response = self.client.get('/cage/', {'q': '6543'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([cage.Cage for cage in response.context['cage_list']], [654321])
 		
 class DateViewTests(TestCase):
     """These are tests for views based on animal objects as directed by date based urls.  Included are tests for archive-home, archive-month and archive-year"""
@@ -630,11 +912,32 @@ class DateViewTests(TestCase):
         self.test_user.is_active = True
         self.test_user.save()
         self.client.login(username='blah', password='blah')
+        invalidate_birth_archive()
 
     def tearDown(self):
         self.client.logout()
         self.test_user.delete()
 
+    def test_birth_archive(self):
+        """This test checks the birth counts by year, month and strain and that they are updated when a Born date or Strain is changed or an animal is deleted."""
+        with self.assertNumQueries(1):
+            self.assertEqual(births_by_year()[2011], 3)
+            self.assertEqual(births_by_month(2011)[datetime.date(2011,1,1)], 3)
+            self.assertEqual(births_by_strain(2011), [(u'Fixture Strain', u'fixture-strain', 3)])
+        animal = Animal.objects.get(pk=1)
+        animal.Born = datetime.date(2012,2,1)
+        animal.save()
+        self.assertEqual(births_by_year()[2011], 2)
+        self.assertEqual(births_by_year()[2012], 1)
+        self.assertEqual(births_by_strain(2012, 2), [(u'Fixture Strain', u'fixture-strain', 1)])
+        strain = Strain(Strain="Archive Strain", Strain_slug="archive-strain")
+        strain.save()
+        animal.Strain = strain
+        animal.save()
+        self.assertEqual(births_by_strain(2012, 2), [(u'Archive Strain', u'archive-strain', 1)])
+        Animal.objects.filter(pk=2).delete()
+        self.assertEqual(births_by_year()[2011], 1)
+
     def test_archive_home(self):
         """This test checks the view which displays a summary of the birthdates of animals.  It checks for the correct templates and status code."""        
 
@@ -654,7 +957,9 @@ class DateViewTests(TestCase):
         response = self.client.get('/date/2011/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)  
-        self.assertEqual(response.context['animal_list'].count(), 3)        
+        self.assertEqual(len(response.context['animal_list']), 3)        
+        self.assertEqual(dict(response.context['month_counts'])[datetime.date(2011,1,1)], 3)
+        self.assertEqual(response.context['strain_counts'], [(u'Fixture Strain', u'fixture-strain', 3)])
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -674,7 +979,7 @@ class DateViewTests(TestCase):
         response = self.client.get('/date/2011/01/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)  
-        self.assertEqual(response.context['animal_list'].count(), 3)        
+        self.assertEqual(len(response.context['animal_list']), 3)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -703,6 +1008,7 @@ class ToDoViewTests(TestCase):
         self.assertEqual(self.test_user.is_superuser, True)
         login = self.client.login(username='testuser', password='testpassword')
         self.failUnless(login, 'Could not log in')
+        invalidate_todo_summary()
 
     def tearDown(self):
         """Depopulate created model instances from test database."""
@@ -710,6 +1016,22 @@ class ToDoViewTests(TestCase):
             for obj in model.objects.all():
                 obj.delete()    
 
+    def test_todo_summary(self):
+        """This test checks that the todo summary matches the todo list queries and is updated without any queries when an animal is saved or deleted."""
+        summary = todo_summary()
+        for todo_list in TODO_LISTS:
+            self.assertEqual(sorted(summary[todo_list]), sorted(Animal.objects.filter(todo_filter(todo_list)).values_list('pk', flat=True)))
+        self.assertEqual(sorted(summary['eartag']), [1,2,3])
+        self.assertEqual(todo_summary(today=datetime.date(2011,1,2))['eartag'], [])
+        animal = Animal.objects.get(pk=1)
+        animal.MouseID = 1234
+        animal.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(sorted(todo_summary()['eartag']), [2,3])
+        Animal.objects.get(pk=2).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(sorted(todo_summary()['eartag']), [3])
+
     def test_todo_home(self):
         """This test checks the view which displays a summary of the todo lists.  It checks for the correct templates and status code."""        
 
@@ -729,7 +1051,7 @@ class ToDoViewTests(TestCase):
         response = self.client.get('/todo/eartag/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 3)        
+        self.assertEqual(len(response.context['animal_list']), 3)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -749,7 +1071,7 @@ class ToDoViewTests(TestCase):
         response = self.client.get('/todo/genotype/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 1)        
+        self.assertEqual(len(response.context['animal_list']), 1)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -769,7 +1091,7 @@ class ToDoViewTests(TestCase):
         response = self.client.get('/todo/genotype/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 1)        
+        self.assertEqual(len(response.context['animal_list']), 1)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -789,7 +1111,7 @@ class ToDoViewTests(TestCase):
         response = self.client.get('/todo/genotype/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 1)        
+        self.assertEqual(len(response.context['animal_list']), 1)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
@@ -809,7 +1131,7 @@ class ToDoViewTests(TestCase):
         response = self.client.get('/todo/genotype/')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('animal_list' in response.context)    
-        self.assertEqual(response.context['animal_list'].count(), 1)        
+        self.assertEqual(len(response.context['animal_list']), 1)        
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
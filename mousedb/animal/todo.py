@@ -0,0 +1,141 @@
+"""This module keeps a summary of the animals on each of the todo lists.
+
+The todo lists are:
+
+* **eartag**, living animals with no eartag (MouseID) older than WEAN_AGE.
+* **genotype**, living animals with a genotype of N.D. (or containing a ?) older than GENOTYPE_AGE.
+* **wean**, living animals which have not been weaned and are older than WEAN_AGE.
+* **no_cage**, living animals with no cage.
+* **no_rack**, living animals with no rack.
+
+The summary stores, for each list, the ids of the animals which meet all the conditions except for their age, sorted by their birth date.
+The age cutoffs are applied when the summary is read, so the lists are always correct for the current date without querying the animals.
+The summary is kept in the cache and is updated in place from the save and delete signals of each :class:`~mousedb.animal.models.Animal`, so reading it requires no queries.
+Bulk changes which do not send signals clear the summary, so it is rebuilt (with one query) the next time it is read.
+The summary is only shared between server processes if they share a cache (for example the file-based cache, see :mod:`~mousedb.fragments`), otherwise each process keeps its own copy which only sees its own saves.
+As the in place updates are not atomic (two processes saving at once can each overwrite the other's update), the summary expires after TODO_SUMMARY_TIMEOUT, which limits how long any such error lasts.
+"""
+
+import datetime
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mousedb.animal.models import Animal
+
+TODO_SUMMARY_CACHE_KEY = 'animal-todo-summary'
+#the longest time a missed update can remain in the summary
+TODO_SUMMARY_TIMEOUT = 60 * 10
+
+TODO_LISTS = ('eartag', 'genotype', 'wean', 'no_cage', 'no_rack')
+
+def todo_age(todo_list):
+    """This returns the minimum age (in days) of the animals on a todo list, or None if the list does not depend on age."""
+    return {'eartag': settings.WEAN_AGE,
+            'genotype': settings.GENOTYPE_AGE,
+            'wean': settings.WEAN_AGE}.get(todo_list)
+
+def todo_filter(todo_list, today=None):
+    """This returns a Q object which selects the animals on a todo list, with the age cutoff calculated from today (the current date by default)."""
+    conditions = {'eartag': Q(MouseID__isnull=True),
+                  'genotype': Q(Genotype='N.D.')|Q(Genotype__icontains='?'),
+                  'wean': Q(Weaned=None),
+                  'no_cage': Q(Cage__exact=None),
+                  'no_rack': Q(Rack__iexact='')}[todo_list]
+    age = todo_age(todo_list)
+    if age is not None:
+        conditions &= Q(Born__lt=(today or datetime.date.today()) - datetime.timedelta(days=age))
+    return conditions & Q(Alive=True)
+
+def animal_todo_lists(animal):
+    """This returns the todo lists an animal belongs on, ignoring its age."""
+    if not animal.Alive:
+        return []
+    todo_lists = []
+    if animal.Born:
+        if animal.MouseID is None:
+            todo_lists.append('eartag')
+        if animal.Genotype == 'N.D.' or '?' in animal.Genotype:
+            todo_lists.append('genotype')
+        if animal.Weaned is None:
+            todo_lists.append('wean')
+    if animal.Cage is None:
+        todo_lists.append('no_cage')
+    if animal.Rack == '':
+        todo_lists.append('no_rack')
+    return todo_lists
+
+def _add_animal(summary, animal):
+    """This adds an animal to the todo lists it belongs on in the summary."""
+    key = (animal.Born and animal.Born.toordinal() or 0, animal.pk)
+    todo_lists = animal_todo_lists(animal)
+    for todo_list in todo_lists:
+        insort(summary['lists'][todo_list], key)
+    if todo_lists:
+        summary['animals'][animal.pk] = (key, todo_lists)
+
+def _remove_animal(summary, pk):
+    """This removes an animal from all the todo lists in the summary."""
+    key, todo_lists = summary['animals'].pop(pk, (None, []))
+    for todo_list in todo_lists:
+        entries = summary['lists'][todo_list]
+        index = bisect_left(entries, key)
+        if index < len(entries) and entries[index] == key:
+            del entries[index]
+
+def build_todo_summary():
+    """This recalculates the todo summary from the database and stores it in the cache.
+
+    This requires a single query of the living animals."""
+    summary = {'lists': dict((todo_list, []) for todo_list in TODO_LISTS), 'animals': {}}
+    for animal in Animal.objects.filter(Alive=True).only('id', 'Born', 'MouseID', 'Genotype', 'Weaned', 'Cage', 'Rack', 'Alive').order_by():
+        _add_animal(summary, animal)
+    cache.set(TODO_SUMMARY_CACHE_KEY, summary, TODO_SUMMARY_TIMEOUT)
+    return summary
+
+def invalidate_todo_summary():
+    """This clears the todo summary, so that it will be rebuilt the next time it is read."""
+    cache.delete(TODO_SUMMARY_CACHE_KEY)
+
+def todo_summary(today=None):
+    """This returns a dictionary of the ids of the animals on each todo list, with the age cutoffs calculated from today (the current date by default).
+
+    The summary is rebuilt if it is not in the cache."""
+    summary = cache.get(TODO_SUMMARY_CACHE_KEY)
+    if summary is None:
+        summary = build_todo_summary()
+    today = today or datetime.date.today()
+    result = {}
+    for todo_list in TODO_LISTS:
+        entries = summary['lists'][todo_list]
+        age = todo_age(todo_list)
+        if age is not None:
+            entries = entries[:bisect_left(entries, ((today - datetime.timedelta(days=age)).toordinal(), 0))]
+        result[todo_list] = [pk for born, pk in entries]
+    return result
+
+@receiver(post_save, sender=Animal)
+def update_todo_summary(sender, instance, raw=False, **kwargs):
+    """This moves a saved animal onto the correct todo lists.
+
+    Fixture loading (raw saves) clears the summary instead."""
+    if raw:
+        invalidate_todo_summary()
+        return
+    summary = cache.get(TODO_SUMMARY_CACHE_KEY)
+    if summary is not None:
+        _remove_animal(summary, instance.pk)
+        _add_animal(summary, instance)
+        cache.set(TODO_SUMMARY_CACHE_KEY, summary, TODO_SUMMARY_TIMEOUT)
+
+@receiver(post_delete, sender=Animal)
+def remove_from_todo_summary(sender, instance, **kwargs):
+    """This removes a deleted animal from the todo lists."""
+    summary = cache.get(TODO_SUMMARY_CACHE_KEY)
+    if summary is not None:
+        _remove_animal(summary, instance.pk)
+        cache.set(TODO_SUMMARY_CACHE_KEY, summary, TODO_SUMMARY_TIMEOUT)
@@ -14,6 +14,7 @@ from django.http import Http404
 from django.template import RequestContext
 from django.db.models import Count
 from django.core import serializers
+from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse, reverse_lazy
 from django.db.models import Q
 from django.utils.decorators import method_decorator
@@ -22,23 +23,39 @@ from django.views.generic import CreateView, UpdateView, DeleteView, YearArchive
 from django.conf import settings
 
 from mousedb.views import ProtectedListView, ProtectedDetailView
+from mousedb.pagination import KeysetPaginationMixin
+from mousedb.conditional import ConditionalGetMixin, latest_modified, latest_deletion, latest_change
 
 
-from mousedb.animal.models import Animal, Strain, Breeding
+from mousedb.animal.models import Animal, Strain, Breeding, CageOccupancy, integer_prefix_filter
+from mousedb.animal.pedigree import Pedigree, PEDIGREE_GENERATIONS
+from mousedb.animal.productivity import breeding_productivity, strain_productivity
+from mousedb.animal.mendelian import strain_mendelian
+from mousedb.animal.archive import births_by_year, births_by_month, births_by_strain
+from mousedb.animal.todo import todo_summary, todo_filter
 from mousedb.data.models import Measurement
-from mousedb.animal.forms import MultipleAnimalForm, MultipleBreedingAnimalForm, BreedingForm, AnimalForm
+from mousedb.animal.forms import MultipleAnimalForm, MultipleBreedingAnimalForm, BreedingForm, AnimalForm, BulkUpdateInlineFormSet
 
-class AnimalList(ProtectedListView):
+class AnimalList(KeysetPaginationMixin, ProtectedListView):
     """This view generates a list of :class:`~mousedb.animal.models.Animal` objects as animal-list
     
     This view responds to a url in the form */animal*
-    It sends a variable animal containing all animals to animal_list.html.
+    It sends a variable animal containing one page of animals to animal_list.html.
+    The animals are sorted, filtered and paged in the database using keyset pagination (see :class:`~mousedb.pagination.KeysetPaginationMixin`).
+    By default animals are sorted by Born then by id, and they can be filtered by strain (the strain slug), genotype, gender, background, cage or rack.
     This view is login protected."""
     
     model = Animal
     template_name = 'animal_list.html'
     context_object_name = 'animal_list'
     allow_empty = True
+    sort_fields = {'born':'Born', 'mouseid':'MouseID', 'cage':'Cage', 'rack':'Rack', 'genotype':'Genotype', 'gender':'Gender', 'background':'Background', 'backcross':'Backcross', 'generation':'Generation'}
+    default_sort = 'born'
+    filter_fields = {'strain':'Strain__Strain_slug', 'genotype':'Genotype', 'gender':'Gender', 'background':'Background', 'cage':'Cage', 'rack':'Rack__iexact'}
+    
+    def get_queryset(self):
+        """The queryset prefetches the strain and breeding cages used in each row of the table."""
+        return super(AnimalList, self).get_queryset().with_breeder_residency()
     
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
@@ -71,6 +88,22 @@ class AnimalDetail(ProtectedDetailView):
     model = Animal
     template_name = 'animal_detail.html'
     context_object_name = 'animal'
+
+    def get_context_data(self, **kwargs):
+        """This adds the pedigree of the animal, with its ancestors (up to PEDIGREE_GENERATIONS generations back) and offspring, the number of descendants, the generation depth and the inbreeding coefficient (see :mod:`~mousedb.animal.pedigree`)."""
+        context = super(AnimalDetail, self).get_context_data(**kwargs)
+        summary = Pedigree.load().summary(self.object.pk)
+        ancestors = dict((pk, generation) for pk, generation in summary['ancestors'].items() if generation <= PEDIGREE_GENERATIONS)
+        offspring = [pk for pk, generation in summary['descendants'].items() if generation == 1]
+        relatives = Animal.objects.filter(pk__in=list(ancestors) + offspring).select_related('Strain').order_by('pk')
+        for relative in relatives:
+            relative.generation = ancestors.get(relative.pk, 0)
+        context['ancestors'] = sorted([relative for relative in relatives if relative.pk in ancestors], key=lambda relative: (relative.generation, relative.pk))
+        context['offspring'] = [relative for relative in relatives if relative.pk not in ancestors]
+        context['descendant_count'] = len(summary['descendants'])
+        context['pedigree_depth'] = summary['depth']
+        context['inbreeding'] = summary['inbreeding']
+        return context
     
 class AnimalCreate(CreateView):
     """This class generates the new :class:`~mousedb.animal.models.Animal` view (animal-new).
@@ -123,21 +156,22 @@ class StrainList(ProtectedListView):
     """This class generates an object list for :class:`~mousedb.animal.models.Strain` objects.
     
     This login protected view takes all :class:`~mousedb.animal.models.Strain` objects and sends them to strain_list.html as a strain_list dictionary.  It also passes a strain_list_alive and cages dictionary to show the numbers for total cages and total strains.
+    The strains are annotated with their totals (see :meth:`~mousedb.animal.models.StrainQuerySet.with_summary`) so this page uses a constant number of queries.
     The url for this view is **/strain/**"""
     
-    model = Strain
+    queryset = Strain.objects.with_summary()
     context_object_name = 'strain_list'
     template_name = "strain_list.html"  
 
     def get_context_data(self, **kwargs):
-        """This add in the context of strain_list_alive (which filters for all alive animals) and cages which filters for the number of current cages."""
+        """This add in the context of strain_list_alive (the strains with alive animals) and cages which is the number of current cages."""
         
         context = super(StrainList, self).get_context_data(**kwargs)
-        context['strain_list_alive'] = Strain.objects.filter(animal__Alive=True).annotate(alive=Count('animal'))
-        context['cages'] = Animal.objects.filter(Alive=True).values("Cage")        
+        context['strain_list_alive'] = [strain for strain in context['strain_list'] if strain.alive]
+        context['cages'] = Animal.objects.filter(Alive=True).values("Cage").distinct().count()
         return context    
 
-class StrainDetail(LoginRequiredMixin, DetailView):
+class StrainDetail(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     """This view displays specific details about a :class:`~mousedb.animal.models.Strain` object showing *only current* related objects.
 	
     It takes a request in the form *strain/(strain_slug)/* and renders the detail page for that :class:`~mousedb.animal.models.Strain`.
@@ -149,15 +183,27 @@ class StrainDetail(LoginRequiredMixin, DetailView):
     slug_field = 'Strain_slug'
     context_object_name = 'strain' 
     template_name = "strain_detail.html"    
+
+    def get_last_modified(self):
+        """This page changes with the strain, its animals and breeding cages, the breeders in those cages and their plug events."""
+        from mousedb.timed_mating.models import PlugEvents
+        strain = get_object_or_404(Strain.objects.only('id', 'modified'), Strain_slug=self.kwargs['slug'])
+        return latest_change(strain.modified,
+                             latest_modified(Animal.objects.filter(Q(Strain=strain)|Q(breeding_males__Strain=strain)|Q(breeding_females__Strain=strain))),
+                             latest_modified(Breeding.objects.filter(Strain=strain)),
+                             latest_modified(PlugEvents.objects.filter(Q(Breeding__Strain=strain)|Q(PlugFemale__Strain=strain))),
+                             latest_deletion(Animal, Breeding, PlugEvents))
     
     def get_context_data(self, **kwargs):
         """This add in the context of strain_list_alive (which filters for only alive animals and active) and cages which filters for the number of current cages."""
         
         strain = super(StrainDetail, self).get_object()
         context = super(StrainDetail, self).get_context_data(**kwargs)
-        context['breeding_cages'] = Breeding.objects.filter(Strain=strain).filter(Active=True)
+        context['breeding_cages'] = Breeding.objects.filter(Strain=strain).filter(Active=True).with_table_data()
         context['animal_list'] = Animal.objects.filter(Strain=strain, Alive=True).order_by('Background','Genotype')
         context['cages'] = Animal.objects.filter(Strain=strain, Alive=True).values("Cage", "Alive").filter(Alive=True).distinct()
+        context['productivity'] = strain_productivity(strain)
+        context['mendelian'], context['mendelian_cohorts'] = strain_mendelian(strain)
         context['active'] = True        
         return context  
     
@@ -175,9 +221,11 @@ class StrainDetailAll(StrainDetail):
         
         strain = super(StrainDetail, self).get_object()
         context = super(StrainDetail, self).get_context_data(**kwargs)
-        context['breeding_cages'] = Breeding.objects.filter(Strain=strain)
+        context['breeding_cages'] = Breeding.objects.filter(Strain=strain).with_table_data()
         context['animal_list'] = Animal.objects.filter(Strain=strain).order_by('Background','Genotype')
         context['cages'] = Animal.objects.filter(Strain=strain).values("Cage").distinct()
+        context['productivity'] = strain_productivity(strain)
+        context['mendelian'], context['mendelian_cohorts'] = strain_mendelian(strain)
         context['active'] = False        
         return context      
  
@@ -232,7 +280,7 @@ class StrainDelete(DeleteView):
         """This decorator sets this view to have restricted permissions."""
         return super(StrainDelete, self).dispatch(*args, **kwargs)  
 
-class BreedingDetail(ProtectedDetailView):
+class BreedingDetail(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     """This view displays specific details about a :class:`~mousedb.animal.models.Breeding` object.
 
     It takes a request in the form */breeding/(breeding_id)* and renders the detail page for that breeding set.
@@ -243,6 +291,21 @@ class BreedingDetail(ProtectedDetailView):
     model = Breeding
     context_object_name = 'breeding' 
     template_name = "breeding_detail.html"  
+
+    def get_last_modified(self):
+        """This page changes with the breeding cage, its breeders, pups and plug events."""
+        from mousedb.timed_mating.models import PlugEvents
+        breeding = get_object_or_404(Breeding.objects.only('id', 'modified'), pk=self.kwargs['pk'])
+        return latest_change(breeding.modified,
+                             latest_modified(Animal.objects.filter(Q(Breeding=breeding)|Q(breeding_males=breeding)|Q(breeding_females=breeding))),
+                             latest_modified(PlugEvents.objects.filter(Breeding=breeding)),
+                             latest_deletion(Animal, PlugEvents))
+
+    def get_context_data(self, **kwargs):
+        """This adds the litter statistics of the breeding cage to the context as productivity."""
+        context = super(BreedingDetail, self).get_context_data(**kwargs)
+        context['productivity'] = breeding_productivity(self.object)
+        return context
     
 class BreedingList(ProtectedListView):
     """This class generates an object list for active :class:`~mousedb.animal.models.Breeding` objects.
@@ -250,7 +313,7 @@ class BreedingList(ProtectedListView):
     This login protected view takes all :class:`~mousedb.animal.models.Breeding` objects and sends them to strain_list.html as a strain_list dictionary.  It also passes a strain_list_alive and cages dictionary to show the numbers for total cages and total strains.
     The url for this view is */strain/*"""
     
-    queryset = Breeding.objects.filter(Active=True)
+    queryset = Breeding.objects.filter(Active=True).with_table_data()
     context_object_name = 'breeding_list'
     template_name = "breeding_list.html"
 
@@ -266,7 +329,7 @@ class BreedingListAll(BreedingList):
     
     This class is a subclass of :class:`~mousedb.animal.views.BreedingList`, changing the queryset and the  breeding_type context."""
 
-    queryset = Breeding.objects.all()
+    queryset = Breeding.objects.with_table_data()
 
     def get_context_data(self, **kwargs):
         """This add in the context of breeding_type and sets it to All."""
@@ -280,7 +343,7 @@ class BreedingListTimedMating(BreedingList):
     
     This class is a subclass of :class:`~mousedb.animal.views.BreedingList`, changing the queryset and the  breeding_type context."""
 
-    queryset = Breeding.objects.filter(Timed_Mating=True)
+    queryset = Breeding.objects.filter(Timed_Mating=True).with_table_data()
 
     def get_context_data(self, **kwargs):
         """This add in the context of breeding_type and sets it to Timed_Matings."""
@@ -296,13 +359,15 @@ class BreedingSearch(BreedingList):
 
     template_name = "breeding_search.html"
     def get_context_data(self, **kwargs):
-        """This add in the context of breeding_type and sets it to Search it also returns the query and the queryset."""
-        query = self.request.GET.get('q', '')
+        """This add in the context of breeding_type and sets it to Search it also returns the query and the queryset.
+
+        The query is a cage number, a range of cage numbers such as 100-120 or a comma separated list of these (see :meth:`~mousedb.animal.models.BreedingQuerySet.in_cages`)."""
+        query = self.request.GET.get('q', '').strip()
         context = super(BreedingSearch, self).get_context_data(**kwargs)
         context['breeding_type'] = "Search"
         context['query'] = query
         if query:
-            context['results'] = Breeding.objects.filter(Cage__icontains=query).distinct()
+            context['results'] = Breeding.objects.in_cages(query).with_table_data()
         else:
             context['results'] = []        
         return context          
@@ -377,18 +442,20 @@ def breeding_change(request, breeding_id):
     This view typically is used to modify existing pups.  This might include marking animals as sacrificed, entering genotype or marking information or entering movement of mice to another cage.  It is used to show and modify several animals at once.
     It takes a request in the form /breeding/(breeding_id)/change/ and returns a form specific to the breeding set defined in breeding_id.  breeding_id is the background identification number of the breeding set and does not refer to the barcode of any breeding cage.
     This view returns a formset in which one row represents one animal.  To add extra animals to a breeding set use /breeding/(breeding_id)/pups/.
+    Only the changed fields are saved, with one update per field (see :class:`~mousedb.animal.forms.BulkUpdateInlineFormSet`).
     This view is restricted to those with the permission animal.change_animal.
     """
     breeding = Breeding.objects.select_related().get(id=breeding_id)
     strain = breeding.Strain
-    PupsFormSet = inlineformset_factory(Breeding, Animal, extra=0, exclude=('Alive','Father', 'Mother', 'Breeding', 'Notes'))
+    PupsFormSet = inlineformset_factory(Breeding, Animal, formset=BulkUpdateInlineFormSet, extra=0, exclude=('Alive','Father', 'Mother', 'Breeding', 'Notes'))
+    pups = breeding.animal_set.select_related('Strain')
     if request.method =="POST":
-        formset = PupsFormSet(request.POST, instance=breeding)
+        formset = PupsFormSet(request.POST, instance=breeding, queryset=pups)
         if formset.is_valid():
             formset.save()
             return HttpResponseRedirect( breeding.get_absolute_url() )
     else:
-        formset = PupsFormSet(instance=breeding,)
+        formset = PupsFormSet(instance=breeding, queryset=pups)
     return render(request, "breeding_change.html", {"formset":formset, 'breeding':breeding})
 	
 @permission_required('animal.change_animal')
@@ -398,49 +465,38 @@ def breeding_wean(request, breeding_id):
     This view typically is used to wean existing pups.  This includes the MouseID, Cage, Markings, Gender and Wean Date fields.  For other fields use the breeding-change page.
     It takes a request in the form /breeding/(breeding_id)/wean/ and returns a form specific to the breeding set defined in breeding_id.  breeding_id is the background identification number of the breeding set and does not refer to the barcode of any breeding cage.
     This view returns a formset in which one row represents one animal.  To add extra animals to a breeding set use /breeding/(breeding_id)/pups/.
+    Only the living, unweaned pups of this breeding set are shown and only the changed fields are saved (see :class:`~mousedb.animal.forms.BulkUpdateInlineFormSet`).
     This view is restricted to those with the permission animal.change_animal.
     """
     breeding = Breeding.objects.get(id=breeding_id)
     strain = breeding.Strain
-    PupsFormSet = inlineformset_factory(Breeding, Animal, extra=0, exclude=('Alive','Father', 'Mother', 'Breeding', 'Notes','Rack','Rack_Position','Strain','Background','Genotype','Death','Cause_of_Death','Backcross','Generation'))
+    PupsFormSet = inlineformset_factory(Breeding, Animal, formset=BulkUpdateInlineFormSet, extra=0, exclude=('Alive','Father', 'Mother', 'Breeding', 'Notes','Rack','Rack_Position','Strain','Background','Genotype','Death','Cause_of_Death','Backcross','Generation'))
+    pups = breeding.animal_set.filter(Alive=True, Weaned__isnull=True)
     if request.method =="POST":
-        formset = PupsFormSet(request.POST, instance=breeding, queryset=Animal.objects.filter(Alive=True, Weaned__isnull=True))
+        formset = PupsFormSet(request.POST, instance=breeding, queryset=pups)
         if formset.is_valid():
             formset.save()
             return HttpResponseRedirect( breeding.get_absolute_url() )
     else:
-        formset = PupsFormSet(instance=breeding, queryset=Animal.objects.filter(Alive=True, Weaned__isnull=True))
+        formset = PupsFormSet(instance=breeding, queryset=pups)
     return render(request, "breeding_wean.html", {"formset":formset, 'breeding':breeding})	
 
 def multiple_pups(request):
     """This view is used to enter multiple animals at the same time.
 	
     It will generate a form containing animal information and a number of mice.  It is intended to create several identical animals with the same attributes.
+    The animals are created together in one transaction by :meth:`~mousedb.animal.models.AnimalQuerySet.create_litter`.
     """
     if request.method == "POST":
         form = MultipleAnimalForm(request.POST)
         if form.is_valid():
-            count = form.cleaned_data['count']
-            for i in range(count):
-                animal = Animal(
-				    Strain = form.cleaned_data['Strain'], 
-					Background = form.cleaned_data['Background'],
-					Breeding = form.cleaned_data['Breeding'],
-					Cage = form.cleaned_data['Cage'],
-                    Rack = form.cleaned_data['Rack'],
-                    Rack_Position = form.cleaned_data['Rack_Position'],
-                    Genotype = form.cleaned_data['Genotype'],
-                    Gender = form.cleaned_data['Gender'],
-                    Born = form.cleaned_data['Born'],
-                    Weaned = form.cleaned_data['Weaned'],
-                    Backcross = form.cleaned_data['Backcross'],
-                    Generation = form.cleaned_data['Generation'],
-                    Father = form.cleaned_data['Father'],
-                    Mother = form.cleaned_data['Mother'],
-                    Markings = form.cleaned_data['Markings'],					
-                    Notes = form.cleaned_data['Notes'])
-                animal.save()
-        return HttpResponseRedirect( reverse('strain-list') )	
+            fields = form.cleaned_data.copy()
+            count = fields.pop('count')
+            try:
+                Animal.objects.create_litter(count, **fields)
+                return HttpResponseRedirect( reverse('strain-list') )
+            except ValidationError as error:
+                form.add_error(None, error)
     else:
         form = MultipleAnimalForm()
     return render(request, "animal_multiple_form.html", {"form":form,})		
@@ -450,28 +506,21 @@ def multiple_breeding_pups(request, breeding_id):
 	
     It will generate a form containing animal information and a number of mice.  It is intended to create several identical animals with the same attributes.
 	This view requres an input of a breeding_id to generate the correct form.
+    The animals are created together in one transaction by :meth:`~mousedb.animal.models.AnimalQuerySet.create_breeding_litter`.
     """
     breeding = Breeding.objects.get(id=breeding_id)
     if request.method == "POST":
         form = MultipleBreedingAnimalForm(request.POST)
         if form.is_valid():
-            count = form.cleaned_data['count']
-            for i in range(count):
-                animal = Animal(
-				    Strain = breeding.Strain, 
-					Background = breeding.background,
-					Breeding = breeding,
-					Cage = breeding.Cage,
-                    Rack = breeding.Rack,
-                    Rack_Position = breeding.Rack_Position,
-                    Genotype = breeding.genotype,
+            try:
+                Animal.objects.create_breeding_litter(breeding, form.cleaned_data['count'],
                     Gender = form.cleaned_data['Gender'],
                     Born = form.cleaned_data['Born'],
-                    Weaned = form.cleaned_data['Weaned'],
-                    Backcross = breeding.backcross,
-                    Generation = breeding.generation)
-                animal.save()	
-        return HttpResponseRedirect( breeding.get_absolute_url() )	
+                    Weaned = form.cleaned_data['Weaned'])
+                return HttpResponseRedirect( breeding.get_absolute_url() )
+            except ValidationError as error:
+                #most of the fields come from the breeding cage rather than this form, so the errors are shown as non-field errors
+                form.add_error(None, error.messages)
     else:
         form = MultipleBreedingAnimalForm()
     return render(request, "animal_multiple_form.html", {"form":form, "breeding":breeding})	
@@ -480,14 +529,23 @@ class AnimalYearArchive(YearArchiveView):
     """This view generates a list of animals born within the specified year.
     
     It takes a url in the form of **/date/####** where #### is the four digit code of the year.
+    The context also includes the number of animals born in each month (month_counts) and for each strain (strain_counts) from the cached birth archive.
     This view is restricted to logged in users."""
     
-    model = Animal
+    queryset = Animal.objects.with_breeder_residency()
     template_name = 'animal_list.html'
     context_object_name = 'animal_list'  
     date_field = 'Born'
     make_object_list = True
 
+    def get_context_data(self, **kwargs):
+        """This adds the month_counts and strain_counts for this year into the context."""
+        context = super(AnimalYearArchive, self).get_context_data(**kwargs)
+        year = int(self.get_year())
+        context['month_counts'] = births_by_month(year).items()
+        context['strain_counts'] = births_by_strain(year)
+        return context
+
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
         """This decorator sets this view to have restricted permissions."""
@@ -496,16 +554,23 @@ class AnimalYearArchive(YearArchiveView):
 class AnimalMonthArchive(MonthArchiveView):
     """This view generates a list of animals born within the specified year.
     
-    It takes a url in the form of **/date/####** where #### is the four digit code of the year.
+    It takes a url in the form of **/date/####/##** where #### is the four digit code of the year and ## is the two digit month.
+    The context also includes the number of animals born for each strain (strain_counts) from the cached birth archive.
     This view is restricted to logged in users."""
     
-    model = Animal
+    queryset = Animal.objects.with_breeder_residency()
     template_name = 'animal_list.html'
     context_object_name = 'animal_list'  
     date_field = 'Born'
     make_object_list = True
     month_format = '%m'
 
+    def get_context_data(self, **kwargs):
+        """This adds the strain_counts for this month into the context."""
+        context = super(AnimalMonthArchive, self).get_context_data(**kwargs)
+        context['strain_counts'] = births_by_strain(int(self.get_year()), int(self.get_month()))
+        return context
+
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
         """This decorator sets this view to have restricted permissions."""
@@ -514,82 +579,88 @@ class AnimalMonthArchive(MonthArchiveView):
 def date_archive_year(request):
     """This view will generate a table of the number of mice born on an annual basis.
     
-    This view is associated with the url name archive-home, and returns an dictionary of a date and a animal count."""
+    This view is associated with the url name archive-home, and returns an dictionary of a date and a animal count.
+    The counts are read from the cached birth archive (see :func:`~mousedb.animal.archive.births_by_year`)."""
     
-    oldest_animal = Animal.objects.filter(Born__isnull=False).order_by('Born')[0]
-    archive_dict = {}
-    tested_year = oldest_animal.Born.year
-    while tested_year <= datetime.date.today().year:
-        archive_dict[tested_year] = Animal.objects.filter(Born__year=tested_year).count()
-        tested_year = tested_year + 1
-    return render(request, 'animal_archive.html', {"archive_dict": archive_dict})
+    return render(request, 'animal_archive.html', {"archive_dict": births_by_year()})
 
 @login_required
 def todo(request):
     """This view generates a summary of the todo lists.
     
-    The login restricted view passes lists for ear tagging, genotyping and weaning and passes them to the template todo.html."""
+    The login restricted view passes the ids of the animals to be ear tagged, genotyped and weaned to the template todo.html.
+    These are read from the todo summary (see :mod:`~mousedb.animal.todo`) rather than querying the animals."""
     
-    eartag_list = Animal.objects.filter(Born__lt=(datetime.date.today() - datetime.timedelta(days=settings.WEAN_AGE))).filter(MouseID__isnull=True, Alive=True)
-    genotype_list = Animal.objects.filter(Q(Genotype='N.D.')|Q(Genotype__icontains='?')).filter(Alive=True, Born__lt=(datetime.date.today() - datetime.timedelta(days=settings.GENOTYPE_AGE)))
-    wean = datetime.date.today() - datetime.timedelta(days=settings.WEAN_AGE)
-    wean_list = Animal.objects.filter(Born__lt=wean).filter(Weaned=None,Alive=True).exclude(Strain=2).order_by('Strain','Background','Rack','Cage')
-    return render(request, 'todo.html', {'eartag_list':eartag_list, 'wean_list':wean_list, 'genotype_list':genotype_list})  
+    summary = todo_summary()
+    return render(request, 'todo.html', {'eartag_list':summary['eartag'], 'wean_list':summary['wean'], 'genotype_list':summary['genotype']})  
+
+class TodoList(AnimalList):
+    """This is a base view for showing the animals on a todo list.
+
+    This view is a subclass of :class:`~mousedb.animal.views.AnimalList`.
+    The todo_list attribute is the name of the list in :mod:`~mousedb.animal.todo`, and the age cutoff is calculated for each request.
+    """
 
-class EarTagList(AnimalList):
+    todo_list = None
+
+    def get_queryset(self):
+        """The animals are filtered to those on the todo list today."""
+        return super(TodoList, self).get_queryset().filter(todo_filter(self.todo_list))
+
+class EarTagList(TodoList):
     """This view is for showing animals which need to be eartagged.
     
-    This view is a subclass of :class:`~mousedb.animal.views.AnimalList`.  
+    This view is a subclass of :class:`~mousedb.animal.views.TodoList`.  
     This list shows animals that do not have an eartag (MouseID) and are older than the age set by WEAN_AGE in localsettings.py (default is 14 days).
     It takes a view **/todo/eartag**.
     This view is login protected.
     """
     
-    queryset = Animal.objects.filter(Born__lt=(datetime.date.today() - datetime.timedelta(days=settings.WEAN_AGE))).filter(MouseID__isnull=True, Alive=True)
+    todo_list = 'eartag'
     
-class GenotypeList(AnimalList):
+class GenotypeList(TodoList):
     """This view is for showing animals which need to be genotyped.
     
-    This view is a subclass of :class:`~mousedb.animal.views.AnimalList`.
+    This view is a subclass of :class:`~mousedb.animal.views.TodoList`.
     This list shows animals that do not have a genotype (ie N.D. or ?) and are older than GENOTYPE_AGE as designated in localsettings.py (default is 21 days).
     It takes a view **/todo/genotype**.
     This view is login protected.    
     """
     
-    queryset = Animal.objects.filter(Q(Genotype='N.D.')|Q(Genotype__icontains='?')).filter(Alive=True, Born__lt=(datetime.date.today() - datetime.timedelta(days=settings.GENOTYPE_AGE)))  
+    todo_list = 'genotype'
 
-class WeanList(AnimalList):
+class WeanList(TodoList):
     """This view is for showing animals which need to be weaned.
     
     This list shows animals that need to be weaned.  
-    This view is a subclass of :class:`~mousedb.animal.views.AnimalList` filtering for animals that are older than the WEAN_AGE and are alive.
+    This view is a subclass of :class:`~mousedb.animal.views.TodoList` filtering for animals that are older than the WEAN_AGE and are alive.
     It takes a view **/todo/wean**.
     This view is login protected.    
     """
     
-    queryset = Animal.objects.filter(Born__lt=(datetime.date.today() - datetime.timedelta(days=settings.WEAN_AGE)),Weaned=None,Alive=True)
+    todo_list = 'wean'
     
-class NoCageList(AnimalList):
+class NoCageList(TodoList):
     """This view is for showing animals which need to have a cage entered.
     
     This list shows animals that have no cage number and are alive.
-    This view is a subclass of :class:`~mousedb.animal.views.AnimalList`
+    This view is a subclass of :class:`~mousedb.animal.views.TodoList`
     It takes a view **/todo/no_cage**.
     This view is login protected.    
     """
     
-    queryset = Animal.objects.filter(Cage__exact=None).filter(Alive=True) 
+    todo_list = 'no_cage'
 
-class NoRackList(AnimalList):
+class NoRackList(TodoList):
     """This view is for showing animals which need to have a cage entered.
     
     This list shows animals that have no cage number and are alive.
-    This view is a subclass of :class:`~mousedb.animal.views.AnimalList`
+    This view is a subclass of :class:`~mousedb.animal.views.TodoList`
     It takes a view **/todo/no_rack**.
     This view is login protected.    
     """
     
-    queryset = Animal.objects.filter(Rack__iexact='').filter(Alive=True)
+    todo_list = 'no_rack'
     
 class CrossTypeAnimalList(AnimalList):
     """This view filters animal objects for a particular strain showing only the results of a particular breeding type.
@@ -599,7 +670,7 @@ class CrossTypeAnimalList(AnimalList):
     This view is a subclass of :class:`~mousedb.views.AnimalList`.
     """
     
-    def queryset(self):
+    def get_queryset(self):
         """This function sets the queryset according to the keyword arguments.
         For the crosstype, the input value is the the display value of CROSS_TYPE.
         This is done because the spaces in HET vs HET are not recognized.  
@@ -615,7 +686,7 @@ class CrossTypeAnimalList(AnimalList):
             raise Http404
         strain = get_object_or_404(Strain, Strain_slug=self.kwargs['strain_slug'])
         if strain:
-            return Animal.objects.filter(Strain=strain,Breeding__Crosstype=crosstype)
+            return super(CrossTypeAnimalList, self).get_queryset().filter(Strain=strain,Breeding__Crosstype=crosstype)
         else:
             raise Http404
         
@@ -626,16 +697,35 @@ class CrossTypeAnimalList(AnimalList):
         context['list_type'] = self.kwargs['breeding_type']
         return context
         
-class CageList(ListView):
+class CageList(ConditionalGetMixin, ListView):
     """This view shows all active cages.
     
     The view takes a url in the form **/cage** and returns a list of cages which have at least one animal.
+    The list is read from the cage occupancy index (see :class:`~mousedb.animal.models.CageOccupancy`), and can be searched by the start of a cage number with the parameter **q** (for example **/cage?q=12**).
     
     """
     
-    queryset = Animal.objects.values('Cage', 'Strain__Strain', 'Strain__Strain_slug', 'Background', 'Rack', 'Rack_Position','Alive').filter(Alive=True).order_by('Cage').distinct().filter(Alive='True')
+    queryset = CageOccupancy.objects.filter(alive__gt=0).select_related('Strain')
     template_name ='cage_list.html'
-    template_object_name = 'cage'  
+    context_object_name = 'cage_list'
+
+    def get_queryset(self):
+        """The cages are filtered by the search query, using index range lookups on the cage number."""
+        queryset = super(CageList, self).get_queryset()
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.filter(integer_prefix_filter('Cage', query))
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        """This adds the search query to the context."""
+        context = super(CageList, self).get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '').strip()
+        return context
+
+    def get_last_modified(self):
+        """This page changes with the animals, strains and breeding cages."""
+        return latest_change(latest_modified(Animal.objects.all()), latest_modified(Strain.objects.all()), latest_modified(Breeding.objects.all()), latest_deletion(Animal, Breeding))
 	
 class CageListAll(CageList):
     """This view shows all active cages.
@@ -645,7 +735,13 @@ class CageListAll(CageList):
     This view subclasses CageList and just changes the query.
     """
     
-    queryset = Animal.objects.values("Cage", "Strain__Strain","Strain__Strain_slug", "Background", "Rack", "Rack_Position", "Alive").order_by('Cage').distinct()
+    queryset = CageOccupancy.objects.select_related('Strain')
+
+    def get_context_data(self, **kwargs):
+        """This adds all_cages to the context."""
+        context = super(CageListAll, self).get_context_data(**kwargs)
+        context['all_cages'] = True
+        return context
     
 class CageDetail(AnimalList):
     """This view shows an animal list of only the animals which are in a given cage.
@@ -655,5 +751,5 @@ class CageDetail(AnimalList):
     
     def get_queryset(self):
         """This function sets the queryset to use the passed along cage_number."""
-        return Animal.objects.filter(Cage=self.kwargs['cage_number'])    
+        return super(CageDetail, self).get_queryset().filter(Cage=self.kwargs['cage_number'])
 	           
@@ -0,0 +1,195 @@
+'''This module contains the bulk export and the deleted objects used by the APIs of each app.
+
+Bulk Export
+-----------
+
+Resources which use :class:`~mousedb.api.BulkExportMixin` have an export endpoint, for example **http://yourserver.org/api/v1/animal/export/**.
+This returns every object as newline delimited JSON (NDJSON), one object per line, ordered by when the object was last modified and then by id.
+The objects are read from the database in batches using keyset pagination (see :mod:`~mousedb.pagination`), so the export uses a constant amount of memory no matter how many objects there are.
+
+The following request parameters are optional:
+
++------------------+-------------------------------------------------------------------------+
+| Parameter        | Potential Values                                                        |
++==================+=========================================================================+
+| updated_since    | an ISO 8601 date and time, to only export objects modified after it     |
++------------------+-------------------------------------------------------------------------+
+| after            | the **next** cursor of a previous export, to continue from that point   |
++------------------+-------------------------------------------------------------------------+
+| limit            | the maximum number of objects to export, or **0** for all (the default) |
++------------------+-------------------------------------------------------------------------+
+
+The last line of the export is always a meta object, for example::
+
+    {"meta": {"count": 1000, "next": "WyIyMDEzLTA4LTI0IDEyOjAwOjAwKzAwOjAwIiwgMTAwMF0="}}
+
+The next cursor can be passed as **after** to continue an export which was stopped by the limit, or to later fetch only the objects changed since this export.
+
+Conditional Requests
+--------------------
+
+Resources which use :class:`~mousedb.api.ConditionalResourceMixin` send ETag and Last-Modified headers with each list and detail response.
+A client which sends these back as If-None-Match and If-Modified-Since headers receives an empty 304 Not Modified response if none of the objects have changed since, so an unchanged response is neither queried nor serialized again (see :mod:`~mousedb.conditional`).
+
+Deleted Objects
+---------------
+
+Animals, breeding cages, measurements, experiments and plug events record when they are deleted (see :class:`~mousedb.models.Tombstone`).
+These deletions are available at **http://yourserver.org/api/v1/tombstone/**, and can be filtered by **model** and by when they were deleted, for example::
+
+    http://yourserver.org/api/v1/tombstone/?model=animal&deleted__gt=2013-08-24T12:00:00
+
+An incremental sync can therefore request the objects with **modified__gt** (or from an export with **updated_since**) and the tombstones with **deleted__gt** since its last sync.
+Each tombstone has the **model** and **object_id** of the deleted object and the time it was **deleted**.
+'''
+
+import json
+
+from django.conf.urls import url
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tastypie import fields
+from tastypie.authentication import ApiKeyAuthentication
+from tastypie.constants import ALL
+from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.http import HttpBadRequest
+from tastypie.resources import ModelResource
+from tastypie.utils import trailing_slash
+
+from mousedb.models import Tombstone
+from mousedb.conditional import conditional_response, latest_modified, latest_deletion, latest_change
+from mousedb.pagination import keyset_page, encode_cursor, decode_cursor
+
+EXPORT_BATCH_SIZE = 1000
+
+def export_batches(queryset, field_name, after=None, limit=None, batch_size=EXPORT_BATCH_SIZE):
+    '''This generates the objects of a queryset in batches, ordered by field_name and then by id.
+
+    The after argument is a decoded (value, pk) cursor to start after.'''
+    count = 0
+    while limit is None or count < limit:
+        page = keyset_page(queryset, field_name, batch_size if limit is None else min(batch_size, limit - count), after=after)
+        if not page.object_list:
+            break
+        for obj in page.object_list:
+            yield obj
+        count += len(page.object_list)
+        last = page.object_list[-1]
+        after = (getattr(last, field_name), last.pk)
+        if not page.has_next():
+            break
+
+class BulkExportMixin(object):
+    '''This mixin adds an NDJSON bulk export endpoint, at **export/**, to a tastypie ModelResource.
+
+    The model must have a modified field, which is used to order the export and for the updated_since parameter.
+    The export_fields attribute lists the model fields to export (foreign keys are exported as ids), and export_queryset can be over-ridden to join any related objects used by export_row.'''
+
+    export_fields = []
+    export_field = 'modified'
+
+    def prepend_urls(self):
+        '''This adds the export endpoint to any urls of the resource.'''
+        urls = super(BulkExportMixin, self).prepend_urls()
+        return [
+            url(r"^(?P<resource_name>%s)/export%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_export'), name="api_%s_export" % self._meta.resource_name),
+        ] + list(urls)
+
+    def export_queryset(self, request):
+        '''This is the queryset which is exported.'''
+        return self._meta.queryset.model._default_manager.all()
+
+    def export_row(self, obj):
+        '''This returns the dictionary of the export_fields of an object.'''
+        model = obj.__class__
+        return dict((name, getattr(obj, model._meta.get_field(name).attname)) for name in self.export_fields)
+
+    def get_export_parameters(self, request):
+        '''This returns the updated_since, after and limit parameters of an export request, raising a bad request response if any are invalid.'''
+        field = self._meta.queryset.model._meta.get_field(self.export_field)
+        try:
+            updated_since = request.GET.get('updated_since') and parse_datetime(request.GET['updated_since'])
+            if request.GET.get('updated_since') and updated_since is None:
+                raise ValueError("Invalid updated_since %s" % request.GET['updated_since'])
+            if updated_since and timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since, timezone.get_current_timezone())
+            after = request.GET.get('after') and decode_cursor(request.GET['after'], field)
+            limit = request.GET.get('limit') and int(request.GET['limit'])
+            if limit is not None and limit < 0:
+                raise ValueError("Invalid limit %s" % limit)
+        except ValueError as error:
+            raise ImmediateHttpResponse(response=HttpBadRequest(str(error)))
+        return updated_since or None, after or None, limit or None
+
+    def get_export(self, request, **kwargs):
+        '''This streams the objects of the resource as NDJSON, followed by a meta object.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        updated_since, after, limit = self.get_export_parameters(request)
+        queryset = self.export_queryset(request)
+        if updated_since:
+            queryset = queryset.filter(**{'%s__gt' % self.export_field: updated_since})
+        self.log_throttled_access(request)
+        return StreamingHttpResponse(self.export_lines(queryset, after, limit), content_type='application/x-ndjson')
+
+    def export_lines(self, queryset, after, limit):
+        '''This generates the NDJSON lines of an export.'''
+        encoder = DjangoJSONEncoder()
+        count = 0
+        last = None
+        for obj in export_batches(queryset, self.export_field, after, limit):
+            count += 1
+            last = obj
+            yield encoder.encode(self.export_row(obj)) + '\n'
+        next_cursor = None
+        if last is not None:
+            next_cursor = encode_cursor(getattr(last, self.export_field), last.pk)
+        elif after is not None:
+            next_cursor = encode_cursor(*after)
+        yield json.dumps({'meta': {'count': count, 'next': next_cursor}}) + '\n'
+
+class ConditionalResourceMixin(object):
+    '''This mixin answers conditional GET requests for the lists and details of a tastypie ModelResource.
+
+    The last_modified_models attribute lists the models (each with a modified field) which are served by the resource, including those of any nested resources.
+    The response is current if none of these have been modified or deleted since it was sent.'''
+
+    last_modified_models = ()
+
+    def get_last_modified(self, request):
+        '''This returns the time of the most recent change to any of the last_modified_models.'''
+        return latest_change(*[latest_modified(model._default_manager.all()) for model in self.last_modified_models] + [latest_deletion(*self.last_modified_models)])
+
+    def get_list(self, request, **kwargs):
+        '''A list is only served if it has changed.'''
+        return conditional_response(request, super(ConditionalResourceMixin, self).get_list, self.get_last_modified(request), **kwargs)
+
+    def get_detail(self, request, **kwargs):
+        '''A single object is only served if it has changed.'''
+        return conditional_response(request, super(ConditionalResourceMixin, self).get_detail, self.get_last_modified(request), **kwargs)
+
+class TombstoneResource(ModelResource):
+    '''This generates the API resource for :class:`~mousedb.models.Tombstone` objects.
+
+    It returns the deletions of all tracked objects, which can be filtered by the **model** of the deleted objects.
+    '''
+    model = fields.CharField(attribute='content_type__model')
+
+    class Meta:
+        '''The API serves all :class:`~mousedb.models.Tombstone` objects in the database.'''
+
+        queryset = Tombstone.objects.select_related('content_type')
+        resource_name = 'tombstone'
+        list_allowed_methods = ['get']
+        detail_allowed_methods = ['get']
+        fields = ['object_id', 'deleted']
+        filtering = {"model":('exact',),
+                     "object_id":ALL,
+                     "deleted":ALL}
+        include_resource_uri = False
+        authentication = ApiKeyAuthentication()
+
@@ -0,0 +1,60 @@
+'''This module provides conditional GET support (ETag and Last-Modified headers) for views and API resources.
+
+The freshness of a page is the most recent of the modified times of the objects it shows and the most recent deletion of those models (see :class:`~mousedb.models.Tombstone`).
+These are each found with a single aggregate query on an indexed column, so when a browser or API client already has the current version it receives a 304 Not Modified response without the page being rendered or its main queries being run.
+
+Many pages show ages which are calculated from the current date, so the start of the current day is always included as a change.
+The ETag also includes the id of the user, as pages differ between users (for example in the buttons which are shown).
+'''
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from mousedb.models import Tombstone
+
+def latest_modified(queryset, field_name='modified'):
+    '''This returns the most recent value of field_name in a queryset, or None if it is empty.'''
+    return queryset.aggregate(latest=Max(field_name))['latest']
+
+def latest_deletion(*models):
+    '''This returns the time of the most recent deletion of any of the models, or None if none have been deleted.'''
+    content_types = ContentType.objects.get_for_models(*models).values()
+    return latest_modified(Tombstone.objects.filter(content_type__in=content_types), 'deleted')
+
+def start_of_today():
+    '''This returns the start of the current day, in the current time zone.'''
+    now = timezone.now()
+    if timezone.is_aware(now):
+        now = timezone.localtime(now)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def latest_change(*timestamps):
+    '''This returns the most recent of some timestamps (ignoring any which are None) and the start of the current day.'''
+    return max([timestamp for timestamp in timestamps if timestamp is not None] + [start_of_today()])
+
+def change_etag(user, last_modified):
+    '''This returns the ETag of a page for a user, from the time of its most recent change.'''
+    return u'%s-%s' % (user.pk or 0, last_modified.isoformat())
+
+def conditional_response(request, view, last_modified, *args, **kwargs):
+    '''This calls a view with the request, unless the request is a conditional GET which matches last_modified, in which case a 304 Not Modified response is returned.'''
+    return condition(etag_func=lambda request, *args, **kwargs: change_etag(request.user, last_modified),
+                     last_modified_func=lambda request, *args, **kwargs: last_modified)(view)(request, *args, **kwargs)
+
+class ConditionalGetMixin(object):
+    '''This mixin adds ETag and Last-Modified headers to a class based view, and returns 304 Not Modified responses to matching conditional GET requests.
+
+    Views set get_last_modified to return the time of the most recent change to the objects shown (using :func:`~mousedb.conditional.latest_change`).
+    This mixin should be placed before the view class (but after any login mixins).'''
+
+    def get_last_modified(self):
+        '''This returns the time of the most recent change to the page.'''
+        raise NotImplementedError("Views using ConditionalGetMixin must define get_last_modified")
+
+    def dispatch(self, request, *args, **kwargs):
+        '''GET and HEAD requests are checked against the last modified time of the page.'''
+        if request.method not in ('GET', 'HEAD'):
+            return super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+        return conditional_response(request, super(ConditionalGetMixin, self).dispatch, self.get_last_modified(), *args, **kwargs)
@@ -1,6 +1,40 @@
-from mousedb.groups.models import Group
+"""This module contains the context processors of the root application.
+
+The group information is kept in a process level cache, so it is not queried for every template which is rendered.
+The cache is cleared in this process when a :class:`~mousedb.groups.models.Group` or :class:`~mousedb.groups.models.License` is saved or deleted, and expires after GROUP_INFO_TIMEOUT seconds so that other server processes also pick up changes.
+"""
+
+import time
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mousedb.groups.models import Group, License
+
+GROUP_INFO_TIMEOUT = 60 * 5
+
+_group_info = {}
+
+def get_group():
+    """This returns the group (the first :class:`~mousedb.groups.models.Group`, with its license), or None if no group has been entered."""
+    return Group.objects.select_related('license').order_by('pk').first()
+
+def invalidate_group_info():
+    """This clears the cached group information."""
+    _group_info.clear()
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=License)
+@receiver(post_delete, sender=License)
+def group_changed(sender, **kwargs):
+    """Saving or deleting a group or license clears the cached group information."""
+    invalidate_group_info()
 
 def group_info(request):
-    """This context processor provides group information to all templates."""
-    group = Group.objects.get(pk=1)
-    return {'group': group}
\ No newline at end of file
+    """This context processor provides group information to all templates.
+
+    If no group has been entered, group is None."""
+    if _group_info.get('expires', 0) < time.time():
+        _group_info.update(group=get_group(), expires=time.time() + GROUP_INFO_TIMEOUT)
+    return {'group': _group_info['group']}
@@ -25,7 +25,7 @@ class MeasurementAdmin(admin.ModelAdmin):
 admin.site.register(Measurement, MeasurementAdmin)
 
 class AssayAdmin(admin.ModelAdmin):
-	fields = ('assay', 'measurement_units','notes', 'assay_slug')
+	fields = ('assay', 'measurement_units', 'timepoints', 'notes', 'assay_slug')
 	prepopulated_fields = {"assay_slug" : ("assay",)}
 	list_display = ('assay','measurement_units','notes')
 admin.site.register(Assay,AssayAdmin)
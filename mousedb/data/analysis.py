@@ -0,0 +1,156 @@
+'''This module summarizes time course measurements, such as glucose or insulin tolerance tests, by treatment group.
+
+The measurements of an :class:`~mousedb.data.models.Experiment` or :class:`~mousedb.data.models.Study` are read in one query and the treatments of the animals in one further query.
+For each :class:`~mousedb.data.models.Assay`, the values are placed into a NumPy array with one row per measurement and one column per timepoint (see :mod:`~mousedb.data.timecourse`).
+All the calculations are then done on these arrays:
+
+* **auc**, the area under the curve of each measurement, using the trapezoidal rule over the assay timepoints.
+* **normalized**, each curve as a percentage of its first (baseline) value.
+* the curves, normalized curves and areas under the curve of each animal are averaged, so that an animal measured more than once in an assay (for example in several experiments of a study) is a single sample.
+* **mean** and **sem**, the mean and standard error of the mean of the animals' curves, normalized curves and areas under the curve for each :class:`~mousedb.data.models.Treatment`.
+* **comparisons**, Welch's t-tests between each pair of treatments, at each timepoint and for the area under the curve.
+
+Missing values (for example from shorter curves) are ignored.
+The summaries contain only lists, numbers and strings (with None for missing results) so they can be serialized directly.
+'''
+
+from itertools import combinations
+
+import numpy
+from scipy import stats
+
+from mousedb.data.models import Measurement, Treatment
+from mousedb.data.timecourse import unpack_series, timepoint_array
+
+NO_TREATMENT = u'No Treatment'
+
+def as_list(array):
+    '''This converts a NumPy array (or number) into a list (or number), replacing missing values with None.'''
+    values = numpy.asarray(array, dtype=float)
+    if values.ndim == 0:
+        return None if numpy.isnan(values) else float(values)
+    return [None if numpy.isnan(value) else float(value) for value in values]
+
+def curve_matrix(rows):
+    '''This returns an array of the series of each row, padded with missing values to the length of the longest series, along with the timepoints of the assay.'''
+    series = [unpack_series(row['series'], row['values']) for row in rows]
+    length = max([len(values) for values in series] or [0])
+    matrix = numpy.full((len(series), length), numpy.nan)
+    for index, values in enumerate(series):
+        matrix[index, :len(values)] = values
+    return matrix, timepoint_array(rows[0]['assay__timepoints'], length)
+
+def area_under_curve(matrix, times):
+    '''This returns the area under each curve (row) using the trapezoidal rule, or a missing value for curves with any missing values.'''
+    if matrix.shape[1] < 2:
+        return numpy.full(matrix.shape[0], numpy.nan)
+    return numpy.sum((matrix[:, 1:] + matrix[:, :-1]) / 2 * numpy.diff(times), axis=1)
+
+def normalize_to_baseline(matrix):
+    '''This returns each curve (row) as a percentage of its first value.'''
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        normalized = matrix / matrix[:, :1] * 100
+    normalized[~numpy.isfinite(normalized)] = numpy.nan
+    return normalized
+
+def mean_sem(values):
+    '''This returns the number, mean and standard error of the mean of values along the first axis, ignoring missing values.'''
+    counts = numpy.sum(~numpy.isnan(values), axis=0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        means = numpy.nansum(values, axis=0) / counts
+        deviations = numpy.where(numpy.isnan(values), 0, values - means)
+        variances = numpy.sum(deviations ** 2, axis=0) / (counts - 1)
+        sems = numpy.sqrt(variances / counts)
+    means = numpy.where(counts > 0, means, numpy.nan)
+    sems = numpy.where(counts > 1, sems, numpy.nan)
+    return counts, means, sems
+
+def average_by_animal(values, row_animals):
+    '''This returns the animals of some rows and the mean of the rows of each animal along the first axis, ignoring missing values.'''
+    animals, inverse = numpy.unique(row_animals, return_inverse=True)
+    present = ~numpy.isnan(values)
+    sums = numpy.zeros((len(animals),) + values.shape[1:])
+    counts = numpy.zeros((len(animals),) + values.shape[1:])
+    numpy.add.at(sums, inverse.ravel(), numpy.where(present, values, 0))
+    numpy.add.at(counts, inverse.ravel(), present)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+    return animals.tolist(), numpy.where(counts > 0, means, numpy.nan)
+
+def welch_test(first, second):
+    '''This returns the p-values of Welch's t-test between two groups, for each column, ignoring missing values.'''
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        statistic, p_values = stats.ttest_ind(first, second, axis=0, equal_var=False, nan_policy='omit')
+    return numpy.ma.filled(numpy.ma.asarray(p_values, dtype=float), numpy.nan)
+
+def treatment_map(animal_ids, treatments=None):
+    '''This returns a dictionary of the names of the treatments of each animal.
+
+    If treatments (a queryset) is given, only those treatments are used.'''
+    links = Treatment.animals.through.objects.filter(animal__in=animal_ids)
+    if treatments is not None:
+        links = links.filter(treatment__in=treatments)
+    groups = {}
+    for animal, treatment in links.values_list('animal', 'treatment__treatment').iterator():
+        groups.setdefault(animal, []).append(treatment)
+    return groups
+
+def summarize(measurements, treatments=None):
+    '''This summarizes a set of measurements by assay and treatment.
+
+    Animals in more than one treatment are included in each of them, and animals with no treatment are grouped as No Treatment.
+    The result is a dictionary with a list of assays, each with its timepoints, a summary of each treatment and the comparisons between treatments.'''
+    rows = list(measurements.values('animal', 'assay', 'assay__assay', 'assay__measurement_units', 'assay__timepoints', 'series', 'values').order_by('assay', 'pk'))
+    groups = treatment_map(measurements.values('animal'), treatments)
+    assays = []
+    for assay in sorted(set(row['assay'] for row in rows)):
+        assay_rows = [row for row in rows if row['assay'] == assay]
+        matrix, times = curve_matrix(assay_rows)
+        row_animals = [row['animal'] for row in assay_rows]
+        auc = average_by_animal(area_under_curve(matrix, times), row_animals)[1]
+        normalized = average_by_animal(normalize_to_baseline(matrix), row_animals)[1]
+        animals, matrix = average_by_animal(matrix, row_animals)
+        membership = {}
+        for index, animal in enumerate(animals):
+            for treatment in groups.get(animal, [NO_TREATMENT]):
+                membership.setdefault(treatment, []).append(index)
+        summaries = []
+        for treatment in sorted(membership):
+            members = numpy.array(membership[treatment])
+            counts, means, sems = mean_sem(matrix[members])
+            normalized_counts, normalized_means, normalized_sems = mean_sem(normalized[members])
+            auc_count, auc_mean, auc_sem = mean_sem(auc[members])
+            summaries.append({'treatment': treatment,
+                              'animals': len(members),
+                              'n': [int(count) for count in counts],
+                              'mean': as_list(means),
+                              'sem': as_list(sems),
+                              'normalized_mean': as_list(normalized_means),
+                              'normalized_sem': as_list(normalized_sems),
+                              'auc_n': int(auc_count),
+                              'auc_mean': as_list(auc_mean),
+                              'auc_sem': as_list(auc_sem)})
+        comparisons = []
+        for first, second in combinations(sorted(membership), 2):
+            first_members, second_members = numpy.array(membership[first]), numpy.array(membership[second])
+            comparisons.append({'treatments': [first, second],
+                                'p_values': as_list(welch_test(matrix[first_members], matrix[second_members])),
+                                'normalized_p_values': as_list(welch_test(normalized[first_members], normalized[second_members])),
+                                'auc_p_value': as_list(welch_test(auc[first_members], auc[second_members]))})
+        assays.append({'assay': assay_rows[0]['assay__assay'],
+                       'units': assay_rows[0]['assay__measurement_units'],
+                       'timepoints': as_list(times),
+                       'treatments': summaries,
+                       'comparisons': comparisons})
+    return {'assays': assays}
+
+def experiment_summary(experiment):
+    '''This summarizes the measurements of an :class:`~mousedb.data.models.Experiment`, grouped by the treatments of its study (or by all treatments if it has no study).'''
+    treatments = None
+    if experiment.study_id:
+        treatments = Treatment.objects.filter(study=experiment.study_id)
+    return summarize(Measurement.objects.filter(experiment=experiment), treatments)
+
+def study_summary(study):
+    '''This summarizes the measurements of all the experiments of a :class:`~mousedb.data.models.Study`, grouped by the treatments of that study.'''
+    return summarize(Measurement.objects.filter(experiment__study=study), Treatment.objects.filter(study=study))
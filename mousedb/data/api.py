@@ -12,6 +12,8 @@ There are four access points, each of which is available using GET requests only
 * experiments are available at the endpoint **http://yourserver.org/api/v1/experiment/**
 * studies are available at the endpoint **http://yourserver.org/api/v1/study/**
 
+Summaries of the time course measurements of an experiment or study, by treatment group, are available at **http://yourserver.org/api/v1/experiment/<pk>/analysis/** and **http://yourserver.org/api/v1/study/<pk>/analysis/** (see :mod:`~mousedb.data.analysis`).
+
 The data can be provided as either a group of objects or as a single object. 
 Currently for all requests, no authentication is required.  
 
@@ -80,6 +82,12 @@ By default 20 items are returned but you can increase this to all by setting lim
 +------------------+-----------------------------------------+
 | limit            | **0** for all, any other number         |
 +------------------+-----------------------------------------+
+| modified__gt     | objects changed after an ISO 8601 time  |
++------------------+-----------------------------------------+
+| mode             | **lean** for flat ids in lists          |
++------------------+-----------------------------------------+
+| sideload         | **true** to include related objects     |
++------------------+-----------------------------------------+
 
 
 Response Values
@@ -97,6 +105,25 @@ The response (in either JSON or XML) provides the following fields for each obje
 | values             | the measurement, or measurement(s)                  | 423                                                         |
 +--------------------+-----------------------------------------------------+-------------------------------------------------------------+ 
 
+Lean Lists
+``````````
+
+For large requests, a list of measurements can be requested with **mode=lean**::
+
+    http://yourserver.org/api/v1/data/?format=json&mode=lean&limit=0
+    
+In this mode each measurement has only its id, values, age and the ids of its animal, assay and experiment, rather than nesting the full objects.
+If **sideload=true** is also set, the response includes an **included** object with the **animals**, **assays** and **experiments** referenced on this page, each keyed by id.
+These are loaded with the measurements, so no further queries are needed.
+
+Bulk Export
+```````````
+
+All measurements can be exported as newline delimited JSON from **/api/v1/data/export/**.
+Each line contains the id, animal (id), assay (id), experiment (id), values and modified fields of a measurement.
+Use **updated_since** or the **next** cursor of a previous export to only export the measurements which have changed (see :mod:`~mousedb.api`)::
+
+    http://yourserver.org/api/v1/data/export/?updated_since=2013-08-24T12:00:00
 
 Reference for the Assay API
 ---------------------------
@@ -160,6 +187,8 @@ By default 20 items are returned but you can increase this to all by setting lim
 +------------------+-----------------------------------------+
 | limit            | **0** for all, any other number         |
 +------------------+-----------------------------------------+
+| modified__gt     | objects changed after an ISO 8601 time  |
++------------------+-----------------------------------------+
 
 
 Response Values
@@ -235,14 +264,21 @@ The response (in either JSON or XML) provides the following fields for each obje
 
 '''
 
+from django.conf.urls import url
+from django.shortcuts import get_object_or_404
+
 from tastypie.resources import ModelResource
 from tastypie.authentication import ApiKeyAuthentication
 from tastypie import fields
 from tastypie.constants import ALL, ALL_WITH_RELATIONS
+from tastypie.utils import trailing_slash
 
+from mousedb.api import BulkExportMixin, ConditionalResourceMixin
+from mousedb.animal.models import Animal, Strain
 from mousedb.data.models import Measurement, Assay, Experiment, Study, Treatment, Cohort
+from mousedb.data.analysis import experiment_summary, study_summary
 
-class MeasurementResource(ModelResource):
+class MeasurementResource(ConditionalResourceMixin, BulkExportMixin, ModelResource):
     '''This generates the API resource for :class:`~mousedb.data.models.Measurement` objects.
     
     It returns all measurements in the database.
@@ -264,7 +300,47 @@ class MeasurementResource(ModelResource):
         filtering = {"assay":ALL_WITH_RELATIONS,
                      "animal":ALL_WITH_RELATIONS,
                      "animal_cohort":ALL_WITH_RELATIONS,
-                     "experiment":ALL}
+                     "experiment":ALL,
+                     "created":ALL,
+                     "modified":ALL}
+
+    last_modified_models = (Measurement, Animal, Strain, Experiment)
+    export_fields = ['id', 'animal', 'assay', 'experiment', 'values', 'modified']
+
+    def is_lean(self, request):
+        '''Lists are served in lean mode if the request parameter **mode=lean** is set.'''
+        return request is not None and request.GET.get('mode') == 'lean'
+
+    def get_object_list(self, request):
+        '''The animal (and its strain), assay and experiment are loaded with each measurement, and the treatments and cohorts of the animals are prefetched for the nested animals.'''
+        return super(MeasurementResource, self).get_object_list(request).select_related('animal__Strain', 'assay', 'experiment').prefetch_related('animal__treatment_set', 'animal__cohort_set')
+
+    def full_dehydrate(self, bundle, for_list=False):
+        '''In lean mode, each measurement in a list has flat ids for the animal, assay and experiment.'''
+        if not (for_list and self.is_lean(bundle.request)):
+            return super(MeasurementResource, self).full_dehydrate(bundle, for_list=for_list)
+        measurement = bundle.obj
+        bundle.data = {'id': measurement.pk,
+                       'values': measurement.values,
+                       'age': measurement.age(),
+                       'animal': measurement.animal_id,
+                       'assay': measurement.assay_id,
+                       'experiment': measurement.experiment_id}
+        return bundle
+
+    def alter_list_data_to_serialize(self, request, data):
+        '''In lean mode with **sideload=true**, the animals, assays and experiments referenced by the measurements are added as **included**.'''
+        if self.is_lean(request) and request.GET.get('sideload') in ('true', '1'):
+            animals, assays, experiments = {}, {}, {}
+            for bundle in data['objects']:
+                measurement = bundle.obj
+                animal, assay, experiment = measurement.animal, measurement.assay, measurement.experiment
+                animals[str(animal.pk)] = {'id': animal.pk, 'MouseID': animal.MouseID, 'strain': animal.Strain.Strain, 'Genotype': animal.Genotype, 'Gender': animal.Gender,
+                                           'Background': animal.Background, 'Cage': animal.Cage, 'Born': animal.Born, 'Alive': animal.Alive, 'Death': animal.Death}
+                assays[str(assay.pk)] = {'id': assay.pk, 'assay': assay.assay, 'measurement_units': assay.measurement_units}
+                experiments[str(experiment.pk)] = {'id': experiment.pk, 'date': experiment.date, 'time': experiment.time, 'feeding_state': experiment.feeding_state, 'fasting_time': experiment.fasting_time}
+            data['included'] = {'animals': animals, 'assays': assays, 'experiments': experiments}
+        return data
            
 class AssayResource(ModelResource):
     '''This generates the API resource for :class:`~mousedb.data.models.Assay` objects.
@@ -292,11 +368,12 @@ class MeasurementAssayResource(AssayResource):
     class Meta:
         '''The API serves all :class:`~mousedb.data.models.Assay` objects in the database..'''
 
+        queryset = Assay.objects.all()
         include_resource_uri = False
         fields = ['assay',]         
         filtering  = {"assay":ALL}    
     
-class ExperimentResource(ModelResource):
+class ExperimentResource(ConditionalResourceMixin, ModelResource):
     '''This generates the API resource for :class:`~mousedb.data.models.Experiment` objects.
     
     It returns all experiments in the database.
@@ -310,6 +387,26 @@ class ExperimentResource(ModelResource):
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get']
         authentication = ApiKeyAuthentication()
+        filtering = {"date":ALL,
+                     "created":ALL,
+                     "modified":ALL}
+
+    last_modified_models = (Experiment,)
+
+    def prepend_urls(self):
+        '''This adds the analysis endpoint, at **/api/v1/experiment/<pk>/analysis/**.'''
+        return [
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/analysis%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_analysis'), name="api_experiment_analysis"),
+        ]
+
+    def get_analysis(self, request, **kwargs):
+        '''This returns the summary of an experiment from :func:`~mousedb.data.analysis.experiment_summary`.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        experiment = get_object_or_404(Experiment, pk=kwargs['pk'])
+        self.log_throttled_access(request)
+        return self.create_response(request, experiment_summary(experiment))
 
 class MeasurementExperimentResource(ExperimentResource): 
 
@@ -319,6 +416,7 @@ class MeasurementExperimentResource(ExperimentResource):
         This is a limited dataset for use in MeasurementResource calls.
         '''
 
+        queryset = Experiment.objects.all()
         fields = ['feeding_state','fasting_time','date','time']        
         include_resource_uri = False           
         
@@ -336,6 +434,21 @@ class StudyResource(ModelResource):
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get']
         authentication = ApiKeyAuthentication()    
+
+    def prepend_urls(self):
+        '''This adds the analysis endpoint, at **/api/v1/study/<pk>/analysis/**.'''
+        return [
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/analysis%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('get_analysis'), name="api_study_analysis"),
+        ]
+
+    def get_analysis(self, request, **kwargs):
+        '''This returns the summary of a study from :func:`~mousedb.data.analysis.study_summary`.'''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        study = get_object_or_404(Study, pk=kwargs['pk'])
+        self.log_throttled_access(request)
+        return self.create_response(request, study_summary(study))
         
 class TreatmentResource(ModelResource):
     '''This generates the API resource for :class:`~mousedb.data.models.Treatment` objects.
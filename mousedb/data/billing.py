@@ -0,0 +1,116 @@
+'''This module calculates housing costs from the cage history of the animals.
+
+The locations of the animals during a billing period are read from :class:`~mousedb.animal.models.CageHistory` in one query, and each is limited to the life of the animal (from its Born date up to its Death date).
+Dead animals with no Death date are counted until they were last modified, which is when they were marked as dead.
+Each animal is assigned to one or more groups:
+
+* **strain**, the :class:`~mousedb.animal.models.Strain` of the animal.
+* **study**, the :class:`~mousedb.data.models.Study` of each :class:`~mousedb.data.models.Treatment` or :class:`~mousedb.data.models.Cohort` the animal is in.
+* **researcher**, the :class:`~mousedb.data.models.Researcher` objects of each treatment the animal is in.
+
+Animals which are not in any study or treatment are grouped as Unassigned.
+
+The intervals are then expanded into one entry per animal, group and day with NumPy, and reduced to the distinct cages occupied by each group on each day.
+A cage-day which is shared by several groups is split equally between them, so that the cage-days of all the groups add up to the cage-days of the colony.
+The cost of each group is its cage-days multiplied by the rate per cage-day (the CAGE_DAY_RATE setting by default).
+'''
+
+import datetime
+from collections import defaultdict
+
+import numpy
+from django.conf import settings
+from django.db.models import Q
+
+from mousedb.animal.models import Animal, CageHistory, Strain
+from mousedb.data.models import Study, Researcher, Treatment, Cohort
+
+GROUPINGS = ('strain', 'study', 'researcher')
+UNASSIGNED = u'Unassigned'
+
+def housing_intervals(start, end):
+    '''This returns arrays of the animal, cage, first day and last day (exclusive, as date ordinals) of each location of an animal during a billing period from start to end (inclusive).'''
+    first_day = start.toordinal()
+    stop_day = end.toordinal() + 1
+    rows = CageHistory.objects.filter(Cage__isnull=False, start__lte=end).filter(Q(end__isnull=True) | Q(end__gt=start)).values_list(
+        'animal', 'Cage', 'start', 'end', 'animal__Born', 'animal__Death', 'animal__Alive', 'animal__modified').order_by().iterator()
+    animals, cages, starts, stops = [], [], [], []
+    for animal, cage, location_start, location_end, born, death, alive, modified in rows:
+        if not alive and death is None:
+            death = modified.date()
+        begin = max([first_day, location_start.toordinal()] + ([born.toordinal()] if born else []))
+        finish = min([stop_day] + [date.toordinal() for date in (location_end, death) if date])
+        if finish > begin:
+            animals.append(animal)
+            cages.append(cage)
+            starts.append(begin)
+            stops.append(finish)
+    return numpy.array(animals, dtype=numpy.int64), numpy.array(cages, dtype=numpy.int64), numpy.array(starts, dtype=numpy.int64), numpy.array(stops, dtype=numpy.int64)
+
+def animal_groups(animals, by):
+    '''This returns a dictionary of the group ids of each of some animals for a grouping (see GROUPINGS), and a dictionary of the name of each group id.
+
+    The memberships of all animals are read (rather than filtering on a long list of ids) and animals with no group are in the group None.'''
+    groups = defaultdict(set)
+    if by == 'strain':
+        pairs = Animal.objects.order_by().values_list('pk', 'Strain')
+        names = dict((strain.pk, strain.Strain) for strain in Strain.objects.all())
+    elif by == 'study':
+        pairs = list(Treatment.animals.through.objects.filter(treatment__study__isnull=False).values_list('animal', 'treatment__study'))
+        pairs += list(Cohort.animals.through.objects.filter(cohort__studies__isnull=False).values_list('animal', 'cohort__studies'))
+        names = dict((study.pk, study.description) for study in Study.objects.all())
+    elif by == 'researcher':
+        pairs = Treatment.animals.through.objects.filter(treatment__researchers__isnull=False).values_list('animal', 'treatment__researchers')
+        names = dict((researcher.pk, u'%s' % researcher) for researcher in Researcher.objects.all())
+    else:
+        raise ValueError("Unknown grouping %s" % by)
+    for animal, group in pairs:
+        groups[animal].add(group)
+    names[None] = UNASSIGNED
+    return dict((animal, sorted(groups.get(animal)) if groups.get(animal) else [None]) for animal in animals), names
+
+def cage_days(start, end, by='strain'):
+    '''This returns a dictionary of the (animal-days, cage-days) of each group id during a billing period from start to end (inclusive), along with a dictionary of the name of each group id.'''
+    animals, cages, starts, stops = housing_intervals(start, end)
+    groups, names = animal_groups(set(animals.tolist()), by)
+    if not len(animals):
+        return {}, names
+    group_ids = sorted(set(group for animal_group_ids in groups.values() for group in animal_group_ids), key=lambda group: (group is not None, group))
+    group_index = dict((group, index) for index, group in enumerate(group_ids))
+    #one entry for each interval and group of its animal
+    memberships = [(interval, group_index[group]) for interval, animal in enumerate(animals.tolist()) for group in groups[animal]]
+    intervals = numpy.array([interval for interval, group in memberships], dtype=numpy.int64)
+    interval_groups = numpy.array([group for interval, group in memberships], dtype=numpy.int64)
+    lengths = stops[intervals] - starts[intervals]
+    animal_days = numpy.bincount(interval_groups, weights=lengths, minlength=len(group_ids))
+    #expand each interval into its days
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    days = numpy.repeat(starts[intervals] - start.toordinal(), lengths) + offsets
+    cage_codes = numpy.unique(cages, return_inverse=True)[1][intervals]
+    day_count = end.toordinal() - start.toordinal() + 1
+    keys = numpy.unique((numpy.repeat(cage_codes, lengths) * day_count + days) * len(group_ids) + numpy.repeat(interval_groups, lengths))
+    occupied, key_groups = keys // len(group_ids), keys % len(group_ids)
+    shared, sharing = numpy.unique(occupied, return_inverse=True, return_counts=True)[1:]
+    group_cage_days = numpy.bincount(key_groups, weights=1.0 / sharing[shared], minlength=len(group_ids))
+    return dict((group, (int(animal_days[index]), float(group_cage_days[index]))) for group, index in group_index.items()), names
+
+def housing_report(start, end, by='strain', rate=None):
+    '''This returns the rows of a housing cost report for a billing period, and a row of the totals.
+
+    Each row is a dictionary with the group, animal_days, cage_days and cost, and the rows are ordered by group (with Unassigned last).'''
+    if rate is None:
+        rate = getattr(settings, 'CAGE_DAY_RATE', 0)
+    days, names = cage_days(start, end, by)
+    rows = [{'group': names.get(group, UNASSIGNED), 'animal_days': animal_days, 'cage_days': round(group_cage_days, 2), 'cost': round(group_cage_days * rate, 2)}
+            for group, (animal_days, group_cage_days) in days.items()]
+    rows.sort(key=lambda row: (row['group'] == UNASSIGNED, row['group']))
+    total_cage_days = sum(group_cage_days for animal_days, group_cage_days in days.values())
+    totals = {'group': u'Total', 'animal_days': sum(animal_days for animal_days, group_cage_days in days.values()),
+              'cage_days': round(total_cage_days, 2), 'cost': round(total_cage_days * rate, 2)}
+    return rows, totals
+
+def previous_month(today=None):
+    '''This returns the first and last days of the month before today (the current date by default), the default billing period.'''
+    first_of_month = (today or datetime.date.today()).replace(day=1)
+    end = first_of_month - datetime.timedelta(days=1)
+    return end.replace(day=1), end
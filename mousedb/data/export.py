@@ -0,0 +1,154 @@
+'''This module streams the CSV exports of the data app.
+
+Each export reads its columns (including those of related objects) from a single values query, which is iterated without caching.
+The treatments of the animals are read in one further query and mapped to each animal.
+The rows are then written one at a time to a StreamingHttpResponse, so that large exports use a constant amount of memory and a constant number of queries.
+
+Measurement data can be exported with only the first value of each measurement, or with the full time courses in a wide (one row per measurement) or long (one row per value) layout.
+The time courses are read from the packed series of each measurement (see :mod:`~mousedb.data.timecourse`).
+'''
+
+import csv
+import datetime
+from itertools import chain
+
+from django.http import StreamingHttpResponse
+
+from mousedb.data.models import Measurement, Treatment
+from mousedb.data.timecourse import unpack_series, timepoint_array
+
+class Echo(object):
+    '''This is a file-like object which returns what is written to it, so a csv writer can be used to generate rows.'''
+
+    def write(self, value):
+        return value
+
+def stream_csv(filename, header, rows):
+    '''This returns a StreamingHttpResponse of a CSV file with a header row followed by the rows from an iterable.'''
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in chain([header], rows)), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename=%s' % filename
+    return response
+
+def animal_label(strain, mouse_id, pk):
+    '''This returns the name of an animal from its strain, MouseID and id, as in :meth:`~mousedb.animal.models.Animal.__unicode__`.'''
+    if mouse_id:
+        return u'%s-EarTag #%i' % (strain, mouse_id)
+    return u'%s (%i)' % (strain, pk)
+
+def treatment_map(animal_ids):
+    '''This returns a dictionary of the names of the treatments of each animal, as comma separated strings.
+
+    The animal_ids can be a list or a values queryset (which is used as a subquery).'''
+    treatments = {}
+    for animal, treatment in Treatment.animals.through.objects.filter(animal__in=animal_ids).values_list('animal', 'treatment__treatment').order_by('animal', 'treatment__treatment').iterator():
+        treatments.setdefault(animal, []).append(treatment)
+    return dict((animal, u', '.join(names)) for animal, names in treatments.items())
+
+def measurement_age(experiment_date, born):
+    '''This returns the age of an animal at an experiment in days, as in :meth:`~mousedb.data.models.Measurement.age`.'''
+    if born:
+        return (experiment_date - born).days
+    return 1
+
+def animal_age(born, death):
+    '''This returns the age of an animal in days, relative to the date of death or the current date, as in :meth:`~mousedb.animal.models.Animal.age`.
+
+    If the birth date is not known this is None.'''
+    if not born:
+        return None
+    return ((death or datetime.date.today()) - born).days
+
+MEASUREMENT_FIELDS = ('animal', 'animal__MouseID', 'animal__Strain__Strain', 'animal__Genotype', 'animal__Gender', 'animal__Background', 'animal__Cage', 'animal__Born',
+                      'assay__assay', 'assay__timepoints', 'values', 'series', 'experiment__feeding_state', 'experiment__date')
+
+def measurement_rows(measurements):
+    '''This generates a dictionary of the columns for each measurement, with the animal name and age and the treatments added.'''
+    treatments = treatment_map(measurements.values('animal'))
+    for row in measurements.values(*MEASUREMENT_FIELDS).iterator():
+        row['animal_label'] = animal_label(row['animal__Strain__Strain'], row['animal__MouseID'], row['animal'])
+        row['age'] = measurement_age(row['experiment__date'], row['animal__Born'])
+        row['treatments'] = treatments.get(row['animal'], u'')
+        row['series'] = unpack_series(row['series'], row['values'])
+        yield row
+
+DATA_HEADER = ["Animal", "Genotype", "Gender","Assay", "Value","Strain", "Background","Age", "Cage", "Feeding", "Treatment"]
+
+def data_columns(row, value):
+    '''This returns the columns of data.csv for a measurement row with a particular value.'''
+    return [row['animal_label'], row['animal__Genotype'], row['animal__Gender'], row['assay__assay'], value,
+            row['animal__Strain__Strain'], row['animal__Background'], row['age'], row['animal__Cage'], row['experiment__feeding_state'], row['treatments']]
+
+def series_value(value):
+    '''This formats a value from a series, writing whole numbers without a decimal point.'''
+    if value == int(value):
+        return int(value)
+    return value
+
+def first_value(series):
+    '''This returns the first value of a series, or an empty string if there are no values.'''
+    if len(series):
+        return series_value(series[0])
+    return ''
+
+def wide_columns(row, length):
+    '''This returns the columns of a wide data.csv for a measurement row, with the Value column replaced by length columns for the series.'''
+    columns = data_columns(row, None)
+    values = [series_value(value) for value in row['series']] + [''] * (length - len(row['series']))
+    return columns[:4] + values + columns[5:]
+
+def data_csv_response(measurements, layout='first'):
+    '''This streams the data.csv export of a set of :class:`~mousedb.data.models.Measurement` objects.
+
+    The layout is one of:
+    
+    * **first**, one row per measurement with only the first value.
+    * **wide**, one row per measurement with each value in its own column (Value 1, Value 2 and so on).
+    * **long**, one row per value with its Time (from the assay timepoints, or the position of the value if these are not set).
+    
+    A ValueError is raised for any other layout.'''
+    if layout == 'first':
+        rows = (data_columns(row, first_value(row['series'])) for row in measurement_rows(measurements))
+        return stream_csv('data.csv', DATA_HEADER, rows)
+    elif layout == 'wide':
+        length = max([len(unpack_series(series, values)) for series, values in measurements.values_list('series', 'values').iterator()] or [1])
+        header = DATA_HEADER[:4] + ["Value %i" % (index + 1) for index in range(length)] + DATA_HEADER[5:]
+        rows = (wide_columns(row, length) for row in measurement_rows(measurements))
+        return stream_csv('data.csv', header, rows)
+    elif layout == 'long':
+        rows = (data_columns(row, series_value(value)) + [series_value(time)]
+                for row in measurement_rows(measurements)
+                for time, value in zip(timepoint_array(row['assay__timepoints'], len(row['series'])), row['series']))
+        return stream_csv('data.csv', DATA_HEADER + ["Time"], rows)
+    raise ValueError("Unknown layout %s" % layout)
+
+def experiment_csv_response(experiment):
+    '''This streams the experiment.csv export of the measurements of an :class:`~mousedb.data.models.Experiment`.'''
+    rows = ([row['animal_label'], row['animal__Cage'], row['animal__Strain__Strain'], row['animal__Genotype'], row['animal__Gender'], row['age'],
+             row['assay__assay'], row['values'], row['experiment__feeding_state'], row['experiment__date'], row['treatments']]
+            for row in measurement_rows(Measurement.objects.filter(experiment=experiment)))
+    return stream_csv('experiment.csv', ["Animal","Cage", "Strain", "Genotype", "Gender","Age", "Assay", "Values", "Feeding", "Experiment Date", "Treatment"], rows)
+
+def aging_csv_response(animals):
+    '''This streams the aging.csv export of a set of :class:`~mousedb.animal.models.Animal` objects.'''
+    rows = ([row['MouseID'], row['Strain__Strain'], row['Genotype'], row['Gender'], animal_age(row['Born'], row['Death']), row['Cause_of_Death'], row['Alive']]
+            for row in animals.values('MouseID', 'Strain__Strain', 'Genotype', 'Gender', 'Born', 'Death', 'Cause_of_Death', 'Alive').iterator())
+    return stream_csv('aging.csv', ["Animal", "Strain", "Genotype", "Gender", "Age", "Death", "Alive"], rows)
+
+def litters_csv_response(animals):
+    '''This streams the litters.csv export of a set of :class:`~mousedb.animal.models.Animal` objects, with the breeding cage of each.'''
+    rows = ([row['Born'], row['Breeding'] and u'%s Breeding Cage: %s starting on %s' % (row['Breeding__Strain__Strain'], row['Breeding__Cage'], row['Breeding__Start']) or None, row['Strain__Strain']]
+            for row in animals.values('Born', 'Breeding', 'Breeding__Strain__Strain', 'Breeding__Cage', 'Breeding__Start', 'Strain__Strain').iterator())
+    return stream_csv('litters.csv', ["Born", "Breeding", "Strain"], rows)
+
+def housing_csv_response(rows, totals, by):
+    '''This streams the housing.csv export of a housing cost report (see :func:`~mousedb.data.billing.housing_report`), with a final row of the totals.'''
+    return stream_csv('housing.csv', [by.capitalize(), "Animal Days", "Cage Days", "Cost"],
+                      ([row['group'], row['animal_days'], row['cage_days'], row['cost']] for row in chain(rows, [totals])))
+
+def survival_csv_response(survival, by):
+    '''This streams the survival.csv export of the Kaplan-Meier curves of each group (see :func:`~mousedb.data.survival.calculate_survival`), with one row per age at which deaths occurred.'''
+    rows = ([group['group'], age, at_risk, survival_fraction, error, group['median']]
+            for group in survival
+            for age, at_risk, survival_fraction, error in zip(group['curve']['age'], group['curve']['at_risk'], group['curve']['survival'], group['curve']['error']))
+    return stream_csv('survival.csv', [by.capitalize(), "Age", "At Risk", "Survival", "Standard Error", "Median Lifespan"], rows)
@@ -0,0 +1,28 @@
+"""This command converts the values of existing measurements into packed series.
+
+This should be run once after upgrading, when the series field has been added to the measurement table::
+
+    python manage.py pack_measurement_values
+    
+Measurements which are saved after the upgrade are packed automatically.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mousedb.data.models import Measurement
+from mousedb.data.timecourse import pack_values
+
+class Command(BaseCommand):
+    """Packs the values of measurements which do not yet have a series."""
+    help = "Packs the comma separated values of each measurement into its series field."
+
+    def handle(self, *args, **options):
+        count = 0
+        with transaction.atomic():
+            for pk, values in Measurement.objects.filter(series__isnull=True, values__isnull=False).values_list('pk', 'values').iterator():
+                series = pack_values(values)
+                if series is not None:
+                    Measurement.objects.filter(pk=pk).update(series=series)
+                    count += 1
+        self.stdout.write("%s measurements were converted." % count)
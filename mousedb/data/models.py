@@ -1,9 +1,11 @@
 import datetime
 
 from django.db import models
+from django.utils import timezone
 from django.template.defaultfilters import slugify
 
 from mousedb.animal.models import Animal, Strain
+from mousedb.data.timecourse import pack_values, unpack_series, timepoint_array
 
 INJECTIONS = (
 	('Insulin', 'Insulin'),
@@ -45,10 +47,17 @@ class Experiment(models.Model):
     injection = models.CharField(max_length=20, choices=INJECTIONS, blank=True)
     concentration = models.CharField(max_length=20, blank=True)
     study = models.ForeignKey('Study', blank=True, null=True)
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     def __unicode__(self):
         """The unicode representation of an experiment is date-feeding_state, for example **2012-01-01-Fed**."""
         return u'%s-%s' % (self.date, self.feeding_state) 
+
+    def save(self, *args, **kwargs):
+        """The modified time is updated when an experiment is saved."""
+        self.modified = timezone.now()
+        super(Experiment, self).save(*args, **kwargs)
 	
     @models.permalink
     def get_absolute_url(self):
@@ -63,6 +72,7 @@ class Assay(models.Model):
 	assay_slug = models.SlugField(max_length=25)
 	notes = models.TextField(max_length = 500, blank = True)
 	measurement_units = models.CharField(max_length = 100)
+	timepoints = models.CommaSeparatedIntegerField(max_length=255, blank=True, help_text="for time courses, the time (in minutes) of each value, (comma separated values with no spaces)")
 	def __unicode__(self):
 		return u'%s' % self.assay		
 
@@ -71,9 +81,26 @@ class Measurement(models.Model):
     experiment = models.ForeignKey(Experiment)
     assay = models.ForeignKey(Assay)
     values = models.CommaSeparatedIntegerField(blank=True, null=True, max_length=255, help_text="use for time courses, (comma separated values with no spaces)")
+    series = models.BinaryField(blank=True, null=True, editable=False, help_text="the values packed as little-endian doubles")
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 	
     def __unicode__(self):
         return u'%s %s' % (self.animal, self.assay)
+
+    def save(self, *args, **kwargs):
+        '''The values are packed into the series field and the modified time is updated when a measurement is saved.'''
+        self.series = pack_values(self.values)
+        self.modified = timezone.now()
+        super(Measurement, self).save(*args, **kwargs)
+
+    def series_array(self):
+        '''This returns the values of this measurement as a NumPy array of floats.'''
+        return unpack_series(self.series, self.values)
+
+    def timepoint_array(self):
+        '''This returns the times (in minutes, from the assay timepoints) of each value as a NumPy array, or the position of each value if the assay has no matching timepoints.'''
+        return timepoint_array(self.assay.timepoints, len(self.series_array()))
 	
     def age(self):
         if self.animal.Born:
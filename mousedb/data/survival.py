@@ -0,0 +1,109 @@
+'''This module calculates the survival of animals, for ageing studies.
+
+The ages of all animals with a known birth date are read in one query into NumPy arrays, along with whether each age is a death or is censored:
+
+* animals which died of unknown causes (Unknown or Estimated) are deaths, at their age at death.
+* animals which were sacrificed or died accidentally are censored at their age at death, as they did not die naturally.
+* living animals are censored at their current age.
+
+Dead animals with no Death date cannot be placed so are not included.
+
+The animals are grouped by **strain**, **genotype**, **gender** or **treatment** (animals in several treatments are included in each, and animals in no treatment are grouped as No Treatment).
+For each group a Kaplan-Meier curve is calculated, giving the fraction of animals surviving after each age at which deaths occurred along with its standard error (by Greenwood's formula) and the number of animals at risk.
+The median lifespan is the first age at which the survival is 0.5 or less, or None if more than half of the animals are still alive or censored.
+
+The curves of a grouping are cached, and the cache key changes whenever animals (or treatment groups) change and at the start of each day (as the ages of living animals change).
+'''
+
+import datetime
+from collections import defaultdict
+
+import numpy
+from django.core.cache import cache
+
+from mousedb.animal.models import Animal
+from mousedb.data.models import Treatment
+from mousedb.conditional import latest_change, latest_modified, latest_deletion
+from mousedb.fragments import fragment_versions, FRAGMENT_TIMEOUT
+
+SURVIVAL_GROUPINGS = {'strain': 'Strain__Strain', 'genotype': 'Genotype', 'gender': 'Gender', 'treatment': None}
+NATURAL_CAUSES = ('Unknown', 'Estimated')
+NO_TREATMENT = u'No Treatment'
+
+def survival_data(today=None):
+    '''This returns the ids, ages (in days) and deaths (True for a death, False if censored) of the animals as NumPy arrays, with the values of each grouping as lists.'''
+    today = today or datetime.date.today()
+    rows = list(Animal.objects.filter(Born__isnull=False).exclude(Alive=False, Death__isnull=True).order_by().values_list(
+        'pk', 'Born', 'Death', 'Cause_of_Death', 'Strain__Strain', 'Genotype', 'Gender'))
+    ids = numpy.array([row[0] for row in rows], dtype=numpy.int64)
+    born = numpy.array([row[1].toordinal() for row in rows], dtype=numpy.int64)
+    ended = numpy.array([(row[2] or today).toordinal() for row in rows], dtype=numpy.int64)
+    deaths = numpy.array([row[2] is not None and row[3] in NATURAL_CAUSES for row in rows], dtype=bool)
+    values = {'strain': [row[4] for row in rows], 'genotype': [row[5] for row in rows], 'gender': [row[6] for row in rows]}
+    return ids, ended - born, deaths, values
+
+def kaplan_meier(ages, deaths):
+    '''This returns the Kaplan-Meier curve of some ages and deaths, as a dictionary of lists of the ages at which deaths occurred, the survival, its standard error and the number at risk after each of those ages.'''
+    times, inverse, counts = numpy.unique(ages, return_inverse=True, return_counts=True)
+    died = numpy.bincount(inverse, weights=deaths, minlength=len(times))
+    at_risk = len(ages) - numpy.cumsum(counts) + counts
+    steps = died > 0
+    times, died, at_risk = times[steps], died[steps], at_risk[steps]
+    survival = numpy.cumprod(1 - died / at_risk)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        variance = numpy.cumsum(died / (at_risk * (at_risk - died)))
+    error = survival * numpy.sqrt(variance)
+    return {'age': times.tolist(), 'survival': survival.tolist(), 'error': [None if numpy.isinf(value) or numpy.isnan(value) else float(value) for value in error],
+            'at_risk': at_risk.astype(int).tolist()}
+
+def median_lifespan(curve):
+    '''This returns the median lifespan from a Kaplan-Meier curve, or None if the survival does not fall to 0.5.'''
+    for age, survival in zip(curve['age'], curve['survival']):
+        if survival <= 0.5:
+            return age
+    return None
+
+def calculate_survival(by, today=None):
+    '''This returns a list of the survival of each group of a grouping (see SURVIVAL_GROUPINGS), ordered by group.
+
+    Each is a dictionary with the group, the number of animals, deaths and censored animals, the median lifespan and the Kaplan-Meier curve.'''
+    if by not in SURVIVAL_GROUPINGS:
+        raise ValueError("Unknown grouping %s" % by)
+    ids, ages, deaths, values = survival_data(today)
+    members = defaultdict(list)
+    if by == 'treatment':
+        treatments = defaultdict(list)
+        for animal, treatment in Treatment.animals.through.objects.values_list('animal', 'treatment__treatment'):
+            treatments[animal].append(treatment)
+        for index, animal in enumerate(ids.tolist()):
+            for treatment in treatments.get(animal, [NO_TREATMENT]):
+                members[treatment].append(index)
+    else:
+        for index, value in enumerate(values[by]):
+            members[value].append(index)
+    results = []
+    for group in sorted(members):
+        indices = numpy.array(members[group], dtype=numpy.int64)
+        curve = kaplan_meier(ages[indices], deaths[indices])
+        results.append({'group': group, 'animals': len(indices), 'deaths': int(deaths[indices].sum()), 'censored': int(len(indices) - deaths[indices].sum()),
+                        'median': median_lifespan(curve), 'curve': curve})
+    return results
+
+def survival_cache_key(by, today=None):
+    '''This returns the cache key of the survival of a grouping, from the date (as the ages of living animals change each day) and the time of the most recent change to the animals (and the treatment groups, for the treatment grouping).'''
+    today = today or datetime.date.today()
+    changed = latest_change(latest_modified(Animal.objects.all()), latest_deletion(Animal))
+    key = 'survival-%s-%s-%s' % (by, today.strftime('%Y%m%d'), changed.strftime('%Y%m%d%H%M%S%f'))
+    if by == 'treatment':
+        key = '%s-%s' % (key, fragment_versions(('treatment', None)))
+    return key
+
+def survival_by(by):
+    '''This returns the survival of each group of a grouping (see :func:`~mousedb.data.survival.calculate_survival`), which is cached until the animals change or the day ends.'''
+    today = datetime.date.today()
+    key = survival_cache_key(by, today)
+    results = cache.get(key)
+    if results is None:
+        results = calculate_survival(by, today)
+        cache.set(key, results, FRAGMENT_TIMEOUT)
+    return results
@@ -3,13 +3,20 @@
 These tests will verify generation of new experiment, measurement, assay, researcher, study, treatment, vendor, diet, environment, implantation, transplantation and pharnaceutical objects.
 """
 import datetime
+import json
 
 from django.test import TestCase
-from django.test.client import Client
+from django.test.client import Client, RequestFactory
 from django.contrib.auth.models import User
 
-from mousedb.data.models import Study, Diet, Environment, Researcher, Treatment, Transplantation, Pharmaceutical, Implantation, Vendor, Cohort
+from mousedb.data.models import Measurement, Study, Diet, Environment, Researcher, Treatment, Transplantation, Pharmaceutical, Implantation, Vendor, Cohort
 from mousedb.animal.models import Strain, Animal
+from mousedb.data.analysis import experiment_summary
+from mousedb.data.api import MeasurementResource
+from mousedb.pagination import decode_cursor
+from mousedb.animal.housing import record_moves
+from mousedb.data.billing import cage_days
+from mousedb.data.survival import calculate_survival, survival_cache_key
 
 MODELS = [Study]
 
@@ -110,6 +117,51 @@ class StudyViewTests(BasicTestCase):
         self.assertTemplateUsed(response, 'jquery_script.html')
         self.assertTemplateUsed(response, 'jquery_ui_script_css.html')
         self.assertTemplateUsed(response, 'confirm_delete.html')
+
+    def test_housing_costs(self):
+        """This test checks the cage-days calculated from the cage history of animals which move cages and die during a billing period, and the housing cost report and csv file."""
+        strain = Strain(Strain="Housing Strain", Strain_slug="housing-strain")
+        strain.save()
+        mover = Animal(Strain=strain, Background="Mixed", Born=datetime.date(2012,12,1), Cage=500)
+        mover.save()
+        pup = Animal(Strain=strain, Background="Mixed", Born=datetime.date(2013,1,5), Death=datetime.date(2013,1,8), Cage=500)
+        pup.save()
+        Animal.objects.filter(pk=mover.pk).update(Cage=501)
+        record_moves(Animal.objects.filter(pk=mover.pk), today=datetime.date(2013,1,6))
+        days, names = cage_days(datetime.date(2013,1,1), datetime.date(2013,1,10), 'strain')
+        self.assertEqual(days[strain.pk], (13, 12.0))
+        self.assertEqual(names[strain.pk], u'Housing Strain')
+        response = self.client.get('/study/housing/', {'start': '2013-01-01', 'end': '2013-01-10', 'rate': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'housing_costs.html')
+        self.assertEqual([row['cost'] for row in response.context['rows'] if row['group'] == u'Housing Strain'], [24.0])
+        response = self.client.get('/study/housing/', {'start': '2013-01-01', 'end': '2013-01-10', 'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+    def test_survival(self):
+        """This test checks the Kaplan-Meier curve and median lifespan of a strain with natural deaths, a sacrificed (censored) animal and a living (censored) animal, and the ageing page."""
+        strain = Strain(Strain="Survival Strain", Strain_slug="survival-strain")
+        strain.save()
+        born = datetime.date(2013,1,1)
+        today = datetime.date(2014,1,1)
+        for death, cause in [(100, 'Unknown'), (200, 'Unknown'), (150, 'Sacrificed')]:
+            animal = Animal(Strain=strain, Background="Mixed", Born=born, Death=born + datetime.timedelta(days=death), Cause_of_Death=cause)
+            animal.save()
+        animal = Animal(Strain=strain, Background="Mixed", Born=today - datetime.timedelta(days=300))
+        animal.save()
+        group = [group for group in calculate_survival('strain', today) if group['group'] == u'Survival Strain'][0]
+        self.assertEqual((group['animals'], group['deaths'], group['censored']), (4, 2, 2))
+        self.assertEqual(group['curve']['age'], [100, 200])
+        self.assertEqual(group['curve']['at_risk'], [4, 2])
+        self.assertEqual(group['curve']['survival'], [0.75, 0.375])
+        self.assertEqual(group['median'], 200)
+        self.assertNotEqual(survival_cache_key('strain', today), survival_cache_key('strain', today + datetime.timedelta(days=1)))
+        response = self.client.get('/study/aging', {'by': 'genotype'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'study_aging.html')
+        self.assertEqual(response.context['by'], 'genotype')
+        response = self.client.get('/study/aging/survival.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
 				
 class TreatmentModelTests(BasicTestCase):
     '''These tests test the functionality of :class:`~mousedb.data.models.Treatment` objects.'''
@@ -528,6 +580,76 @@ class MeasurementViewTests(BasicTestCase):
         self.assertEqual(test_response.status_code, 200)
         self.assertEqual(test_response['Content-Type'], 'text/csv')
         self.assertEqual(test_response['Content-Disposition'], 'attachment; filename=data.csv') 
+        with self.assertNumQueries(2):
+            rows = b''.join(test_response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(rows[0], 'Animal,Genotype,Gender,Assay,Value,Strain,Background,Age,Cage,Feeding,Treatment')
+        self.assertEqual(len(rows), Measurement.objects.count() + 1)
+
+    def test_measurement_series(self):
+        """This tests that measurement values are packed into a series and can be exported as full time courses."""
+        measurement = Measurement.objects.get(pk=1)
+        measurement.values = '100,150,120'
+        measurement.save()
+        measurement = Measurement.objects.get(pk=1)
+        self.assertEqual(list(measurement.series_array()), [100.0, 150.0, 120.0])
+        self.assertEqual(list(measurement.timepoint_array()), [0.0, 1.0, 2.0])
+        measurement.assay.timepoints = '0,15,30'
+        measurement.assay.save()
+        self.assertEqual(list(Measurement.objects.get(pk=1).timepoint_array()), [0.0, 15.0, 30.0])
+        rows = b''.join(self.client.get('/experiment/data/all.csv?layout=wide').streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(rows[0].split(',')[4:7], ['Value 1', 'Value 2', 'Value 3'])
+        self.assertEqual(rows[1].split(',')[4:7], ['100', '150', '120'])
+        rows = b''.join(self.client.get('/experiment/data/all.csv?layout=long').streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([row.split(',')[-1] for row in rows], ['Time', '0', '15', '30'])
+        self.assertEqual(self.client.get('/experiment/data/all.csv?layout=other').status_code, 404)
+
+    def test_experiment_analysis(self):
+        """This tests the summary of the measurements of an experiment (with an animal measured twice, which counts as one sample) and the experiment-analysis view."""
+        measurement = Measurement.objects.get(pk=1)
+        measurement.values = '100,200,100'
+        measurement.save()
+        Measurement(animal=Animal.objects.get(pk=2), experiment=measurement.experiment, assay=measurement.assay, values='100,100,100').save()
+        Measurement(animal=Animal.objects.get(pk=2), experiment=measurement.experiment, assay=measurement.assay, values='100,100,100').save()
+        measurement.assay.timepoints = '0,15,30'
+        measurement.assay.save()
+        with self.assertNumQueries(2):
+            analysis = experiment_summary(measurement.experiment)
+        assay = analysis['assays'][0]
+        self.assertEqual(assay['timepoints'], [0.0, 15.0, 30.0])
+        treatment = assay['treatments'][0]
+        self.assertEqual(treatment['treatment'], 'No Treatment')
+        self.assertEqual(treatment['animals'], 2)
+        self.assertEqual(treatment['mean'], [100.0, 150.0, 100.0])
+        self.assertEqual(treatment['normalized_mean'], [100.0, 150.0, 100.0])
+        self.assertEqual(treatment['auc_mean'], 3750.0)
+        self.assertAlmostEqual(treatment['auc_sem'], 750.0)
+        self.assertEqual(assay['comparisons'], [])
+        test_response = self.client.get('/experiment/1/analysis/')
+        self.assertEqual(test_response.status_code, 200)
+        self.assertTemplateUsed(test_response, 'analysis.html')
+        self.assertEqual(test_response.context['analysis'], analysis)
+
+    def test_measurement_resource_lean(self):
+        """This tests the lean list mode of the measurement API, with sideloaded animals, assays and experiments."""
+        resource = MeasurementResource()
+        request = RequestFactory().get('/api/v1/data/', {'mode': 'lean', 'sideload': 'true'})
+        with self.assertNumQueries(1):
+            bundles = [resource.full_dehydrate(resource.build_bundle(obj=measurement, request=request), for_list=True) for measurement in resource.get_object_list(request)]
+            data = resource.alter_list_data_to_serialize(request, {'objects': bundles})
+        self.assertEqual(data['objects'][0].data['animal'], 1)
+        self.assertEqual(data['objects'][0].data['values'], '123')
+        self.assertEqual(data['included']['animals']['1']['strain'], u'Fixture Strain')
+        self.assertEqual(data['included']['assays']['1']['assay'], u'Fixture Assay')
+
+    def test_measurement_resource_full(self):
+        """This tests that the full list mode of the measurement API uses the same number of queries however many measurements there are."""
+        Measurement(animal=Animal.objects.get(pk=2), assay_id=1, experiment_id=1, values='456').save()
+        resource = MeasurementResource()
+        request = RequestFactory().get('/api/v1/data/')
+        with self.assertNumQueries(3):
+            bundles = [resource.full_dehydrate(resource.build_bundle(obj=measurement, request=request), for_list=True) for measurement in resource.get_object_list(request)]
+        self.assertEqual(len(bundles), 2)
+        self.assertEqual(bundles[0].data['animal'].data['strain'].data['Strain'], u'Fixture Strain')
 
     def test_strain_measurement_list(self):
         """This tests the strain-data view, ensuring that templates are loaded correctly.  
@@ -563,4 +685,15 @@ class MeasurementViewTests(BasicTestCase):
         
         #test that a fake strain gives a 404 error
         fake_test_response = self.client.get('/strain/some-made-up-strain/data.csv')
-        self.assertEqual(fake_test_response.status_code, 404)      
\ No newline at end of file
+        self.assertEqual(fake_test_response.status_code, 404)      
+
+    def test_measurement_resource_export(self):
+        """This tests the NDJSON bulk export of the measurement API, continued from its next cursor."""
+        resource = MeasurementResource()
+        lines = [json.loads(line) for line in resource.export_lines(Measurement.objects.all(), None, None)]
+        self.assertEqual(lines[0]['id'], 1)
+        self.assertEqual(lines[0]['values'], '123')
+        self.assertEqual(lines[-1]['meta']['count'], 1)
+        after = decode_cursor(lines[-1]['meta']['next'], Measurement._meta.get_field('modified'))
+        lines = [json.loads(line) for line in resource.export_lines(Measurement.objects.all(), after, None)]
+        self.assertEqual(lines, [{'meta': {'count': 0, 'next': lines[-1]['meta']['next']}}])
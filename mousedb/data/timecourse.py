@@ -0,0 +1,44 @@
+'''This module converts time course measurements between their text and packed forms.
+
+The values of a :class:`~mousedb.data.models.Measurement` are entered as comma separated text, but are also stored as a packed array of little-endian double precision floats in the series field.
+This allows the values to be read directly into a NumPy array, without parsing the text.
+The times of each value (in minutes) are set for each :class:`~mousedb.data.models.Assay` by its timepoints field, and if these are not set the position of each value is used instead.
+'''
+
+import struct
+
+import numpy
+
+SERIES_DTYPE = numpy.dtype('<f8')
+
+def parse_values(values):
+    '''This returns a list of the numbers in a comma separated string (which may be empty or None).'''
+    if not values:
+        return []
+    return [float(value) for value in values.split(',') if value.strip()]
+
+def pack_values(values):
+    '''This packs a comma separated string of values into bytes for the series field, or returns None if there are no values.'''
+    numbers = parse_values(values)
+    if not numbers:
+        return None
+    return struct.pack('<%dd' % len(numbers), *numbers)
+
+def unpack_series(series, values=None):
+    '''This returns a NumPy array of the values in a packed series.
+
+    If the series has not been packed (for example for rows which have not yet been converted) the comma separated values are used instead.'''
+    if series is None:
+        series = pack_values(values)
+    if series is None:
+        return numpy.zeros(0, dtype=SERIES_DTYPE)
+    return numpy.frombuffer(bytes(series), dtype=SERIES_DTYPE)
+
+def timepoint_array(timepoints, length):
+    '''This returns a NumPy array of the times of a series of the given length.
+
+    The timepoints are a comma separated string, and if they do not match the length of the series the positions (0, 1, 2...) are returned.'''
+    times = numpy.array(parse_values(timepoints), dtype=SERIES_DTYPE)
+    if len(times) != length:
+        return numpy.arange(length, dtype=SERIES_DTYPE)
+    return times
@@ -10,6 +10,7 @@ urlpatterns = [
 	url(r'^$', views.ExperimentList.as_view(), name="experiment-list"),
 	url(r'^(?P<pk>\d*)/$', views.ExperimentDetail.as_view(), name="experiment-detail"),
 	url(r'^(?P<pk>\d*)/csv', views.experiment_details_csv, name="experiment-detail-csv"),
+	url(r'^(?P<pk>\d*)/analysis/$', views.ExperimentAnalysis.as_view(), name="experiment-analysis"),
 	url(r'^data_entry/$', views.MeasurementCreate.as_view(), name="data-entry"),
 	url(r'^new/$', views.ExperimentCreate.as_view(), name="experiment-new"),
         url(r'^(?P<pk>\d*)/delete/$', views.ExperimentDelete.as_view(), name="experiment-delete"),	
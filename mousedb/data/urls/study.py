@@ -12,8 +12,11 @@ urlpatterns = [
 	url(r'^(?P<pk>\d*)/$', views.StudyDetail.as_view(), name="study-detail"),
 	url(r'^(?P<pk>\d*)/edit/$', views.StudyUpdate.as_view(), name="study-edit"),
 	url(r'^(?P<pk>\d*)/delete/$', views.StudyDelete.as_view(), name = "study-delete"),
+	url(r'^(?P<pk>\d*)/analysis/$', views.StudyAnalysis.as_view(), name="study-analysis"),
 	url(r'^(?P<pk>\d*)/experiment/new/$', views.study_experiment, name="study-experiment-new"),
 	url(r'^aging$', views.StudyAgeing.as_view(), name="study-aging-detail"),
     url(r'^aging/all.csv', views.aging_csv, name="aging-csv"),
-    url(r'^litters/all.csv', views.litters_csv, name="litters-csv")
+    url(r'^aging/survival.csv', views.survival_csv, name="survival-csv"),
+    url(r'^litters/all.csv', views.litters_csv, name="litters-csv"),
+    url(r'^housing/$', views.HousingCosts.as_view(), name="housing-costs"),
 ]
@@ -1,14 +1,14 @@
-import csv
-
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, Http404
 from django.template import RequestContext
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic import TemplateView, View
 from django.core.urlresolvers import reverse_lazy
+from django.conf import settings
+from django.utils.dateparse import parse_date
 
 from braces.views import LoginRequiredMixin, PermissionRequiredMixin
 
@@ -16,6 +16,10 @@ from mousedb.animal.models import Animal, Strain
 from mousedb.animal.views import AnimalList
 from mousedb.data.models import Experiment, Measurement, Study, Treatment, Pharmaceutical, Cohort, Diet
 from mousedb.data.forms import MeasurementForm, MeasurementFormSet, StudyExperimentForm, TreatmentForm, CohortForm
+from mousedb.data.export import data_csv_response, experiment_csv_response, aging_csv_response, litters_csv_response, housing_csv_response, survival_csv_response
+from mousedb.data.billing import housing_report, previous_month, GROUPINGS
+from mousedb.data.survival import survival_by, SURVIVAL_GROUPINGS
+from mousedb.data.analysis import experiment_summary, study_summary
 
 class CohortDetail(LoginRequiredMixin,DetailView):
     '''This view generates details about a :class:`~mousedb.data.models.Cohort` object.
@@ -153,6 +157,48 @@ class PharmaceuticalDelete(PermissionRequiredMixin,DeleteView):
     template_name = 'confirm_delete.html'
     success_url = reverse_lazy('pharmaceutical-list')
 
+class HousingCosts(LoginRequiredMixin, TemplateView):
+    '''This view shows the housing costs (cage-days) of the colony for a billing period, grouped by strain, study or researcher.
+
+    The billing period is set by the **start** and **end** dates (by default the previous month), the grouping by **by** (strain, study or researcher) and the rate per cage-day by **rate** (by default the CAGE_DAY_RATE setting).
+    The same report is available as a csv file by adding **format=csv** (see :func:`~mousedb.data.export.housing_csv_response`).
+    The cage-days are calculated from the cage history of the animals, see :mod:`~mousedb.data.billing`.'''
+
+    template_name = 'housing_costs.html'
+
+    def get_parameters(self):
+        '''This returns the start, end, grouping and rate from the request, using the defaults for any which are missing or not valid.'''
+        start, end = previous_month()
+        try:
+            start = parse_date(self.request.GET.get('start', '')) or start
+            end = parse_date(self.request.GET.get('end', '')) or end
+        except ValueError:
+            pass
+        by = self.request.GET.get('by', 'strain')
+        if by not in GROUPINGS:
+            by = 'strain'
+        try:
+            rate = float(self.request.GET.get('rate', getattr(settings, 'CAGE_DAY_RATE', 0)))
+        except ValueError:
+            rate = getattr(settings, 'CAGE_DAY_RATE', 0)
+        return start, end, by, rate
+
+    def get(self, request, *args, **kwargs):
+        '''A request with format=csv returns the report as a csv file.'''
+        if request.GET.get('format') == 'csv':
+            start, end, by, rate = self.get_parameters()
+            rows, totals = housing_report(start, end, by, rate)
+            return housing_csv_response(rows, totals, by)
+        return super(HousingCosts, self).get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        '''This adds the billing period, grouping, rate, report rows and totals to the context.'''
+        context = super(HousingCosts, self).get_context_data(**kwargs)
+        start, end, by, rate = self.get_parameters()
+        context['rows'], context['totals'] = housing_report(start, end, by, rate)
+        context.update({'start': start, 'end': end, 'by': by, 'rate': rate, 'groupings': GROUPINGS})
+        return context
+
 class TreatmentDetail(LoginRequiredMixin, DetailView):
     '''This view generates details about a :class:`~mousedb.data.models.Treatment` object.
     
@@ -225,91 +271,46 @@ def study_experiment(request, study_id):
 def experiment_details_csv(request, pk):
     """This view generates a csv output file of an experiment.
 	
-	The view writes to a csv table the animal, genotype, age (in days), assay and values."""
+	The view writes to a csv table the animal, genotype, age (in days), assay and values.
+    The file is streamed, see :func:`~mousedb.data.export.experiment_csv_response`."""
     experiment = get_object_or_404(Experiment, pk=pk)
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=experiment.csv'
-    writer = csv.writer(response)
-    writer.writerow(["Animal","Cage", "Strain", "Genotype", "Gender","Age", "Assay", "Values", "Feeding", "Experiment Date", "Treatment"])
-    for measurement in experiment.measurement_set.iterator():
-        writer.writerow([
-			measurement.animal,
-            measurement.animal.Cage,
-            measurement.animal.Strain,
-			measurement.animal.Genotype, 
-			measurement.animal.Gender,
-			measurement.age(), 
-			measurement.assay, 
-			measurement.values, 
-            measurement.experiment.feeding_state,
-            measurement.experiment.date,
-			measurement.animal.treatment_set.all()
-			])
-    return response
+    return experiment_csv_response(experiment)
     
     
 def aging_csv(request):
     """This view generates a csv output file of all animal data for use in aging analysis.
 	
-	The view writes to a csv table the animal, strain, genotype, age (in days), and cause of death."""
-    animal_list = Animal.objects.all()
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=aging.csv'
-    writer = csv.writer(response)
-    writer.writerow(["Animal", "Strain", "Genotype", "Gender", "Age", "Death", "Alive"])
-    for animal in animal_list.iterator():
-        writer.writerow([
-            animal.MouseID, 
-            animal.Strain, 
-            animal.Genotype, 
-            animal.Gender,
-            animal.age(),
-            animal.Cause_of_Death,
-            animal.Alive            
-            ])
-    return response    
+	The view writes to a csv table the animal, strain, genotype, age (in days), and cause of death.
+    The file is streamed, see :func:`~mousedb.data.export.aging_csv_response`."""
+    return aging_csv_response(Animal.objects.all())
  
+@login_required
+def survival_csv(request):
+    """This view generates a csv output file of the Kaplan-Meier survival curves of each strain, genotype, gender or treatment (set by the **by** parameter).
+
+    The curves are calculated by :mod:`~mousedb.data.survival`, see :func:`~mousedb.data.export.survival_csv_response`."""
+    by = request.GET.get('by', 'strain')
+    if by not in SURVIVAL_GROUPINGS:
+        raise Http404
+    return survival_csv_response(survival_by(by), by)
+
 def litters_csv(request):
     """This view generates a csv output file of all animal data for use in litter analysis.
 	
-	The view writes to a csv table the birthdate, breeding cage and strain."""
-    animal_list = Animal.objects.all()
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=litters.csv'
-    writer = csv.writer(response)
-    writer.writerow(["Born", "Breeding", "Strain"])
-    for animal in animal_list:
-        writer.writerow([
-            animal.Born,
-            animal.Breeding,
-            animal.Strain
-            ])
-    return response   
+	The view writes to a csv table the birthdate, breeding cage and strain.
+    The file is streamed, see :func:`~mousedb.data.export.litters_csv_response`."""
+    return litters_csv_response(Animal.objects.all())
 
 def data_csv(request, measurement_list):
     """This view generates a csv output of all data for a strain.
     
-    For this function to work, you have to provide the filtered set of measurements."""
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=data.csv'
-    writer = csv.writer(response)
-    writer.writerow(["Animal", "Genotype", "Gender","Assay", "Value","Strain", "Background","Age", "Cage", "Feeding", "Treatment"])
-    for measurement in measurement_list:
-        writer.writerow([
-            measurement.animal,
-            measurement.animal.Genotype,
-            measurement.animal.Gender,
-            measurement.assay,
-            measurement.values.split(',')[0],
-            measurement.animal.Strain,
-            measurement.animal.Background,
-            measurement.age(),
-            measurement.animal.Cage,
-            measurement.experiment.feeding_state,
-            measurement.animal.treatment_set.all(),
-            ])
-    return response
+    For this function to work, you have to provide the filtered set of measurements.
+    By default only the first value of each measurement is written, but full time courses are written with the request parameter **layout=wide** or **layout=long**.
+    The file is streamed, see :func:`~mousedb.data.export.data_csv_response`."""
+    try:
+        return data_csv_response(measurement_list, request.GET.get('layout', 'first'))
+    except ValueError:
+        raise Http404("Unknown layout")
     
     
 class ExperimentDetail(LoginRequiredMixin, DetailView):
@@ -321,6 +322,20 @@ class ExperimentDetail(LoginRequiredMixin, DetailView):
     context_object_name = 'experiment'
     template_name = 'experiment_detail.html'
     
+class ExperimentAnalysis(LoginRequiredMixin, DetailView):
+    '''This view summarizes the measurements of a particular :class:`~mousedb.data.Experiment` by treatment group.
+    
+    It passes an object **analysis** (see :func:`~mousedb.data.analysis.experiment_summary`) when the url **/experiment/<pk#>/analysis/** is requested.'''
+
+    model = Experiment
+    template_name = 'analysis.html'
+
+    def get_context_data(self, **kwargs):
+        '''This adds the analysis of the experiment into the context.'''
+        context = super(ExperimentAnalysis, self).get_context_data(**kwargs)
+        context['analysis'] = experiment_summary(self.object)
+        return context
+    
 class ExperimentCreate(PermissionRequiredMixin, CreateView):
     '''This view is for creating a new :class:`~mousedb.data.Experiment`.
     
@@ -422,6 +437,20 @@ class StudyDetail(LoginRequiredMixin, DetailView):
     context_object_name = 'study'
     template_name = 'study_detail.html'
     
+class StudyAnalysis(LoginRequiredMixin, DetailView):
+    '''This view summarizes the measurements of all the experiments in a particular :class:`~mousedb.data.Study` by treatment group.
+    
+    It passes an object **analysis** (see :func:`~mousedb.data.analysis.study_summary`) when the url **/study/<pk#>/analysis/** is requested.'''
+
+    model = Study
+    template_name = 'analysis.html'
+
+    def get_context_data(self, **kwargs):
+        '''This adds the analysis of the study into the context.'''
+        context = super(StudyAnalysis, self).get_context_data(**kwargs)
+        context['analysis'] = study_summary(self.object)
+        return context
+    
 class StudyCreate(PermissionRequiredMixin, CreateView):
     '''This view is for creating a new :class:`~mousedb.data.Study`.
     
@@ -469,6 +498,22 @@ class StudyAgeing(AnimalList):
     This is a subclass of :class:`~mousedb.animal.views.AnimalList`.'''
     
     queryset = Animal.objects.filter(Alive=False, Cause_of_Death="Unknown")   
+    template_name = 'study_aging.html'
+
+    def get_grouping(self):
+        '''This returns the grouping of the survival curves, from the **by** parameter (strain by default).'''
+        by = self.request.GET.get('by', 'strain')
+        if by not in SURVIVAL_GROUPINGS:
+            by = 'strain'
+        return by
+
+    def get_context_data(self, **kwargs):
+        '''This adds the survival of each group (see :mod:`~mousedb.data.survival`) and the grouping to the context.'''
+        context = super(StudyAgeing, self).get_context_data(**kwargs)
+        context['by'] = self.get_grouping()
+        context['groupings'] = sorted(SURVIVAL_GROUPINGS)
+        context['survival'] = survival_by(context['by'])
+        return context
     
 class TreatmentDetail(LoginRequiredMixin, DetailView):
     '''This view is for details of a particular :class:`~mousedb.data.Treatment`.
@@ -0,0 +1,118 @@
+'''This module keeps the versions used to cache the rendered rows of the animal, breeding and measurement tables.
+
+Each row of animal_list_table.html, breeding_table.html and data_table.html is cached with the {% cache %} template tag, using a key made of the versions of the objects it shows (see the fragment_version tag in :mod:`~mousedb.animal.templatetags.custom_filters`).
+A version is a token kept in the cache for each object (for example each :class:`~mousedb.animal.models.Animal`), or for a whole model where the rows only show its names (for example :class:`~mousedb.animal.models.Strain`).
+When an object is saved or deleted, its version is replaced, along with the versions of any rows which show it, so only the changed rows are rendered again.
+The current date is included in every key, as the rows show ages and durations.
+
+The versions and fragments are kept in the default cache, so they work with the local-memory and file-based cache backends (the file-based cache is shared between server processes, so use it when running more than one).
+Bulk changes which do not send signals call :func:`~mousedb.fragments.invalidate_animal_fragments` directly.
+'''
+
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+
+from mousedb.animal.models import Animal, Breeding, Strain
+from mousedb.data.models import Measurement, Experiment, Assay, Treatment
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+
+def fragment_version_key(model_name, pk=None):
+    '''This returns the cache key of the version of an object, or of a whole model if pk is None.'''
+    if pk is None:
+        return 'fragment-version-%s' % model_name
+    return 'fragment-version-%s-%s' % (model_name, pk)
+
+def new_version():
+    '''This returns a new version token.
+
+    The tokens are based on the current time so that they are not repeated after the cache is cleared.'''
+    return '%x' % int(time.time() * 1000000)
+
+def fragment_versions(*keys):
+    '''This returns a string of the versions of several (model_name, pk) pairs and the current date, creating any versions which are missing.'''
+    cache_keys = [fragment_version_key(model_name, pk) for model_name, pk in keys]
+    versions = cache.get_many(cache_keys)
+    missing = dict((key, new_version()) for key in cache_keys if key not in versions)
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+        versions.update(missing)
+    return u'.'.join([versions[key] for key in cache_keys] + [datetime.date.today().isoformat()])
+
+def bump_fragment_versions(model_name, pks=(None,)):
+    '''This replaces the versions of objects of a model (or of the whole model by default), so that the rows showing them are rendered again.'''
+    version = new_version()
+    cache.set_many(dict((fragment_version_key(model_name, pk), version) for pk in pks), FRAGMENT_TIMEOUT)
+
+def invalidate_animal_fragments(pks):
+    '''This replaces the versions of some animals and of the breeding cages they are pups or breeders in.'''
+    pks = list(pks)
+    if not pks:
+        return
+    breedings = set(Animal.objects.filter(pk__in=pks, Breeding__isnull=False).values_list('Breeding', flat=True))
+    breedings.update(Breeding.Male.through.objects.filter(animal__in=pks).values_list('breeding', flat=True))
+    breedings.update(Breeding.Females.through.objects.filter(animal__in=pks).values_list('breeding', flat=True))
+    bump_fragment_versions('animal', pks)
+    if breedings:
+        bump_fragment_versions('breeding', breedings)
+
+def animal_changed(sender, instance, **kwargs):
+    '''A saved or deleted animal changes its own row (and so the rows of its measurements) and the rows of its breeding cages.
+
+    This is called before an animal is deleted, while its breeding cages can still be found.'''
+    invalidate_animal_fragments([instance.pk])
+    if instance.Breeding_id:
+        bump_fragment_versions('breeding', [instance.Breeding_id])
+
+def breeding_changed(sender, instance, **kwargs):
+    '''A saved or deleted breeding cage changes its own row and the rows of its breeders (which show whether they are in the breeding cage).
+
+    This is called before a breeding cage is deleted, while its breeders can still be found.'''
+    breeders = set(Breeding.Male.through.objects.filter(breeding=instance.pk).values_list('animal', flat=True))
+    breeders.update(Breeding.Females.through.objects.filter(breeding=instance.pk).values_list('animal', flat=True))
+    bump_fragment_versions('breeding', [instance.pk])
+    if breeders:
+        bump_fragment_versions('animal', breeders)
+
+def breeders_changed(sender, instance, action, reverse, pk_set=None, **kwargs):
+    '''Adding or removing breeders changes the breeding cage rows and the rows of those breeders, and the version of all breeders (used by :mod:`~mousedb.animal.mendelian`).'''
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_fragment_versions('breeders')
+        if reverse:
+            invalidate_animal_fragments([instance.pk])
+            if pk_set:
+                bump_fragment_versions('breeding', pk_set)
+        else:
+            bump_fragment_versions('breeding', [instance.pk])
+            if pk_set:
+                bump_fragment_versions('animal', pk_set)
+
+def object_changed(sender, instance, **kwargs):
+    '''A saved or deleted measurement or experiment changes its own rows.'''
+    bump_fragment_versions(sender._meta.model_name, [instance.pk])
+
+def model_changed(sender, **kwargs):
+    '''Strains, assays and treatments are shown by name in many rows, so a change to any of them changes all the rows showing that model.'''
+    bump_fragment_versions(sender._meta.model_name)
+
+def treatment_animals_changed(sender, action, **kwargs):
+    '''Adding or removing animals from a treatment changes all the rows showing treatments.'''
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_fragment_versions('treatment')
+
+post_save.connect(animal_changed, sender=Animal, dispatch_uid='fragment-animal-save')
+pre_delete.connect(animal_changed, sender=Animal, dispatch_uid='fragment-animal-delete')
+post_save.connect(breeding_changed, sender=Breeding, dispatch_uid='fragment-breeding-save')
+pre_delete.connect(breeding_changed, sender=Breeding, dispatch_uid='fragment-breeding-delete')
+m2m_changed.connect(breeders_changed, sender=Breeding.Male.through, dispatch_uid='fragment-breeding-male')
+m2m_changed.connect(breeders_changed, sender=Breeding.Females.through, dispatch_uid='fragment-breeding-females')
+m2m_changed.connect(treatment_animals_changed, sender=Treatment.animals.through, dispatch_uid='fragment-treatment-animals')
+for model in (Measurement, Experiment):
+    post_save.connect(object_changed, sender=model, dispatch_uid='fragment-%s-save' % model._meta.model_name)
+    post_delete.connect(object_changed, sender=model, dispatch_uid='fragment-%s-delete' % model._meta.model_name)
+for model in (Strain, Assay, Treatment):
+    post_save.connect(model_changed, sender=model, dispatch_uid='fragment-%s-save' % model._meta.model_name)
+    post_delete.connect(model_changed, sender=model, dispatch_uid='fragment-%s-delete' % model._meta.model_name)
@@ -4,9 +4,10 @@ These tests will verify generation of a new group and license object.
 """
 
 from django.test import TestCase
-from django.test.client import Client
+from django.test.client import Client, RequestFactory
 
 from mousedb.groups.models import Group, License
+from mousedb.context_processors import group_info, invalidate_group_info
  
 MODELS = [Group, License]
 
@@ -69,3 +70,28 @@ class GroupsModelTests(TestCase):
         self.assertEquals(test_license, new_license)
         self.assertEquals(test_license.__unicode__(), "Awesome Lab's Site License")
 
+
+class GroupContextProcessorTests(TestCase):
+    """Test the cached group context processor."""
+
+    fixtures = ['test_group',]
+
+    def setUp(self):
+        """Clear the cached group information."""
+        invalidate_group_info()
+
+    def test_group_info_cached(self):
+        """This is a test that the group is only queried once, and is queried again after it is saved."""
+        request = RequestFactory().get('/')
+        group = Group.objects.get(pk=1)
+        self.assertEquals(group_info(request)['group'], group)
+        with self.assertNumQueries(0):
+            group_info(request)
+        group.group = "Renamed Lab"
+        group.save()
+        self.assertEquals(group_info(request)['group'].group, "Renamed Lab")
+
+    def test_group_info_no_group(self):
+        """This is a test that the group is None if no group has been entered."""
+        Group.objects.all().delete()
+        self.assertEquals(group_info(RequestFactory().get('/'))['group'], None)
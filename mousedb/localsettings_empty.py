@@ -39,3 +39,4 @@ DATABASES = {
 
 WEAN_AGE = 21 #this is the earliers age at which pups can be weaned from their parents.
 GENOTYPE_AGE = 14 #this is the earliest age at which pups can be genotyped or ear tagged.
+CAGE_DAY_RATE = 0.0 #this is the housing cost per cage per day, used for the housing cost report.
@@ -0,0 +1,53 @@
+'''This module contains the data models of the root application.
+
+The :class:`~mousedb.models.Tombstone` model records when tracked objects are deleted, so that an incremental sync (using the modified times of each object) can also remove objects which no longer exist.
+The tracked models are listed in TRACKED_MODELS and a Tombstone is saved from the delete signal of each of them, including for objects deleted by a cascade or a bulk delete of a queryset.
+'''
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from mousedb.animal.models import Animal, Breeding
+from mousedb.data.models import Measurement, Experiment
+from mousedb.timed_mating.models import PlugEvents
+
+TRACKED_MODELS = (Animal, Breeding, Measurement, Experiment, PlugEvents)
+
+class TombstoneQuerySet(models.QuerySet):
+    '''This queryset adds a helper for finding the deletions of a model.'''
+
+    def for_model(self, model, since=None):
+        '''This returns the tombstones for a model, optionally only those deleted after since.'''
+        tombstones = self.filter(content_type=ContentType.objects.get_for_model(model))
+        if since is not None:
+            tombstones = tombstones.filter(deleted__gt=since)
+        return tombstones
+
+class Tombstone(models.Model):
+    '''This records the deletion of a tracked object.
+
+    The object_id is the id the object had, and deleted is the time it was deleted.'''
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.IntegerField()
+    deleted = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = TombstoneQuerySet.as_manager()
+
+    def __unicode__(self):
+        '''The unicode representation of a tombstone is the model and id of the deleted object.'''
+        return u'%s %i deleted' % (self.content_type.model, self.object_id)
+
+    class Meta:
+        ordering = ['deleted', 'id']
+
+def record_tombstone(sender, instance, **kwargs):
+    '''This saves a tombstone for a deleted object.'''
+    Tombstone.objects.create(content_type=ContentType.objects.get_for_model(sender), object_id=instance.pk)
+
+for model in TRACKED_MODELS:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid='tombstone-%s-%s' % (model._meta.app_label, model._meta.model_name))
+
+#connect the signals which invalidate the cached table rows
+from mousedb import fragments
@@ -0,0 +1,195 @@
+'''This package provides keyset (seek) pagination for large querysets.
+
+Rather than using offsets, each page is requested relative to the sort value and id of the last (or first) object of the previous page.
+This allows each page to be served from an index no matter how deep into the list it is.
+
+Objects with no value for the sort field are kept as a separate segment which is ordered by id and placed before the others (in ascending order).
+This means the ordering does not depend on how a particular database sorts null values.
+'''
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.db.models import Q
+
+
+def encode_cursor(value, pk):
+    '''This encodes a sort value and a primary key as a url safe cursor string.'''
+    if value is not None and not isinstance(value, (int, float)):
+        value = u'%s' % value
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, field):
+    '''This decodes a cursor string into a sort value and a primary key.
+
+    The sort value is converted back to the python type of the model field.
+    A ValueError is raised for an invalid cursor.'''
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+        if value is not None:
+            value = field.to_python(value)
+        return value, int(pk)
+    except Exception:
+        raise ValueError("Invalid cursor %s" % cursor)
+
+def keyset_segments(queryset, field_name, cursor=None, reverse=False):
+    '''This returns the ordered querysets which follow a cursor for a sort field.
+
+    The null segment comes first when traversing in ascending order and last in descending order.
+    The cursor is a (value, pk) tuple, or None to start at the beginning.'''
+    nulls = queryset.filter(**{'%s__isnull' % field_name: True})
+    values = queryset.filter(**{'%s__isnull' % field_name: False})
+    if reverse:
+        nulls = nulls.order_by('-pk')
+        values = values.order_by('-%s' % field_name, '-pk')
+    else:
+        nulls = nulls.order_by('pk')
+        values = values.order_by(field_name, 'pk')
+    if cursor is not None:
+        value, pk = cursor
+        comparison, pk_comparison = reverse and ('lt', 'lt') or ('gt', 'gt')
+        if value is None:
+            nulls = nulls.filter(**{'pk__%s' % pk_comparison: pk})
+            if reverse:
+                values = values.none()
+        else:
+            values = values.filter(Q(**{'%s__%s' % (field_name, comparison): value}) |
+                                   Q(**{field_name: value, 'pk__%s' % pk_comparison: pk}))
+            if not reverse:
+                nulls = nulls.none()
+    if reverse:
+        return [values, nulls]
+    return [nulls, values]
+
+class KeysetPage(object):
+    '''This is a single page of objects from :func:`~mousedb.pagination.keyset_page`.
+
+    The object_list is the objects on this page, and next_cursor and previous_cursor are the cursors for the adjacent pages (or None if there are no more objects in that direction).'''
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        '''A page is true even when it is empty, so that templates can test whether a page was given.'''
+        return True
+    __nonzero__ = __bool__
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+def keyset_page(queryset, field_name, per_page, after=None, before=None, descending=False):
+    '''This returns a :class:`~mousedb.pagination.KeysetPage` of a queryset sorted by field_name and then by primary key.
+
+    The after and before arguments are decoded (value, pk) cursors.
+    Each page requires at most two queries, one for each segment.'''
+    field = queryset.model._meta.get_field(field_name)
+    backwards = before is not None
+    cursor = backwards and before or after
+    object_list = []
+    for segment in keyset_segments(queryset, field_name, cursor, reverse=(descending != backwards)):
+        object_list.extend(segment[:per_page + 1 - len(object_list)])
+        if len(object_list) > per_page:
+            break
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if backwards:
+        object_list.reverse()
+    next_cursor = previous_cursor = None
+    if object_list:
+        first = encode_cursor(getattr(object_list[0], field.attname), object_list[0].pk)
+        last = encode_cursor(getattr(object_list[-1], field.attname), object_list[-1].pk)
+        if backwards:
+            next_cursor = last
+            previous_cursor = has_more and first or None
+        else:
+            next_cursor = has_more and last or None
+            previous_cursor = cursor is not None and first or None
+    return KeysetPage(object_list, next_cursor, previous_cursor)
+
+class KeysetPaginationMixin(object):
+    '''This mixin replaces the offset pagination of a ListView with keyset pagination.
+
+    The sort order is set by the **sort** request parameter, which is one of the keys of sort_fields (prefixed with a - for descending order).
+    Pages are requested with the **after** or **before** request parameters, which are the cursors of the adjacent pages.
+    Any request parameters in filter_fields are applied as filters to the queryset.
+    The context contains page_obj, the total object_count, the current sort and filters, sort_links for the column headers and next_link and previous_link for the adjacent pages.'''
+
+    paginate_by = 100
+    sort_fields = {}
+    default_sort = None
+    filter_fields = {}
+
+    def get_sort(self):
+        '''This returns the sort key and whether it is descending.'''
+        sort = self.request.GET.get('sort', self.default_sort)
+        descending = sort.startswith('-')
+        if sort.lstrip('-') not in self.sort_fields:
+            sort, descending = self.default_sort, False
+        return sort.lstrip('-'), descending
+
+    def get_queryset(self):
+        '''The queryset is filtered by any filter_fields in the request parameters.'''
+        queryset = super(KeysetPaginationMixin, self).get_queryset()
+        for parameter, lookup in self.filter_fields.items():
+            value = self.request.GET.get(parameter)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: value})
+                except (ValueError, ValidationError):
+                    queryset = queryset.none()
+        return queryset
+
+    def get_querystring(self, **kwargs):
+        '''This returns the current request parameters, updated with kwargs (None values are removed).'''
+        parameters = self.request.GET.copy()
+        for key in ('after', 'before'):
+            if key in parameters:
+                del parameters[key]
+        for key, value in kwargs.items():
+            if value is None:
+                if key in parameters:
+                    del parameters[key]
+            else:
+                parameters[key] = value
+        return u'?%s' % parameters.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        '''This over-rides the offset pagination of ListView with a keyset page.'''
+        sort, descending = self.get_sort()
+        field = queryset.model._meta.get_field(self.sort_fields[sort])
+        try:
+            after = self.request.GET.get('after') and decode_cursor(self.request.GET['after'], field)
+            before = self.request.GET.get('before') and decode_cursor(self.request.GET['before'], field)
+        except ValueError:
+            raise Http404("Invalid page")
+        page = keyset_page(queryset, field.name, page_size, after or None, before or None, descending)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        '''This adds the total object_count, the sort and the links for sorting and paging into the context.'''
+        context = super(KeysetPaginationMixin, self).get_context_data(**kwargs)
+        sort, descending = self.get_sort()
+        page = context['page_obj']
+        context['object_count'] = self.object_list.count()
+        context['sort'] = descending and '-%s' % sort or sort
+        context['filters'] = dict((parameter, self.request.GET.get(parameter, '')) for parameter in self.filter_fields)
+        context['sort_links'] = dict((key, self.get_querystring(sort=(key == sort and not descending) and '-%s' % key or key)) for key in self.sort_fields)
+        context['next_link'] = page.has_next() and self.get_querystring(after=page.next_cursor) or None
+        context['previous_link'] = page.has_previous() and self.get_querystring(before=page.previous_cursor) or None
+        return context
@@ -31,6 +31,16 @@ class RootViewTests(TestCase):
         self.assertTemplateUsed(response, 'base.html')
         self.assertTemplateUsed(response, 'home.html')
 
+    def test_home_conditional(self):
+        """This test checks that the home page returns 304 Not Modified for a matching conditional request, until an animal is changed."""
+        from mousedb.animal.models import Animal
+        etag = self.client.get('/index/')['ETag']
+        response = self.client.get('/index/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Animal.objects.get(pk=1).save()
+        response = self.client.get('/index/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
     def test_logout(self):
         """This test checks the view which displays the logout page.  It checks for the correct templates and status code."""        
         response = self.client.get('/index/')
@@ -46,3 +56,47 @@ class RootViewTests(TestCase):
         self.assertTemplateUsed(response, 'api_key.html')                 
 
 
+
+class PaginationTests(TestCase):
+    """These are tests for the keyset pagination of querysets."""
+    fixtures = ['test_breeding', 'test_animals', 'test_strain']
+
+    def test_keyset_page(self):
+        """This test checks that pages of animals follow each other in order of Born then id, with animals with no Born date first."""
+        from mousedb.animal.models import Animal
+        from mousedb.pagination import keyset_page, decode_cursor
+        born = Animal._meta.get_field('Born')
+        first_page = keyset_page(Animal.objects.all(), 'Born', 2)
+        self.assertEqual([animal.pk for animal in first_page], [4, 1])
+        self.assertFalse(first_page.has_previous())
+        second_page = keyset_page(Animal.objects.all(), 'Born', 2, after=decode_cursor(first_page.next_cursor, born))
+        self.assertEqual([animal.pk for animal in second_page], [2, 3])
+        self.assertFalse(second_page.has_next())
+        previous_page = keyset_page(Animal.objects.all(), 'Born', 2, before=decode_cursor(second_page.previous_cursor, born))
+        self.assertEqual([animal.pk for animal in previous_page], [4, 1])
+        descending_page = keyset_page(Animal.objects.all(), 'Born', 2, descending=True)
+        self.assertEqual([animal.pk for animal in descending_page], [3, 2])
+        last_page = keyset_page(Animal.objects.all(), 'Born', 2, after=decode_cursor(descending_page.next_cursor, born), descending=True)
+        self.assertEqual([animal.pk for animal in last_page], [1, 4])
+        empty_page = keyset_page(Animal.objects.none(), 'Born', 2)
+        self.assertEqual(len(empty_page), 0)
+        self.assertTrue(empty_page)
+
+class ChangeTrackingTests(TestCase):
+    """These are tests for the modified times and tombstones of tracked objects."""
+    fixtures = ['test_breeding', 'test_animals', 'test_strain']
+
+    def test_modified_and_tombstone(self):
+        """This test checks that saving an animal updates its modified time and that deleting it records a tombstone."""
+        from mousedb.animal.models import Animal
+        from mousedb.models import Tombstone
+        from django.utils import timezone
+        animal = Animal.objects.get(pk=1)
+        #the fixtures are given the current time as they are loaded, so changes are compared with a time after loading
+        before = timezone.now()
+        animal.Notes = 'changed'
+        animal.save()
+        self.assertTrue(Animal.objects.get(pk=1).modified > before)
+        self.assertEqual(list(Animal.objects.filter(modified__gt=before).values_list('pk', flat=True)), [1])
+        Animal.objects.filter(pk__in=[1, 2]).delete()
+        self.assertEqual(sorted(Tombstone.objects.for_model(Animal, since=before).values_list('object_id', flat=True)), [1, 2])
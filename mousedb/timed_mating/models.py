@@ -3,6 +3,7 @@
 Currently the only data model is for PlugEvents."""
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 from mousedb.animal.models import Animal, Strain, Breeding
@@ -27,6 +28,9 @@ class PlugEvents(models.Model):
     KO_Dead = models.IntegerField(blank=True, null=True, help_text="Nonviable KO Embryos")
     Active = models.BooleanField(default=True)
     Notes = models.TextField(max_length=250, blank=True)
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    modified = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
     def __unicode__(self):
         return u'Plug Event - %i' % self.id
 
@@ -38,9 +42,11 @@ class PlugEvents(models.Model):
     def save(self):
         """Over-rides the default save function for PlugEvents.
 
-        If a sacrifice date is set for an object in this model, then Active is set to False."""
+        If a sacrifice date is set for an object in this model, then Active is set to False.
+        The modified time is also updated."""
         if self.SacrificeDate:
             self.Active = False
+        self.modified = timezone.now()
         super(PlugEvents, self).save()
     class Meta:
         verbose_name = "Plug Events"
@@ -8,6 +8,7 @@ from django.contrib import admin, auth
 #from tastypie.api import Api
 #from mousedb.data.api import MeasurementResource, AssayResource, ExperimentResource, StudyResource, TreatmentResource
 #from mousedb.animal.api import AnimalResource, StrainResource
+#from mousedb.api import TombstoneResource
 
 from ajax_select import urls as ajax_select_urls
 
@@ -27,6 +28,7 @@ from mousedb import animal, data, timed_mating, veterinary
 #v1_api.register(ExperimentResource())
 #v1_api.register(StudyResource())
 #v1_api.register(TreatmentResource())
+#v1_api.register(TombstoneResource())
 
 
 admin.autodiscover()
@@ -15,6 +15,8 @@ from django.template import RequestContext
 from django.http import HttpResponseRedirect
 from django.core.urlresolvers import reverse
 from mousedb.animal.models import Animal, Strain
+from mousedb.animal.census import census_series
+from mousedb.conditional import conditional_response, latest_modified, latest_deletion, latest_change
 from django.utils.decorators import method_decorator
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
@@ -33,14 +35,24 @@ def logout_view(request):
 def home(request):
     """This view generates the data for the home page.
     
-    This login restricted view passes dictionaries containing the current cages, animals and strains as well as the totals for each.  This data is passed to the template home.html"""
+    This login restricted view passes dictionaries containing the current cages, animals and strains as well as the totals for each.  This data is passed to the template home.html
+    The page changes with the animals, so conditional GET requests are answered with a 304 Not Modified response if no animals have changed (see :mod:`~mousedb.conditional`)."""
+    return conditional_response(request, home_page, latest_change(latest_modified(Animal.objects.all()), latest_deletion(Animal)))
+
+def home_page(request):
+    """This renders the home page, see :func:`~mousedb.views.home`.
+
+    The page includes a chart of the weekly census of the colony over the last year (see :mod:`~mousedb.animal.census`)."""
     cage_list = Animal.objects.values("Cage").distinct()
     cage_list_current = cage_list.filter(Alive=True)
     animal_list = Animal.objects.all()
     animal_list_current = animal_list.filter(Alive=True)
     strain_list = animal_list.values("Strain").distinct()
     strain_list_current = animal_list_current.values("Strain").distinct()
-    return render(request, 'home.html', {'animal_list':animal_list, 'animal_list_current':animal_list_current, 'strain_list':strain_list, 'strain_list_current':strain_list_current, 'cage_list':cage_list, 'cage_list_current':cage_list_current})
+    today = datetime.date.today()
+    census = census_series(today - datetime.timedelta(days=52 * 7), today, step=7)
+    census_max = max([animals for date, animals, cages in census] + [1])
+    return render(request, 'home.html', {'animal_list':animal_list, 'animal_list_current':animal_list_current, 'strain_list':strain_list, 'strain_list_current':strain_list_current, 'cage_list':cage_list, 'cage_list_current':cage_list_current, 'census':census, 'census_max':census_max})
     
 class ProtectedListView(ListView):
     """This subclass of ListView generates a login_required protected version of the ListView.